@@ -43,14 +43,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so the reported total covers every other middleware.
+    'troubleshooter_app.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # Drop-in replacement for SessionMiddleware that times the session write.
+    'troubleshooter_app.instrumentation.TimedSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django_cprofile_middleware.middleware.ProfilerMiddleware',
+    # Opt-in profiling; removes itself unless a token or sampling rate is set.
+    'troubleshooter_app.profiling.SampledProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'fnfm_troubleshooter.urls'
@@ -122,13 +126,94 @@ STATIC_URL = 'static/'
 # We now point to the static directory inside the lib folder.
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'lib', 'static'),
+    # Assets shared by the generated pyvis graph pages (see troubleshooter_app/assets.py).
+    ('pyvis/bindings', os.path.join(BASE_DIR, 'lib', 'bindings')),
+    ('pyvis/vis-9.1.2', os.path.join(BASE_DIR, 'lib', 'vis-9.1.2')),
+    ('pyvis/tom-select', os.path.join(BASE_DIR, 'lib', 'tom-select')),
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# `collectstatic` stores content-hashed names plus gzip/brotli variants, which
+# troubleshooter_app.views.static_asset serves with immutable cache headers.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'troubleshooter_app.assets.CompressedManifestStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# On-demand profiling
+# A request is profiled when it sends PROFILING_HEADER with PROFILING_TOKEN,
+# or when it is sampled with probability PROFILING_SAMPLE_RATE (0 disables).
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_HEADER = 'X-Profile-Token'
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+# Oldest profiles are deleted beyond this count.
+PROFILING_MAX_PROFILES = 200
+PROFILING_TRACEMALLOC_FRAMES = 10
+
+# Teradata checks (see troubleshooter_app/resilience.py)
+# A diagnosis stops starting checks after FNFM_REQUEST_DEADLINE_SECONDS and a
+# single check is cancelled after FNFM_CHECK_TIMEOUT_SECONDS (0 disables
+# either). After FNFM_BREAKER_FAILURES consecutive failed checks, checks are
+# skipped for FNFM_BREAKER_RESET_SECONDS. Skipped checks are reported as unknown.
+FNFM_REQUEST_DEADLINE_SECONDS = float(os.getenv('FNFM_REQUEST_DEADLINE_SECONDS', '60'))
+FNFM_CHECK_TIMEOUT_SECONDS = float(os.getenv('FNFM_CHECK_TIMEOUT_SECONDS', '15'))
+FNFM_BREAKER_FAILURES = int(os.getenv('FNFM_BREAKER_FAILURES', '5'))
+FNFM_BREAKER_RESET_SECONDS = float(os.getenv('FNFM_BREAKER_RESET_SECONDS', '30'))
+
+# Fleet heatmaps are computed from firings cached this long per window.
+FNFM_FLEET_CACHE_SECONDS = int(os.getenv('FNFM_FLEET_CACHE_SECONDS', '3600'))
+
+# Slow-query log (see troubleshooter_app/slow_queries.py)
+# Teradata statements taking FNFM_SLOW_QUERY_SECONDS or longer (0 disables)
+# are appended to FNFM_SLOW_QUERY_LOG, rotated at FNFM_SLOW_QUERY_LOG_BYTES
+# with FNFM_SLOW_QUERY_LOG_BACKUPS old files kept. Summarise them with
+# `manage.py slow_queries top`.
+FNFM_SLOW_QUERY_SECONDS = float(os.getenv('FNFM_SLOW_QUERY_SECONDS', '2'))
+FNFM_SLOW_QUERY_LOG = os.getenv('FNFM_SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl'))
+FNFM_SLOW_QUERY_LOG_BYTES = 10 * 1024 * 1024
+FNFM_SLOW_QUERY_LOG_BACKUPS = 5
+
+# Admission control (see troubleshooter_app/admission.py)
+# At most FNFM_ADMISSION_MAX_QUERIES Teradata statements run at once per
+# process (0 disables the limit); the others queue by priority lane
+# (interactive > api > batch) for at most the lane's queue time in seconds
+# (None: as long as the request deadline allows).
+FNFM_ADMISSION_MAX_QUERIES = int(os.getenv('FNFM_ADMISSION_MAX_QUERIES', '8'))
+FNFM_ADMISSION_QUEUE_SECONDS = {
+    'interactive': float(os.getenv('FNFM_ADMISSION_QUEUE_INTERACTIVE_SECONDS', '10')),
+    'api': float(os.getenv('FNFM_ADMISSION_QUEUE_API_SECONDS', '10')),
+    'batch': float(os.getenv('FNFM_ADMISSION_QUEUE_BATCH_SECONDS', '300')),
+}
+
+# Stored check results (see troubleshooter_app/check_store.py)
+# Results stored by `prewarm_checks` or a diagnosis are reused for
+# FNFM_CHECK_RESULT_MAX_AGE_SECONDS, then evaluated again (0 never reuses them).
+FNFM_CHECK_RESULT_MAX_AGE_SECONDS = float(os.getenv('FNFM_CHECK_RESULT_MAX_AGE_SECONDS', '300'))
+
+# Check batching (see troubleshooter_app/batching.py)
+# Concurrent calls of the same check are sent as one grouped query, after
+# the previous query of that check returns and FNFM_CHECK_BATCH_WINDOW_SECONDS.
+FNFM_CHECK_BATCHING = bool(int(os.getenv('FNFM_CHECK_BATCHING', '1')))
+FNFM_CHECK_BATCH_WINDOW_SECONDS = float(os.getenv('FNFM_CHECK_BATCH_WINDOW_SECONDS', '0'))
+
+# Incremental re-diagnosis (see troubleshooter_app/incremental.py)
+# SQL aggregates versioning a source table for one partition, by table, e.g.
+# {'PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB': ('MAX(load_ts)',)} for a
+# load timestamp column. Tables not listed use incremental.SOURCE_VERSION_EXPRESSIONS.
+FNFM_SOURCE_VERSION_EXPRESSIONS = {}
+
+# Single-flight diagnoses (see troubleshooter_app/coalesce.py)
+# Concurrent requests for the same partition, failure and ontology version
+# wait up to FNFM_COALESCE_WAIT_SECONDS for the one diagnosis running, within
+# a process and, with FNFM_COALESCE_DB_LOCK, across workers through a lock
+# row in the local database.
+FNFM_COALESCE_WAIT_SECONDS = float(os.getenv('FNFM_COALESCE_WAIT_SECONDS', '90'))
+FNFM_COALESCE_DB_LOCK = bool(int(os.getenv('FNFM_COALESCE_DB_LOCK', '1')))
+
 # The `services.py` file will now load these from environment variables.
 # We no longer need to define them here.
@@ -1,7 +1,9 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from troubleshooter_app.views import metrics_view, static_asset
 
 urlpatterns = [
     # This is the default Django admin path.
@@ -11,16 +13,17 @@ urlpatterns = [
     # from our troubleshooter_app. Any URL starting with 'troubleshooter/'
     # will be handled by that app's urls.py.
     path('troubleshooter/', include('troubleshooter_app.urls')),
+
+    # Prometheus-text metrics (stage latency histograms, cache and pool counters).
+    path('metrics', metrics_view, name='metrics'),
     
     # You can add more apps here as your project grows. For example:
     # path('users/', include('users_app.urls')),
     # path('blog/', include('blog_app.urls')),
 ]
 
-# Serve static files during development, which is standard practice.
-# The user's original code had a duplicate static line, which is removed here.
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    # The static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
-    # is a more generic way to serve files from the staticfiles directory.
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
+# Static files: fingerprinted and precompressed by `collectstatic`, with a
+# fallback to the static directories for files written since (graph pages).
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), static_asset, name='static_asset'),
+]
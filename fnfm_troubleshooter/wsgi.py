@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fnfm_troubleshooter.settings')
 
 application = get_wsgi_application()
+
+# Serving processes create the shared resources (Teradata engine, ontology
+# index) before the first request instead of on it.
+from troubleshooter_app.resources import registry  # noqa: E402
+
+registry.warm_up()
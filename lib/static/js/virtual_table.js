@@ -0,0 +1,125 @@
+// Virtualised table over a paged JSON endpoint (see views.results_table).
+// Only the rows inside the scrolled viewport (plus a small overscan) exist in
+// the DOM; pages of rows are fetched on demand and cached until the sort or
+// filter changes.
+(function () {
+    const ROW_HEIGHT = 33;
+    const OVERSCAN = 10;
+
+    function VirtualTable(container, url, options) {
+        options = options || {};
+        this.url = url;
+        this.pageSize = options.pageSize || 100;
+        this.sort = null;
+        this.order = 'asc';
+        this.query = '';
+        this.pages = {};
+        this.pending = {};
+        this.generation = 0;
+        this.filtered = 0;
+        this.columns = [];
+
+        this.filter = document.createElement('input');
+        this.filter.type = 'search';
+        this.filter.className = 'form-control mb-2';
+        this.filter.placeholder = 'Filter rows...';
+        this.summary = document.createElement('div');
+        this.summary.className = 'text-muted small mb-1';
+        this.header = document.createElement('table');
+        this.header.className = 'table table-bordered mb-0';
+        this.viewport = document.createElement('div');
+        this.viewport.style.cssText = `overflow-y:auto;position:relative;height:${options.height || 400}px;`;
+        this.spacer = document.createElement('div');
+        this.body = document.createElement('table');
+        this.body.className = 'table table-striped table-bordered mb-0';
+        this.body.style.cssText = 'position:absolute;top:0;left:0;width:100%;table-layout:fixed;';
+        this.viewport.append(this.spacer, this.body);
+        container.append(this.filter, this.summary, this.header, this.viewport);
+
+        let timer = null;
+        this.filter.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => { this.query = this.filter.value.trim(); this.reload(); }, 250);
+        });
+        this.viewport.addEventListener('scroll', () => this.render());
+        this.reload();
+    }
+
+    VirtualTable.prototype.reload = function () {
+        this.generation++;
+        this.pages = {};
+        this.pending = {};
+        this.viewport.scrollTop = 0;
+        this.fetchPage(0);
+    };
+
+    VirtualTable.prototype.fetchPage = function (page) {
+        if (this.pages[page] || this.pending[page]) return;
+        this.pending[page] = true;
+        const generation = this.generation;
+        const params = new URLSearchParams({offset: page * this.pageSize, limit: this.pageSize, q: this.query, order: this.order});
+        if (this.sort) params.set('sort', this.sort);
+        fetch(`${this.url}?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                // Drop pages requested before the sort or filter changed
+                if (generation !== this.generation || data.error) return;
+                delete this.pending[page];
+                this.pages[page] = data.rows;
+                this.filtered = data.filtered;
+                this.summary.textContent = `${data.filtered} of ${data.total} rows`;
+                if (this.columns.length !== data.columns.length) this.renderHeader(data.columns);
+                this.spacer.style.height = `${data.filtered * ROW_HEIGHT}px`;
+                this.render();
+            })
+            .catch(error => console.error('Error fetching table rows:', error));
+    };
+
+    VirtualTable.prototype.renderHeader = function (columns) {
+        this.columns = columns;
+        const row = document.createElement('tr');
+        columns.forEach(column => {
+            const cell = document.createElement('th');
+            cell.textContent = column;
+            cell.style.cursor = 'pointer';
+            cell.addEventListener('click', () => {
+                this.order = this.sort === column && this.order === 'asc' ? 'desc' : 'asc';
+                this.sort = column;
+                Array.from(row.children).forEach(th => th.textContent = th.textContent.replace(/ [▲▼]$/, ''));
+                cell.textContent = `${column} ${this.order === 'asc' ? '▲' : '▼'}`;
+                this.reload();
+            });
+            row.append(cell);
+        });
+        const head = document.createElement('thead');
+        head.append(row);
+        this.header.replaceChildren(head);
+        this.header.style.tableLayout = 'fixed';
+    };
+
+    VirtualTable.prototype.render = function () {
+        const first = Math.max(Math.floor(this.viewport.scrollTop / ROW_HEIGHT) - OVERSCAN, 0);
+        const visible = Math.ceil(this.viewport.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+        const last = Math.min(first + visible, this.filtered);
+        const body = document.createElement('tbody');
+        for (let i = first; i < last; i++) {
+            const page = Math.floor(i / this.pageSize);
+            const rows = this.pages[page];
+            if (!rows) this.fetchPage(page);
+            // Rows of pages still loading are kept as empty placeholders so the offsets stay right
+            const values = (rows && rows[i - page * this.pageSize]) || this.columns.map(() => null);
+            const row = document.createElement('tr');
+            row.style.height = `${ROW_HEIGHT}px`;
+            values.forEach(value => {
+                const cell = document.createElement('td');
+                cell.textContent = value === null ? '' : String(value);
+                row.append(cell);
+            });
+            body.append(row);
+        }
+        this.body.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+        this.body.replaceChildren(body);
+    };
+
+    window.VirtualTable = VirtualTable;
+})();
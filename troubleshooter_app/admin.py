@@ -1,3 +1,15 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GuideLabel, TroubleshooterGuide
+
+
+class GuideLabelInline(admin.TabularInline):
+    model = GuideLabel
+    extra = 1
+
+
+@admin.register(TroubleshooterGuide)
+class TroubleshooterGuideAdmin(admin.ModelAdmin):
+    list_display = ('title', 'updated_at')
+    search_fields = ('title', 'labels__label')
+    inlines = [GuideLabelInline]
@@ -0,0 +1,186 @@
+"""
+Admission control of the Teradata statements.
+
+Interactive diagnoses, the /api/teradata/ dashboard endpoints and batch work
+such as the `prewarm_checks` watcher share one engine. `install(engine)` puts
+the process-wide AdmissionController in front of it. At most
+FNFM_ADMISSION_MAX_QUERIES statements run at once, and the others queue in
+the lane of the work that issued them. A freed slot goes to the oldest
+statement of the highest-priority lane: interactive, then api, then batch.
+
+A statement waiting longer than its lane's FNFM_ADMISSION_QUEUE_SECONDS, or
+past the diagnosis deadline, raises QueueTimeout. A check rejected that way
+evaluates to UNKNOWN without counting against the circuit breaker.
+
+Work runs in the lane set by `admission_lane`, interactive by default. Queue
+depths, running statements and queue waits are exported as metrics.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .instrumentation import metrics
+from .resilience import QueueTimeout, remaining_time
+
+# In order of priority.
+LANES = ('interactive', 'api', 'batch')
+DEFAULT_QUEUE_SECONDS = {'interactive': 10.0, 'api': 10.0, 'batch': 300.0}
+
+_lane = contextvars.ContextVar('fnfm_admission_lane', default='interactive')
+
+
+@contextmanager
+def admission_lane(lane):
+    """Runs the statements issued in the block in `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown admission lane {lane!r}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def queue_seconds(lane):
+    """How long a statement of `lane` may queue; None waits as long as the deadline allows."""
+    seconds = getattr(settings, 'FNFM_ADMISSION_QUEUE_SECONDS', DEFAULT_QUEUE_SECONDS).get(lane)
+    remaining = remaining_time()
+    if remaining is not None:
+        seconds = remaining if seconds is None else min(seconds, remaining)
+    return None if seconds is None else max(seconds, 0.0)
+
+
+class AdmissionController:
+    """
+    A budget of concurrently running statements, handed out by lane priority
+    and in arrival order within a lane. `limit` defaults to
+    FNFM_ADMISSION_MAX_QUERIES; 0 admits every statement right away.
+    """
+
+    def __init__(self, name, limit=None):
+        self.name = name
+        self._limit = limit
+        self._condition = threading.Condition()
+        self._queues = {lane: deque() for lane in LANES}
+        self.running = 0
+
+    @property
+    def limit(self):
+        if self._limit is not None:
+            return self._limit
+        return int(getattr(settings, 'FNFM_ADMISSION_MAX_QUERIES', 8) or 0)
+
+    def queue_depths(self):
+        with self._condition:
+            return {lane: len(queue) for lane, queue in self._queues.items()}
+
+    def _next(self):
+        for lane in LANES:
+            if self._queues[lane]:
+                return self._queues[lane][0]
+        return None
+
+    def acquire(self, lane, timeout=None):
+        """Waits up to `timeout` seconds (None: indefinitely) for a slot; raises QueueTimeout."""
+        start = time.monotonic()
+        ticket = object()
+        with self._condition:
+            queue = self._queues[lane]
+            queue.append(ticket)
+            try:
+                while True:
+                    limit = self.limit
+                    if not limit or (self.running < limit and self._next() is ticket):
+                        break
+                    remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                    if remaining is not None and remaining <= 0:
+                        metrics.inc('fnfm_admission_rejected_total', help_text='Statements not admitted in time.',
+                                    controller=self.name, lane=lane)
+                        raise QueueTimeout(f"no {self.name} slot for the {lane} lane within {timeout:.2f}s")
+                    self._condition.wait(remaining)
+                self.running += 1
+            finally:
+                queue.remove(ticket)
+                # The next ticket in line may be admissible now.
+                self._condition.notify_all()
+        metrics.observe('fnfm_admission_wait_seconds', time.monotonic() - start,
+                        help_text='Time statements queued for admission.', controller=self.name, lane=lane)
+
+    def release(self):
+        with self._condition:
+            self.running -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, lane=None, timeout=None):
+        """Holds a slot for the block, in `lane` (the current one by default)."""
+        self.acquire(lane or current_lane(), timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# The controller in front of the shared Teradata engine.
+teradata_admission = AdmissionController('teradata')
+
+metrics.register_gauge(
+    'fnfm_admission_queue_depth',
+    lambda: {(('controller', teradata_admission.name), ('lane', lane)): depth
+             for lane, depth in teradata_admission.queue_depths().items()},
+    'Statements queued for admission, by lane.',
+)
+metrics.register_gauge(
+    'fnfm_admission_running',
+    lambda: {(('controller', teradata_admission.name),): teradata_admission.running},
+    'Statements admitted and running.',
+)
+
+
+# --- Engine Events ---
+
+# The admission is kept on the statement's execution context: the info of a
+# connection invalidated while its statement runs (see resilience.py) is
+# reset, which would leak the slot.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    lane = current_lane()
+    teradata_admission.acquire(lane, queue_seconds(lane))
+    context.fnfm_admitted = True
+
+
+def _release(context):
+    if getattr(context, 'fnfm_admitted', False):
+        context.fnfm_admitted = False
+        teradata_admission.release()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _release(context)
+
+
+def _handle_error(exception_context):
+    _release(exception_context.execution_context)
+
+
+def install(engine):
+    """
+    Admits every statement of `engine` through `teradata_admission`
+    (idempotent). Install it before the slow-query log, so that queueing is
+    not counted as statement time. Returns the engine.
+    """
+    from sqlalchemy import event
+
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    return engine
@@ -1,6 +1,8 @@
 from django.http import JsonResponse
+from .admission import admission_lane
+from .batching import batched_check
+from .resources import LazyAttributes
 from .services import (
-    get_teradata_engine,
     threshold_sup_10450,
     threshold_sup_12000,
     threshold_sup_5000,
@@ -14,8 +16,9 @@ from .services import (
     mterrstafm_check,
 )
 
-# Initialize the Teradata engine once at the app's startup.
-td_engine = get_teradata_engine()
+# The Teradata engine is the one shared with the views, created on first use.
+lazy = LazyAttributes(globals(), resources={'td_engine': 'teradata_engine'})
+__getattr__ = lazy.getattr
 
 # A generic function to handle API requests and errors cleanly.
 def _teradata_query_api(request, query_func):
@@ -23,6 +26,7 @@ def _teradata_query_api(request, query_func):
     Helper function to process a generic Teradata query request.
     It extracts parameters and calls the provided service function.
     """
+    td_engine = lazy('td_engine')
     if td_engine is None:
         return JsonResponse({'error': 'Teradata connection is not available.'}, status=500)
 
@@ -34,9 +38,12 @@ def _teradata_query_api(request, query_func):
         return JsonResponse({'error': 'Missing required parameters: partition_id and triple_subject.'}, status=400)
 
     try:
-        with td_engine.connect() as conn:
-            result = query_func(conn, partition_id, triple_subject)
-            return JsonResponse({'result': result})
+        # Dashboard queries yield to interactive diagnoses (see admission.py).
+        with admission_lane('api'), td_engine.connect() as conn:
+            # Concurrent widgets calling the same check share one grouped query.
+            result = batched_check(query_func)(conn, partition_id, triple_subject)
+            # Checks comparing pandas values return numpy booleans, which are not JSON serialisable.
+            return JsonResponse({'result': bool(result)})
     except Exception as e:
         # Proper error handling to provide helpful feedback.
         return JsonResponse({'error': f'An error occurred: {e}'}, status=500)
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class TroubleshooterAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'troubleshooter_app'
+
+    def ready(self):
+        """
+        Registers the app's shared resources. Nothing is created here: they are
+        built on first use or by `registry.warm_up()` in the WSGI/ASGI entry points.
+        """
+        from .guides import connect_signals
+        from .instrumentation import register_pool_gauges
+        from .resources import registry
+
+        registry.register('teradata_engine', 'troubleshooter_app.services.get_teradata_engine')
+        registry.register('ontology', 'troubleshooter_app.services.load_ontology_index')
+
+        # Expose the engine's connection pool on the metrics endpoint once it exists.
+        register_pool_gauges('teradata', lambda: registry.peek('teradata_engine'))
+
+        # Keep the guides' full-text index in sync with the models.
+        connect_signals()
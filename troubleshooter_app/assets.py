@@ -0,0 +1,177 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`collectstatic` stores every file under a content-hashed name (see
+ManifestStaticFilesStorage) and writes gzip and, when the optional `brotli`
+package is installed, brotli variants next to it. `serve` answers /static/
+requests with the best variant the client accepts; hashed names never change
+content and are cached as immutable.
+
+Generated pyvis graph pages are rewritten by `save_graph` to load the shared
+vis-network, tom-select and bindings assets through their hashed URLs,
+instead of pyvis' CDN links and relative lib/ paths.
+"""
+import gzip
+import importlib.util
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.templatetags.static import static
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.html', '.js', '.json', '.map', '.svg', '.txt')
+# Smaller files are not worth a variant.
+MIN_COMPRESS_SIZE = 1024
+# Client encodings in order of preference, with the suffix of their variant.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# pyvis asset references -> the static names they are served under.
+GRAPH_ASSETS = {
+    'lib/bindings/utils.js': 'pyvis/bindings/utils.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/dist/vis-network.min.css': 'pyvis/vis-9.1.2/vis-network.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js': 'pyvis/vis-9.1.2/vis-network.min.js',
+    'lib/tom-select/tom-select.css': 'pyvis/tom-select/tom-select.css',
+    'lib/tom-select/tom-select.complete.min.js': 'pyvis/tom-select/tom-select.complete.min.js',
+}
+_GRAPH_ASSET_RE = re.compile(
+    r'(src|href)="(%s)"(?: integrity="[^"]*")?' % '|'.join(re.escape(url) for url in GRAPH_ASSETS))
+
+
+def _brotli():
+    if importlib.util.find_spec('brotli') is None:
+        return None
+    import brotli
+    return brotli
+
+
+def compress_file(path):
+    """Writes `path`.gz (and `path`.br with brotli installed) if they are smaller. Returns the written paths."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    brotli = _brotli()
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus gzip/brotli variants of the text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name) and self.size(name) >= MIN_COMPRESS_SIZE:
+                compress_file(self.path(name))
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # References to files that aren't shipped (e.g. the source map
+                # of the vendored vis-network build) are left as they are.
+                return matchobj.group(0)
+        return convert
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet (development checkouts, the test runner):
+            # refer to the unhashed file, as with DEBUG.
+            return name
+
+
+def fingerprinted_names():
+    """The hashed names listed in the staticfiles manifest."""
+    return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def graph_html(html):
+    """Points the asset references of a pyvis page at the hashed static files."""
+    return _GRAPH_ASSET_RE.sub(lambda m: f'{m.group(1)}="{static(GRAPH_ASSETS[m.group(2)])}"', html)
+
+
+def save_graph(net, path):
+    """Writes the pyvis network `net` to `path` with `graph_html` applied."""
+    html = graph_html(net.generate_html())
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def _accepted_encodings(request):
+    header = request.headers.get('Accept-Encoding', '')
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params.strip() and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve(request, path):
+    """
+    Serves a static file from STATIC_ROOT, falling back to the static
+    directories for files written after `collectstatic` (e.g. graph pages).
+    The brotli or gzip variant is sent when the client accepts it. Hashed
+    names get an immutable Cache-Control, everything else is revalidated.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    fingerprinted = os.path.isfile(full_path) and path in fingerprinted_names()
+    if not os.path.isfile(full_path):
+        full_path = finders.find(path)
+        if not full_path:
+            raise Http404(path)
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    served_path, content_encoding = full_path, None
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        accepted = _accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.isfile(full_path + suffix):
+                served_path, content_encoding = full_path + suffix, coding
+                break
+
+    response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if fingerprinted else 'no-cache'
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        response['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    return response
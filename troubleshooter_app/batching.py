@@ -0,0 +1,191 @@
+"""
+Micro-batching of concurrent check calls.
+
+When many users or dashboard widgets call the same check for different
+partitions at once, every call would be its own `pd.read_sql`. Calls made
+through `batched_check(function)` are grouped per check instead. While a
+grouped query of a check is in flight, the calls arriving for that check
+collect in its next batch. That batch is sent as soon as the previous query
+returns, as one `partition_id IN (...)` query of the check's fleet rule
+(see fleet.FLEET_RULES), with `xcol IN (...)` or `event_name IN (...)` for
+checks parametrised by the data channel. Every caller then gets its own
+answer from the grouped result. Warehouse round trips grow with the number
+of check types in use rather than with the number of calls.
+
+A check without a query in flight is queried right away, so a lone call
+waits no longer than before. FNFM_CHECK_BATCH_WINDOW_SECONDS adds a
+collection window before every grouped query.
+
+The grouped query runs on the connection of the call that opened the batch
+(the leader), in the highest-priority admission lane among the batch's
+calls (see admission.py), so an interactive call never queues behind a
+batch-lane leader. Every call waits, for the previous query or for its
+batch, at most until its own deadline or statement timeout. If the grouped
+query fails, e.g. because the leader's statement timeout cancelled it or
+the previous query outlived the leader's wait, each of the other calls runs
+its check unbatched on its own connection instead.
+
+Each call is still timed as the `check.<name>` stage, however it was
+answered; the grouped queries are also timed as `check_batch.<name>`.
+
+Only the service check functions that have a fleet rule are batched; any
+other function runs as it is, and so does every call when
+FNFM_CHECK_BATCHING is off.
+"""
+import functools
+import threading
+import time
+
+from django.conf import settings
+
+from .admission import LANES, admission_lane, current_lane
+from .instrumentation import metrics, stage
+from .resilience import CheckTimeout, remaining_time
+
+# Partitions per grouped query.
+MAX_BATCH_SIZE = 500
+
+
+class _Batch:
+    """The calls of one check collected for one grouped query, and its outcome."""
+
+    def __init__(self):
+        self.keys = {}
+        self.lanes = set()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class CheckBatcher:
+    """
+    Groups the calls of each check into batches. At most one batch per check
+    is collecting and one is being queried at any time.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._collecting = {}
+        self._in_flight = set()
+
+    def call(self, function, rule, conn, partition_id, triple_subject):
+        """Evaluates check `function` (with fleet rule `rule`) for one partition and channel, batched."""
+        name = function.__name__
+        key = (int(partition_id), triple_subject if rule.channel_column else None)
+        wait = _wait_seconds()
+        with self._condition:
+            batch = self._collecting.get(name)
+            leader = batch is None
+            if leader:
+                batch = self._collecting[name] = _Batch()
+            batch.keys[key] = None
+            batch.lanes.add(current_lane())
+        metrics.inc('fnfm_check_batch_calls_total', help_text='Batched check calls by role.',
+                    check=name, role='leader' if leader else 'follower')
+
+        if not leader:
+            if not batch.done.wait(wait):
+                raise CheckTimeout(f"{name} exceeded {wait:.1f}s waiting for its batch")
+            if batch.error is not None:
+                metrics.inc('fnfm_check_batch_calls_total', help_text='Batched check calls by role.',
+                            check=name, role='fallback')
+                # Untimed: the caller already times the call as its check stage.
+                return getattr(function, '__wrapped__', function)(conn, partition_id, triple_subject)
+            return batch.results.get(key, False)
+
+        deadline = None if wait is None else time.monotonic() + wait
+        window = getattr(settings, 'FNFM_CHECK_BATCH_WINDOW_SECONDS', 0.0)
+        if window:
+            time.sleep(window)
+        with self._condition:
+            # Calls keep joining the batch until the previous query of the check returns.
+            while name in self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            del self._collecting[name]
+            stuck = name in self._in_flight
+            if not stuck:
+                self._in_flight.add(name)
+                lane = min(batch.lanes, key=LANES.index)
+        if stuck:
+            # The previous query outlived the leader's wait: the others fall back.
+            batch.error = CheckTimeout(f"{name} exceeded {wait:.1f}s waiting for the previous batch")
+            batch.done.set()
+            raise batch.error
+        try:
+            with admission_lane(lane):
+                batch.results = self._query(name, rule, conn, list(batch.keys))
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            with self._condition:
+                self._in_flight.discard(name)
+                self._condition.notify_all()
+            batch.done.set()
+        return batch.results.get(key, False)
+
+    def _query(self, name, rule, conn, keys):
+        """{(partition_id, data_channel or None): fired} of the given calls; absent pairs never fired."""
+        from .fleet import fired_mask, rule_values
+
+        partition_ids = sorted({partition_id for partition_id, _ in keys})
+        channels = {channel for _, channel in keys} if rule.channel_column else None
+        results = {}
+        for i in range(0, len(partition_ids), MAX_BATCH_SIZE):
+            chunk = partition_ids[i:i + MAX_BATCH_SIZE]
+            with stage(f"check_batch.{name}"):
+                values = rule_values(conn, rule, "partition_id IN :partition_ids", {'partition_ids': chunk}, channels)
+            metrics.inc('fnfm_check_batch_queries_total', help_text='Grouped check queries sent.', check=name)
+            fired = fired_mask(rule, values['value'])
+            for partition_id, channel, is_fired in zip(values['partition_id'], values['data_channel'], fired):
+                results[int(partition_id), channel if rule.channel_column else None] = bool(is_fired)
+        return results
+
+
+def _wait_seconds():
+    """How long a call waits for its batch: until its deadline or statement timeout, whichever comes first."""
+    timeout = float(getattr(settings, 'FNFM_CHECK_TIMEOUT_SECONDS', 15) or 0) or None
+    remaining = remaining_time()
+    if remaining is not None:
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    return None if timeout is None else max(timeout, 0.0)
+
+
+_batcher = CheckBatcher()
+_wrappers = {}
+_wrappers_lock = threading.Lock()
+
+
+def batched_check(function):
+    """
+    Returns a check function with the name and signature of `function` whose
+    calls go through the batcher, or `function` itself when it is not a
+    service check with a fleet rule.
+    """
+    wrapper = _wrappers.get(function)
+    if wrapper is not None:
+        return wrapper
+
+    from . import services
+    from .fleet import FLEET_RULES
+
+    name = getattr(function, '__name__', None)
+    rule = FLEET_RULES.get(name)
+    if rule is None or getattr(services, name, None) is not function:
+        wrapper = function
+    else:
+        @functools.wraps(function)
+        def wrapper(conn, partition_id, triple_subject):
+            if not getattr(settings, 'FNFM_CHECK_BATCHING', True):
+                return function(conn, partition_id, triple_subject)
+            try:
+                int(partition_id)
+            except (TypeError, ValueError):
+                return function(conn, partition_id, triple_subject)
+            with stage(f"check.{name}"):
+                return _batcher.call(function, rule, conn, partition_id, triple_subject)
+    with _wrappers_lock:
+        return _wrappers.setdefault(function, wrapper)
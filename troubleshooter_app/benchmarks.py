@@ -0,0 +1,156 @@
+"""
+Scaling benchmarks for the ontology and diagnosis services.
+
+Each size builds a synthetic knowledge graph with that many spreadsheet rows
+and a fleet with that many partitions, then times the service functions
+against the SQLite Teradata stand-in. Results are plain dicts so they can be
+written to JSON and compared with a previous run.
+"""
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.test import RequestFactory
+
+from . import synthetic, views
+from .ontology_index import OntologyIndex, compile_index
+from .services import (
+    execute_troubleshooting_logic,
+    get_root_cause_analysis,
+    graph_search_tuple,
+    recursive_execute_function,
+)
+
+BENCHMARKED_FUNCTIONS = [
+    'build_graph',
+    'graph_search_tuple',
+    'compile_index',
+    'index_search_tuple',
+    'recursive_execute_function',
+    'execute_troubleshooting_logic',
+    'get_root_cause_analysis',
+    'get_form_choices',
+]
+
+DIAGNOSIS_FUNCTIONS = [
+    'graph_search_tuple',
+    'recursive_execute_function',
+    'execute_troubleshooting_logic',
+    'get_root_cause_analysis',
+]
+
+
+def measure(func, repeat):
+    """Times `repeat` calls of `func`, then measures the peak memory of one more."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not was_tracing:
+        tracemalloc.stop()
+    return result, timings, peak
+
+
+def run_size(size, repeat=3, check_partitions=3, latency=0.0, functions=None, seed=0):
+    """Benchmarks every selected function at one size and returns the records."""
+    functions = functions or BENCHMARKED_FUNCTIONS
+    records = []
+
+    def record(name, func):
+        if name not in functions:
+            return func()
+        result, timings, peak = measure(func, repeat)
+        records.append({
+            'function': name,
+            'size': size,
+            'median_seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            'peak_bytes': peak,
+        })
+        return result
+
+    df = synthetic.generate_ontology_rows(size, seed=seed)
+    graph = record('build_graph', lambda: synthetic.build_graph(df))
+    mapping = synthetic.synthetic_check_mapping(df)
+    failure = df.iloc[0, 0]
+    channels = df.loc[df.iloc[:, 0] == failure, 'data channel'].tolist()
+
+    metadata = synthetic.generate_metadata(size, seed=seed)
+    engine = synthetic.create_standin_engine(
+        metadata, channels, check_partitions=metadata['partition_id'][:check_partitions],
+        latency=latency, seed=seed,
+    )
+    partition_id = int(metadata['partition_id'].iloc[0])
+
+    try:
+        # The diagnosis stages depend on each other, so they only run when one is selected.
+        if set(functions) & set(DIAGNOSIS_FUNCTIONS):
+            dic_tuple_result = record('graph_search_tuple', lambda: graph_search_tuple(graph, failure, max_depth=-1))
+            if 'recursive_execute_function' in functions:
+                with engine.connect() as conn:
+                    record('recursive_execute_function',
+                           lambda: recursive_execute_function(dic_tuple_result, mapping, conn, partition_id))
+            if set(functions) & {'execute_troubleshooting_logic', 'get_root_cause_analysis'}:
+                df_clean, _ = record('execute_troubleshooting_logic',
+                                     lambda: execute_troubleshooting_logic(graph, engine, partition_id, failure, mapping=mapping))
+                record('get_root_cause_analysis', lambda: get_root_cause_analysis(df_clean, failure))
+
+        if set(functions) & {'compile_index', 'index_search_tuple'}:
+            with tempfile.TemporaryDirectory() as tmp:
+                index_path = os.path.join(tmp, 'ontology.idx')
+                record('compile_index', lambda: compile_index(graph, index_path))
+                index = OntologyIndex(index_path)
+                record('index_search_tuple', lambda: graph_search_tuple(index, failure, max_depth=-1))
+                del index
+
+        if 'get_form_choices' in functions:
+            factory = RequestFactory()
+            with synthetic.use_engine(engine):
+                record('get_form_choices', lambda: views.get_form_choices(
+                    factory.get('/troubleshooter/api/get_choices/', {'parent_field': 'serial_number'})))
+    finally:
+        engine.standin_keepalive.close()
+        engine.dispose()
+    return records
+
+
+def run_benchmarks(sizes, **kwargs):
+    records = []
+    for size in sizes:
+        records.extend(run_size(size, **kwargs))
+    return records
+
+
+def compare(records, baseline, tolerance=0.25):
+    """
+    Returns the records whose median time or peak memory grew by more than
+    `tolerance` (a fraction) compared with the matching baseline record.
+    """
+    previous = {(r['function'], r['size']): r for r in baseline}
+    regressions = []
+    for current in records:
+        before = previous.get((current['function'], current['size']))
+        if before is None:
+            continue
+        for metric in ('median_seconds', 'peak_bytes'):
+            if before[metric] and current[metric] > before[metric] * (1 + tolerance):
+                regressions.append({
+                    'function': current['function'],
+                    'size': current['size'],
+                    'metric': metric,
+                    'before': before[metric],
+                    'after': current[metric],
+                })
+    return regressions
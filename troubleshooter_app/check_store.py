@@ -0,0 +1,131 @@
+"""
+Persisted check results (the CheckResult model), keyed by partition, check
+function and data channel.
+
+The `prewarm_checks` watcher fills the store for newly landed partitions and
+the incremental diagnoses (single-failure and all-failures, see
+incremental.py) read it before running a check, so diagnoses of those
+partitions skip the warehouse. Only evaluated results are stored; UNKNOWN
+ones are retried by the next diagnosis.
+
+A partition usually lands while its job is still writing rows, so a stored
+result only stands for the warehouse as it was when it was evaluated. It is
+trusted while the version of its source table it was stored with is
+current (`load_versioned_results`). Without a version, it is only trusted
+when evaluated after a given time, e.g. by the worker a coalesced
+diagnosis waited for, and for FNFM_CHECK_RESULT_MAX_AGE_SECONDS at most
+(`load_check_results`).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .instrumentation import count_cache
+from .models import CheckResult, Watermark
+from .resilience import is_unknown
+
+
+def check_name(function):
+    return getattr(function, '__name__', str(function))
+
+
+def _partition_key(partition_id):
+    try:
+        return int(partition_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def max_age():
+    """How long a stored result is trusted, in seconds (FNFM_CHECK_RESULT_MAX_AGE_SECONDS)."""
+    return float(getattr(settings, 'FNFM_CHECK_RESULT_MAX_AGE_SECONDS', 300) or 0)
+
+
+def load_check_results(partition_id, keys, since=None):
+    """
+    Returns {(function, channel): fired} for the stored results among `keys`,
+    a list of (check function, data channel) pairs. Only the results
+    evaluated after `since` are returned, by default the ones younger than
+    `max_age()`; older results are treated as missing.
+    """
+    partition_key = _partition_key(partition_id)
+    if partition_key is None or not keys:
+        return {}
+    if since is None:
+        since = timezone.now() - timedelta(seconds=max_age())
+    by_name = {(check_name(function), channel): (function, channel) for function, channel in keys}
+    try:
+        rows = CheckResult.objects.filter(
+            partition_id=partition_key,
+            check_name__in={name for name, _ in by_name},
+            data_channel__in={channel for _, channel in by_name},
+            evaluated_at__gt=since,
+        ).values_list('check_name', 'data_channel', 'fired')
+        found = {by_name[name, channel]: fired for name, channel, fired in rows if (name, channel) in by_name}
+    except DatabaseError as e:
+        print(f"Error reading stored check results: {e}")
+        return {}
+    for key in by_name.values():
+        count_cache('check_results', key in found)
+    return found
+
+
+def load_versioned_results(partition_id, keys):
+    """
+    Returns {(function, channel): (fired, source version)} for the stored
+    results among `keys` that were stored with a source version, however
+    old they are: they are trusted while the version is unchanged.
+    """
+    partition_key = _partition_key(partition_id)
+    if partition_key is None or not keys:
+        return {}
+    by_name = {(check_name(function), channel): (function, channel) for function, channel in keys}
+    try:
+        rows = CheckResult.objects.filter(
+            partition_id=partition_key,
+            check_name__in={name for name, _ in by_name},
+            data_channel__in={channel for _, channel in by_name},
+        ).exclude(source_version='').values_list('check_name', 'data_channel', 'fired', 'source_version')
+        return {by_name[name, channel]: (fired, version) for name, channel, fired, version in rows
+                if (name, channel) in by_name}
+    except DatabaseError as e:
+        print(f"Error reading stored check results: {e}")
+        return {}
+
+
+def save_check_results(partition_id, results, versions=None):
+    """
+    Stores {(function, channel): result}, skipping UNKNOWN results, with the
+    source versions {(function, channel): version} they were evaluated at,
+    if known. Returns the number stored.
+    """
+    partition_key = _partition_key(partition_id)
+    versions = versions or {}
+    rows = [
+        CheckResult(partition_id=partition_key, check_name=check_name(function), data_channel=channel,
+                    fired=bool(result), source_version=versions.get((function, channel)) or '')
+        for (function, channel), result in results.items()
+        if not is_unknown(result)
+    ]
+    if partition_key is None or not rows:
+        return 0
+    CheckResult.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['partition_id', 'check_name', 'data_channel'],
+        update_fields=['fired', 'evaluated_at', 'source_version'],
+    )
+    return len(rows)
+
+
+# --- Watermarks ---
+
+def get_watermark(name, default=None):
+    value = Watermark.objects.filter(name=name).values_list('value', flat=True).first()
+    return default if value is None else value
+
+
+def set_watermark(name, value):
+    with transaction.atomic():
+        Watermark.objects.update_or_create(name=name, defaults={'value': str(value)})
+
@@ -0,0 +1,179 @@
+"""
+Single-flight coalescing of identical concurrent diagnoses.
+
+During an incident several engineers open the same job and failure at once.
+`single_flight(key, function, ...)` runs `function` once per key at a time:
+the first caller (the leader) runs it, and callers arriving meanwhile (the
+followers) wait for its result, or its exception, instead of running their
+own ontology traversal and Teradata checks. Diagnoses are keyed by
+`diagnosis_key(partition_id, failure, ontology version)`.
+
+Within a process, followers wait on the leader's Flight. Across worker
+processes, the leader also holds a DiagnosisLock row in the local database
+(FNFM_COALESCE_DB_LOCK). A worker finding the row held waits until it is
+released, or has expired because its leader died, and then runs the
+diagnosis itself: the views run coalesced diagnoses with
+`store_results=True`, and while the lock is held after such a wait
+(`handoff_since`), `evaluate_checks` reads the check results stored since
+the wait started, i.e. the leader's, instead of querying Teradata. Older
+stored results are not handed off.
+
+Followers wait at most FNFM_COALESCE_WAIT_SECONDS, then run the function
+uncoalesced.
+"""
+import contextvars
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .instrumentation import metrics
+from .models import DiagnosisLock
+
+DB_LOCK_POLL_SECONDS = 0.1
+
+_HELP = 'Diagnoses by their role in single-flight coalescing.'
+
+_handoff_since = contextvars.ContextVar('fnfm_handoff_since', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def wait_seconds():
+    return _setting('FNFM_COALESCE_WAIT_SECONDS', 90.0)
+
+
+def diagnosis_key(partition_id, failure, version):
+    """The coalescing key of a diagnosis; '10001' and 10001 are the same partition."""
+    try:
+        partition_id = int(partition_id)
+    except (TypeError, ValueError):
+        pass
+    return f"diagnosis:{partition_id}:{version}:{failure}"
+
+
+class Flight:
+    """An in-process run of a key: its outcome, set before `done`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(key, function, *args, **kwargs):
+    """
+    Returns `function(*args, **kwargs)`, sharing one run among the concurrent
+    callers with the same `key`. The result is shared, not copied: callers
+    must not modify it.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+
+    if not leader:
+        metrics.inc('fnfm_coalesced_diagnoses_total', help_text=_HELP, role='follower')
+        if not flight.done.wait(wait_seconds()):
+            metrics.inc('fnfm_coalesced_diagnoses_total', help_text=_HELP, role='timeout')
+            return function(*args, **kwargs)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    metrics.inc('fnfm_coalesced_diagnoses_total', help_text=_HELP, role='leader')
+    try:
+        with db_lock(key):
+            flight.result = function(*args, **kwargs)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+# --- Cross-worker lock ---
+
+def handoff_since():
+    """
+    When the current diagnosis waited for another worker's lock, the time
+    it started waiting: check results stored since then are that worker's
+    and may be reused. None otherwise.
+    """
+    return _handoff_since.get()
+
+
+def lock_name(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _poll_wait():
+    time.sleep(DB_LOCK_POLL_SECONDS)
+
+
+def _acquire(name, owner, ttl):
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            DiagnosisLock.objects.filter(key=name, expires_at__lte=now).delete()
+            DiagnosisLock.objects.create(key=name, owner=owner, expires_at=now + timedelta(seconds=ttl))
+        return True
+    except IntegrityError:
+        return False
+
+
+@contextmanager
+def db_lock(key):
+    """
+    Holds the DiagnosisLock of `key` for the block, first waiting while
+    another worker holds it. After FNFM_COALESCE_WAIT_SECONDS, or if the
+    database fails, the block runs without the lock.
+    """
+    if not _setting('FNFM_COALESCE_DB_LOCK', True):
+        yield
+        return
+
+    name, owner, wait = lock_name(key), uuid.uuid4().hex, wait_seconds()
+    waiting_since = timezone.now()
+    deadline = time.monotonic() + wait
+    acquired = waited = False
+    while True:
+        try:
+            acquired = _acquire(name, owner, wait)
+        except DatabaseError as e:
+            print(f"Error taking the diagnosis lock: {e}")
+            break
+        if acquired or time.monotonic() >= deadline:
+            break
+        waited = True
+        _poll_wait()
+    if waited:
+        metrics.inc('fnfm_coalesced_diagnoses_total', help_text=_HELP,
+                    role='worker_follower' if acquired else 'timeout')
+
+    token = _handoff_since.set(waiting_since if waited and acquired else None)
+    try:
+        yield
+    finally:
+        _handoff_since.reset(token)
+        if acquired:
+            try:
+                DiagnosisLock.objects.filter(key=name, owner=owner).delete()
+            except DatabaseError as e:
+                print(f"Error releasing the diagnosis lock: {e}")
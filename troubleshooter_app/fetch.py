@@ -0,0 +1,78 @@
+"""
+Chunked, Arrow-backed fetching of large Teradata result sets.
+
+`pd.read_sql` builds the whole result as Python rows before converting it.
+Here rows are streamed from the cursor `chunk_size` at a time, and each chunk
+is converted to a `pyarrow.RecordBatch` right away. Peak memory is then
+bounded by one chunk of Python objects plus the compact columnar data.
+
+Columns can be given dtype hints:
+    'category'   dictionary-encoded strings (pandas Categorical)
+    'timestamp'  native timestamps, parsed from strings if needed
+    any Arrow type alias ('int64', 'float64', 'string', ...)
+
+Consumers iterate over the batches (`iter_batches`), or collect them into an
+Arrow table (`fetch_table`) or a DataFrame (`fetch_frame`). With
+`arrow_dtypes=True`, `fetch_frame` wraps the Arrow buffers without copying.
+"""
+from .resources import lazy_import
+
+pa = lazy_import('pyarrow')
+pd = lazy_import('pandas')
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def _column_array(values, hint):
+    if hint == 'category':
+        array = pa.array(values)
+        return (array.cast(pa.string()) if pa.types.is_null(array.type) else array).dictionary_encode()
+    if hint == 'timestamp':
+        array = pa.array(values)
+        return array if pa.types.is_timestamp(array.type) else array.cast(pa.timestamp('us'))
+    if hint:
+        return pa.array(values, type=pa.type_for_alias(hint))
+    return pa.array(values)
+
+
+def iter_batches(conn, statement, params=None, dtypes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Executes `statement` (SQL text or an SQLAlchemy statement) on the
+    connection `conn` and yields its rows as RecordBatches of at most
+    `chunk_size` rows. `dtypes` maps column names to dtype hints. An empty
+    result yields a single empty batch, so the columns are still known.
+    """
+    from sqlalchemy import text
+
+    if isinstance(statement, str):
+        statement = text(statement)
+    dtypes = dtypes or {}
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(statement, params or {})
+    names = list(result.keys())
+    empty = True
+    for rows in result.partitions(chunk_size):
+        empty = False
+        columns = zip(*rows)
+        arrays = [_column_array(list(values), dtypes.get(name)) for name, values in zip(names, columns)]
+        yield pa.RecordBatch.from_arrays(arrays, names=names)
+    if empty:
+        yield pa.RecordBatch.from_arrays([_column_array([], dtypes.get(name)) for name in names], names=names)
+
+
+def fetch_table(conn, statement, params=None, dtypes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Collects `iter_batches` into one Arrow table with unified dictionaries."""
+    tables = [pa.Table.from_batches([batch]) for batch in iter_batches(conn, statement, params, dtypes, chunk_size)]
+    # Types can vary between chunks, e.g. an all-NULL chunk or ints next to floats.
+    return pa.concat_tables(tables, promote_options='permissive').unify_dictionaries().combine_chunks()
+
+
+def fetch_frame(conn, statement, params=None, dtypes=None, chunk_size=DEFAULT_CHUNK_SIZE, arrow_dtypes=False):
+    """
+    Fetches a result set into a DataFrame through Arrow. Numpy-backed columns
+    by default; with `arrow_dtypes` the columns are ArrowDtype views of the
+    Arrow buffers, without copying.
+    """
+    table = fetch_table(conn, statement, params, dtypes, chunk_size)
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
@@ -0,0 +1,250 @@
+"""
+Fleet-wide analytics: how often failures, root causes, triggers and data
+channels fire across the fleet, by tool serial number or by month.
+
+Instead of running the per-partition check functions once per job, every
+check rule is evaluated for all partitions of a time window with one grouped
+query (FLEET_RULES mirrors the SQL and threshold of each check function).
+The thresholds are applied to the aggregates with NumPy. The firing
+(partition, check, channel) rows are then joined with the ontology's
+failure -> root cause -> trigger -> data channel paths. The joined firings
+are cached per window and ontology version (FNFM_FLEET_CACHE_SECONDS), and
+every heatmap is a group-by over them.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .fetch import fetch_frame
+from .instrumentation import count_cache, stage
+from .resources import lazy_import
+from .services import CHECK_FUNCTIONS, METADATA_DTYPES, execute_query_for_concept, get_all_failure_labels, ontology_version
+from .snapshot import ontology_snapshot
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+METADATA_TABLE = 'PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA'
+LIMIT_CHECK_PER_JOB = 'PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB'
+STATUS_WORDS_PER_JOB = 'PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB'
+
+# A check rule evaluated over all partitions: `value` aggregated per
+# partition (and per `channel_column`, for checks parametrised by the data
+# channel) over the rows matching `where`; the check fires when the value
+# exceeds `threshold`. `extra` maps further reported columns to aggregates.
+FleetRule = namedtuple('FleetRule', 'table value channel_column where threshold extra', defaults=((),))
+
+FLEET_RULES = {
+    'threshold_sup_10450': FleetRule(
+        LIMIT_CHECK_PER_JOB, 'SUM(error_count)', None,
+        "xcol = 'MCDIGVLTFM' AND (metric_name = 'above_sigma_one' OR metric_name = 'below_sigma_one')", 10450),
+    'threshold_sup_12000': FleetRule(LIMIT_CHECK_PER_JOB, 'SUM(error_count)', None, "xcol = 'MCREFVLTFM'", 12000),
+    'threshold_sup_5000': FleetRule(
+        LIMIT_CHECK_PER_JOB, 'SUM(error_count)', None,
+        "(metric_name = 'above_sigma_one' OR metric_name = 'below_sigma_one') AND xcol = 'MCINVLTFM'", 5000),
+    'discrete_sup_10': FleetRule(
+        STATUS_WORDS_PER_JOB, 'SUM(count_error)', 'xcol', "xcol_decoded = 'FNFM_TripPhaseAFM'", 10),
+    'discrete_sup_20': FleetRule(
+        STATUS_WORDS_PER_JOB, 'SUM(count_error)', 'xcol', "xcol_decoded = 'FNFM_EIPUplinkMessageSend'", 20),
+    'mcrterrfm_check': FleetRule(
+        STATUS_WORDS_PER_JOB, 'SUM(count_error)', None,
+        "xcol = 'MCRTERRFM' AND xcol_decoded IN ('FNFM_EIPUplinkMessageSend', 'FNFM_EIPITCMessageSend', "
+        "'FNFM_EIPLoopbackMessageSend', 'FNFM_EIPDownlinkMessageReceive')", 1),
+    'limit_check': FleetRule(
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg',
+        'SUM(error_count)', 'xcol', None, 0, (('min_value', 'MIN("min")'), ('max_value', 'MAX("max")'))),
+    'status_check': FleetRule(
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_status_checks', 'COUNT(*)', 'event_name', None, 0),
+    'large_pump': FleetRule(
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_large_pump_cal_check',
+        'COUNT(*)', None, "health_indicator = 'Fail'", 0),
+    'small_pump': FleetRule(
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_small_pump_cal_check',
+        'COUNT(*)', None, "health_indicator = 'Fail'", 0),
+    'mterrstafm_check': FleetRule(
+        STATUS_WORDS_PER_JOB, 'SUM(count_error)', None,
+        "xcol = 'MTERRSTAFM' AND xcol_decoded IN ('FNFM_FaultIbusFM', 'FNFM_TripPhaseBFM', 'FNFM_TripPhaseCFM', "
+        "'FNFM_FaultIbFM', 'FNFM_FaultIaFM', 'FNFM_TripPhaseAFM')", 1),
+}
+
+DIMENSIONS = ['failure', 'root_cause', 'trigger', 'data_channel']
+GROUPINGS = ['serial_number', 'month']
+
+_PATH_COLUMNS = ['failure', 'root_cause', 'trigger', 'data_channel', 'check']
+
+
+# --- Ontology Paths ---
+
+def ontology_paths(g, mapping=None):
+    """
+    Returns a DataFrame of every failure -> root cause -> trigger -> data
+    channel path of the ontology, with the name of the trigger's check.
+    """
+    mapping = CHECK_FUNCTIONS if mapping is None else mapping
+    g = ontology_snapshot(g)
+    triples = {}
+
+    def objects(concept, predicate):
+        if concept not in triples:
+            triples[concept] = execute_query_for_concept(g, concept)
+        return [o for s, p, o in triples[concept] if s == concept and p == predicate]
+
+    rows = []
+    for failure in get_all_failure_labels(g):
+        for root_cause in objects(failure, 'hasRootCause'):
+            for trigger in objects(root_cause, 'isTriggeredBy'):
+                function = mapping.get(trigger)
+                if function is None:
+                    continue
+                for channel in objects(trigger, 'consume'):
+                    rows.append((failure, root_cause, trigger, channel, function.__name__))
+    return pd.DataFrame(rows, columns=_PATH_COLUMNS).drop_duplicates()
+
+
+# --- Set-based Check Evaluation ---
+
+def _window_filter():
+    return f"partition_id IN (SELECT partition_id FROM {METADATA_TABLE} WHERE job_start >= :start AND job_start < :end)"
+
+
+def rule_values(conn, rule, partition_filter, params, channels=None):
+    """
+    Runs one grouped query for a rule over the partitions matched by the SQL
+    condition `partition_filter` (using the binds `params`). Returns a
+    DataFrame of partition_id, data_channel (None for rules that don't
+    depend on the channel), value and the rule's extra columns.
+    """
+    from sqlalchemy import bindparam, text
+
+    conditions = [partition_filter]
+    if rule.where:
+        conditions.append(f"({rule.where})")
+    params = dict(params)
+    if rule.channel_column:
+        select = f"partition_id, {rule.channel_column} AS data_channel"
+        group_by = f"partition_id, {rule.channel_column}"
+        if channels is not None:
+            conditions.append(f"{rule.channel_column} IN :channels")
+            params['channels'] = sorted(channels)
+    else:
+        select, group_by = "partition_id, NULL AS data_channel", "partition_id"
+    extra = "".join(f", {expression} AS {name}" for name, expression in rule.extra)
+    statement = text(f"""
+    SELECT {select}, {rule.value} AS value{extra}
+    FROM {rule.table}
+    WHERE {' AND '.join(conditions)}
+    GROUP BY {group_by}""")
+    expanding = [bindparam(name, expanding=True) for name, value in params.items() if isinstance(value, list)]
+    if expanding:
+        statement = statement.bindparams(*expanding)
+
+    return fetch_frame(conn, statement, params, dtypes={'partition_id': 'int64'})
+
+
+def fired_mask(rule, values):
+    """Applies the rule's threshold to a column of aggregates; NULL aggregates never fire."""
+    values = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=float)
+    return np.nan_to_num(values, nan=-np.inf) > rule.threshold
+
+
+def evaluate_rule(conn, rule, start, end, channels=None):
+    """
+    Evaluates one rule for every partition of the window with one grouped
+    query. Returns a DataFrame of the firing (partition_id, data_channel)
+    pairs; data_channel is None for rules that don't depend on the channel.
+    """
+    values = rule_values(conn, rule, _window_filter(), {'start': start, 'end': end}, channels)
+    return values.loc[fired_mask(rule, values['value']), ['partition_id', 'data_channel']]
+
+
+def fleet_metadata(conn, start, end):
+    """Returns partition_id, serial_number and month (YYYY-MM) of the jobs started in the window."""
+    df = fetch_frame(conn, f"""
+    SELECT partition_id, serial_number, job_start
+    FROM {METADATA_TABLE}
+    WHERE job_start >= :start AND job_start < :end""", {'start': start, 'end': end}, dtypes=METADATA_DTYPES)
+    month = df['job_start'].dt.strftime('%Y-%m')
+    return pd.DataFrame({
+        'partition_id': df['partition_id'],
+        'serial_number': df['serial_number'].astype(str),
+        'month': month.fillna('unknown'),
+    })
+
+
+def compute_firings(g, td_engine, start, end, mapping=None):
+    """
+    Evaluates every check rule of the ontology over the partitions started
+    in [start, end). Returns a DataFrame of (partition_id, serial_number,
+    month, failure, root_cause, trigger, data_channel) firings and the names
+    of the checks without a fleet rule.
+    """
+    paths = ontology_paths(g, mapping)
+    checks = sorted(paths['check'].unique())
+    unsupported = [check for check in checks if check not in FLEET_RULES]
+
+    fired_frames = []
+    with td_engine.connect() as conn:
+        with stage('fleet_metadata'):
+            metadata = fleet_metadata(conn, start, end)
+        for check in checks:
+            rule = FLEET_RULES.get(check)
+            if rule is None:
+                continue
+            channels = set(paths.loc[paths['check'] == check, 'data_channel']) if rule.channel_column else None
+            with stage('fleet_query'):
+                fired_frames.append(evaluate_rule(conn, rule, start, end, channels).assign(check=check))
+
+    columns = ['partition_id', 'serial_number', 'month'] + DIMENSIONS
+    if not fired_frames:
+        return pd.DataFrame(columns=columns), unsupported
+    fired = pd.concat(fired_frames, ignore_index=True)
+    by_channel = fired[fired['data_channel'].notna()].merge(paths, on=['check', 'data_channel'])
+    any_channel = fired[fired['data_channel'].isna()].drop(columns='data_channel').merge(paths, on='check')
+    firings = pd.concat([by_channel, any_channel], ignore_index=True).merge(metadata, on='partition_id')
+    return firings[columns].drop_duplicates().reset_index(drop=True), unsupported
+
+
+# --- Heatmaps ---
+
+def default_window(today=None):
+    """The last twelve full months plus the current one, as (start, end) datetimes."""
+    today = today or date.today()
+    return datetime(today.year - 1, today.month, 1), datetime(today.year + today.month // 12, today.month % 12 + 1, 1)
+
+
+def get_firings(g, td_engine, start, end, mapping=None):
+    """compute_firings, cached per window and ontology version."""
+    key = f"fnfm_fleet:{ontology_version(g)}:{start.isoformat()}:{end.isoformat()}"
+    cached = cache.get(key) if mapping is None else None
+    count_cache('fleet_firings', cached is not None)
+    if cached is None:
+        cached = compute_firings(g, td_engine, start, end, mapping)
+        if mapping is None:
+            cache.set(key, cached, getattr(settings, 'FNFM_FLEET_CACHE_SECONDS', 3600))
+    return cached
+
+
+def heatmap(firings, dimension='root_cause', by='month', limit=50):
+    """
+    Counts the partitions in which each `dimension` value fired, per `by`
+    bucket. Returns {'rows', 'columns', 'values', 'totals', 'partitions'},
+    the rows ordered by their total, largest first, and cut to `limit`.
+    """
+    if dimension not in DIMENSIONS or by not in GROUPINGS:
+        raise ValueError(f"dimension must be one of {', '.join(DIMENSIONS)} and by one of {', '.join(GROUPINGS)}.")
+    counts = (firings.groupby([dimension, by])['partition_id'].nunique()
+              .unstack(fill_value=0).sort_index(axis=1))
+    totals = firings.groupby(dimension)['partition_id'].nunique()
+    order = totals.sort_values(ascending=False, kind='stable').index[:limit]
+    counts = counts.reindex(order)
+    return {
+        'dimension': dimension,
+        'by': by,
+        'rows': [str(label) for label in counts.index],
+        'columns': [str(label) for label in counts.columns],
+        'values': counts.to_numpy(dtype=int).tolist(),
+        'totals': [int(totals[label]) for label in counts.index],
+        'partitions': int(firings['partition_id'].nunique()),
+    }
@@ -0,0 +1,151 @@
+"""
+Troubleshooting guides for the diagnosed root causes.
+
+Guides are linked to ontology labels (root causes and data channels) by
+GuideLabel rows, so the results page finds the guides of every red root
+cause with one query on the indexed label column. Free-text search goes
+through an SQLite FTS5 table (FTS_TABLE, created by migration 0003) holding
+the title, description, solution and labels of each guide under the guide's
+id; it is kept in sync by the save and delete signals connected in
+`connect_signals`. Other database backends fall back to unranked
+`icontains` filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from .models import GuideLabel, TroubleshooterGuide
+
+FTS_TABLE = 'troubleshooter_app_guide_fts'
+# bm25 weights of the title, description, solution and labels columns.
+RANK_WEIGHTS = (10.0, 2.0, 1.0, 5.0)
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+GUIDE_TABLE = TroubleshooterGuide._meta.db_table
+LABEL_TABLE = GuideLabel._meta.db_table
+
+# Same token boundaries as FTS5's unicode61 tokenizer: letters and digits.
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_guides(guide_ids):
+    """(Re)writes the FTS rows of the given guides; deleted guides just lose theirs."""
+    if not fts_available() or not guide_ids:
+        return
+    guide_ids = [int(guide_id) for guide_id in guide_ids]
+    placeholders = ', '.join(['%s'] * len(guide_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", guide_ids)
+        cursor.execute(f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, description, solution, labels)
+        SELECT g.id, g.title, g.description, g.solution,
+               COALESCE((SELECT group_concat(l.label, char(10)) FROM {LABEL_TABLE} l WHERE l.guide_id = g.id), '')
+        FROM {GUIDE_TABLE} g
+        WHERE g.id IN ({placeholders})""", guide_ids)
+
+
+def rebuild_index():
+    """Reindexes every guide, e.g. after bulk_create or raw SQL that bypassed the signals."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    index_guides(list(TroubleshooterGuide.objects.values_list('id', flat=True)))
+
+
+def _guide_saved(sender, instance, **kwargs):
+    index_guides([instance.pk])
+
+
+def _label_changed(sender, instance, **kwargs):
+    index_guides([instance.guide_id])
+
+
+def connect_signals():
+    """Keeps the FTS table in sync with guide and label saves and deletes."""
+    post_save.connect(_guide_saved, sender=TroubleshooterGuide, dispatch_uid='guide_fts_save')
+    post_delete.connect(_guide_saved, sender=TroubleshooterGuide, dispatch_uid='guide_fts_delete')
+    post_save.connect(_label_changed, sender=GuideLabel, dispatch_uid='guide_label_fts_save')
+    post_delete.connect(_label_changed, sender=GuideLabel, dispatch_uid='guide_label_fts_delete')
+
+
+def guides_for_labels(root_causes=(), data_channels=()):
+    """
+    Returns the guides linked to any of the given root cause and data channel
+    labels, fetched with one query: a list of {'label', 'kind', 'guides'}
+    entries ordered by label, each guide a dict of id, title, description
+    and solution.
+    """
+    condition = Q(kind=GuideLabel.ROOT_CAUSE, label__in=set(root_causes)) | \
+        Q(kind=GuideLabel.DATA_CHANNEL, label__in=set(data_channels))
+    rows = (GuideLabel.objects.filter(condition)
+            .order_by('label', 'kind', 'guide__title', 'guide_id')
+            .values_list('label', 'kind', 'guide_id', 'guide__title', 'guide__description', 'guide__solution'))
+
+    entries = {}
+    for label, kind, guide_id, title, description, solution in rows:
+        entry = entries.setdefault((label, kind), {'label': label, 'kind': kind, 'guides': []})
+        entry['guides'].append({'id': guide_id, 'title': title, 'description': description, 'solution': solution})
+    return list(entries.values())
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query: every word must match, the last one
+    as a prefix so the endpoint can serve a typeahead. Returns None for text
+    without words.
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_guides(text, limit=SEARCH_LIMIT):
+    """
+    Returns the guides matching `text`, best first, as dicts of id, title,
+    description, solution, labels and score (higher is better).
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    if not fts_available():
+        return _search_guides_orm(text, limit)
+
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+        SELECT g.id, g.title, g.description, g.solution, {FTS_TABLE}.labels, bm25({FTS_TABLE}, {weights}) AS rank
+        FROM {FTS_TABLE}
+        JOIN {GUIDE_TABLE} g ON g.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY rank
+        LIMIT %s""", [query, limit])
+        rows = cursor.fetchall()
+    return [
+        {'id': guide_id, 'title': title, 'description': description, 'solution': solution,
+         'labels': labels.split('\n') if labels else [], 'score': -rank}
+        for guide_id, title, description, solution, labels, rank in rows
+    ]
+
+
+def _search_guides_orm(text, limit):
+    guides = TroubleshooterGuide.objects.prefetch_related('labels')
+    for token in _TOKEN_RE.findall(text):
+        guides = guides.filter(Q(title__icontains=token) | Q(description__icontains=token) |
+                               Q(solution__icontains=token) | Q(labels__label__icontains=token)).distinct()
+    return [
+        {'id': guide.pk, 'title': guide.title, 'description': guide.description, 'solution': guide.solution,
+         'labels': [link.label for link in guide.labels.all()], 'score': None}
+        for guide in guides[:limit]
+    ]
@@ -0,0 +1,148 @@
+"""
+Incremental re-diagnosis of partitions whose jobs are still running.
+
+Rows keep landing in the check tables (FNFM_LIMIT_CHECK_PER_JOB,
+FNFM_STATUS_WORDS_AGGREGATED_PER_JOB, ...) while a job runs, so engineers
+re-submit the same diagnosis. An incremental diagnosis reads a version of
+every source table its checks depend on, restricted to the partition, with
+one UNION ALL query. The version is built from SOURCE_VERSION_EXPRESSIONS:
+the row count plus the summed error counts by default, or a load timestamp
+or row version column configured with FNFM_SOURCE_VERSION_EXPRESSIONS.
+
+Every check result is stored with the version of its source table read
+before the check ran (CheckResult.source_version). A result is reused only
+while its own version is current; the checks reading a table that advanced
+since their result was stored, or without a stored result, are evaluated
+again. Diagnoses of different failures reading the same table therefore
+each re-evaluate their own checks. The report lists the tables that
+advanced and the checks whose status changed.
+
+The versions are read before the checks run, so rows landing during the
+diagnosis make the next run evaluate those checks again rather than miss them.
+"""
+from django.conf import settings
+from django.db import DatabaseError
+
+from .check_store import check_name, load_versioned_results, save_check_results
+from .fleet import FLEET_RULES, LIMIT_CHECK_PER_JOB, STATUS_WORDS_PER_JOB
+from .instrumentation import stage
+from .resilience import (
+    QueueTimeout, call_with_timeout, is_abandoned, is_unknown, remaining_time, statement_timeout, teradata_breaker,
+)
+from .slow_queries import query_context
+
+# SQL aggregates identifying the content of a source table for one partition.
+DEFAULT_VERSION_EXPRESSIONS = ('COUNT(*)',)
+SOURCE_VERSION_EXPRESSIONS = {
+    LIMIT_CHECK_PER_JOB: ('COUNT(*)', 'SUM(error_count)'),
+    STATUS_WORDS_PER_JOB: ('COUNT(*)', 'SUM(count_error)'),
+    'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg': ('COUNT(*)', 'SUM(error_count)'),
+}
+
+
+def version_expressions(table):
+    configured = getattr(settings, 'FNFM_SOURCE_VERSION_EXPRESSIONS', {})
+    return tuple(configured.get(table) or SOURCE_VERSION_EXPRESSIONS.get(table) or DEFAULT_VERSION_EXPRESSIONS)
+
+
+def source_table(function):
+    """The table a check function reads, from its fleet rule; None if unknown."""
+    rule = FLEET_RULES.get(check_name(function))
+    return rule.table if rule is not None else None
+
+
+def source_versions(conn, partition_id, tables):
+    """{table: version string} of the given tables for one partition, read with one query."""
+    from sqlalchemy import text
+
+    if not tables:
+        return {}
+    width = max(len(version_expressions(table)) for table in tables)
+    selects = []
+    for i, table in enumerate(tables):
+        expressions = [f"CAST({expression} AS VARCHAR(64))" for expression in version_expressions(table)]
+        expressions += ["CAST(NULL AS VARCHAR(64))"] * (width - len(expressions))
+        columns = ", ".join(f"{expression} AS v{j}" for j, expression in enumerate(expressions))
+        selects.append(f"SELECT {i} AS source, {columns} FROM {table} WHERE partition_id = :partition_id")
+    rows = conn.execute(text("\nUNION ALL\n".join(selects)), {'partition_id': int(partition_id)}).fetchall()
+    return {tables[int(row[0])]: ':'.join('' if value is None else str(value) for value in row[1:]) for row in rows}
+
+
+def result_versions(conn, partition_id, keys):
+    """
+    {(function, channel): version} of the source tables of the given
+    (check function, data channel) pairs, for storing with their results.
+    Pairs whose table is unknown, or whose version can't be read, are left
+    out. The versions are read like a check: within the statement timeout
+    and the request deadline, and counting against the circuit breaker.
+    """
+    tables = {key: source_table(key[0]) for key in keys}
+    watched = sorted({table for table in tables.values() if table is not None})
+    remaining = remaining_time()
+    if (not watched or conn is None or is_abandoned(conn) or (remaining is not None and remaining <= 0)
+            or teradata_breaker.rejecting()):
+        return {}
+
+    def read_source_versions(conn, partition_id, _):
+        return source_versions(conn, partition_id, watched)
+    try:
+        with stage('source_versions'), query_context(partition_id=partition_id):
+            current = call_with_timeout(read_source_versions, conn, partition_id, None, statement_timeout())
+    except Exception as e:
+        # Not admitted in time: the warehouse is busy, not failing.
+        if not isinstance(e, QueueTimeout):
+            teradata_breaker.record_failure()
+        print(f"Error reading the source versions of partition {partition_id}: {e}")
+        if not is_abandoned(conn):
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        return {}
+    teradata_breaker.record_success()
+    return {key: current[table] for key, table in tables.items() if table in current}
+
+
+def rediagnose(invocations, mapping, conn, partition_id):
+    """
+    Evaluates the checks of the (trigger, data channel) `invocations` of one
+    partition incrementally. Returns (results, report): results as returned
+    by `evaluate_checks`, and a report of the advanced tables, the evaluated
+    and reused checks and the status changes, each a dict of check, data
+    channel, triggers, previous and current status.
+    """
+    from .services import evaluate_checks
+
+    triggers = {}
+    for trigger, datachannel in invocations:
+        function = mapping.get(trigger)
+        if function is not None:
+            triggers.setdefault((function, datachannel), []).append(trigger)
+    # Without versions every check is evaluated again.
+    versions = result_versions(conn, partition_id, list(triggers))
+    stored = load_versioned_results(partition_id, list(triggers))
+    reused = {key: fired for key, (fired, version) in stored.items() if versions.get(key) == version}
+    advanced = sorted({source_table(key[0]) for key in stored if key not in reused} - {None})
+
+    results = evaluate_checks(list(invocations), mapping, conn, partition_id, results=dict(reused))
+    evaluated = {key: results[key] for key in triggers if key not in reused}
+    try:
+        save_check_results(partition_id, evaluated, versions)
+    except DatabaseError as e:
+        print(f"Error storing check results: {e}")
+
+    changes = [
+        {'check': check_name(function), 'data_channel': datachannel, 'triggers': sorted(triggers[function, datachannel]),
+         'previous': stored[function, datachannel][0], 'current': bool(results[function, datachannel])}
+        for function, datachannel in evaluated
+        if (function, datachannel) in stored and not is_unknown(results[function, datachannel])
+        and bool(results[function, datachannel]) != stored[function, datachannel][0]
+    ]
+    report = {
+        'partition_id': partition_id,
+        'advanced_tables': advanced,
+        'checks_evaluated': len(evaluated),
+        'checks_reused': len(reused),
+        'changes': sorted(changes, key=lambda change: (change['check'], change['data_channel'])),
+    }
+    return results, report
@@ -0,0 +1,297 @@
+"""
+Lightweight latency instrumentation for the troubleshooter.
+
+Stages are timed with the `stage` context manager (or the `timed` decorator).
+Each timing is collected for the current request's `Server-Timing` header and
+aggregated into process-wide histograms, which `render_metrics` exposes in the
+Prometheus text format for the `/metrics` endpoint.
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.sessions.middleware import SessionMiddleware
+
+# Upper bounds (in seconds) of the histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Timings of the request currently being served, as {stage: [total_seconds, calls]}.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+# --- Metric Types ---
+
+class Histogram:
+    """A thread-safe cumulative histogram with fixed buckets."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Returns (cumulative bucket counts including +Inf, sum, count)."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class MetricsRegistry:
+    """
+    Holds the process-wide histograms, counters and gauge callbacks.
+    Metrics are keyed by name plus a sorted tuple of label pairs.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def observe(self, name, value, help_text='', **labels):
+        key = (name, self._key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+                self._help.setdefault(name, help_text)
+        histogram.observe(value)
+
+    def inc(self, name, amount=1, help_text='', **labels):
+        key = (name, self._key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def register_gauge(self, name, callback, help_text=''):
+        """
+        Registers a callback evaluated at scrape time. It returns either a
+        number or a dict mapping label tuples (as dicts) to numbers.
+        """
+        with self._lock:
+            self._gauges[name] = callback
+            self._help[name] = help_text
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, self._key(labels)), 0)
+
+    def histogram(self, name, **labels):
+        return self._histograms.get((name, self._key(labels)))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f"{name}_bucket{_format_labels(labels, le=_format_number(bound))} {value}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {cumulative[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+
+        for name, callback in gauges:
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Error collecting gauge {name}: {e}")
+                continue
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, sample in sorted(value.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(sample)}")
+            else:
+                lines.append(f"{name} {_format_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+# The registry shared by the whole process.
+metrics = MetricsRegistry()
+
+
+# --- Stage Timing ---
+
+def record_stage(name, seconds):
+    """Records a finished stage for the current request and the histograms."""
+    metrics.observe(
+        'fnfm_stage_duration_seconds', seconds,
+        help_text='Time spent in each troubleshooting stage.', stage=name,
+    )
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as the given stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator timing every call of the wrapped function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_check(func):
+    """Decorator for Teradata check functions; the stage is `check.<name>`."""
+    return timed(f"check.{func.__name__}")(func)
+
+
+def count_cache(cache, hit):
+    """Counts a lookup against one of the application's caches."""
+    metrics.inc(
+        'fnfm_cache_requests_total',
+        help_text='Cache lookups by cache and result.',
+        cache=cache, result='hit' if hit else 'miss',
+    )
+
+
+def register_pool_gauges(name, engine_getter):
+    """
+    Exposes the connection pool of an SQLAlchemy engine. `engine_getter`
+    returns the engine at scrape time so lazily created engines are covered.
+    """
+    def collect(attribute):
+        def callback():
+            engine = engine_getter()
+            pool = getattr(engine, 'pool', None)
+            method = getattr(pool, attribute, None)
+            if not callable(method):
+                return None
+            return {(('engine', name),): method()}
+        return callback
+
+    metrics.register_gauge('fnfm_pool_checked_out', collect('checkedout'),
+                           'Connections currently checked out of the pool.')
+    metrics.register_gauge('fnfm_pool_checked_in', collect('checkedin'),
+                           'Idle connections held by the pool.')
+    metrics.register_gauge('fnfm_pool_overflow', collect('overflow'),
+                           'Connections opened beyond the pool size.')
+
+
+def server_timing_header(timings):
+    """Formats {stage: [seconds, calls]} as a Server-Timing header value."""
+    entries = []
+    for name, (seconds, calls) in timings.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if calls > 1:
+            entry += f';desc="{calls} calls"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+# --- Middleware ---
+
+class ServerTimingMiddleware:
+    """
+    Collects the stages timed while serving a request and reports them in a
+    `Server-Timing` header. Should be the outermost middleware so the total
+    covers the other middleware as well.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(
+            'fnfm_request_duration_seconds', elapsed,
+            help_text='Total time spent serving a request, by view.', view=view,
+        )
+        timings['total'] = [elapsed, 1]
+        response['Server-Timing'] = server_timing_header(timings)
+        return response
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """Session middleware that reports the session write as a stage."""
+
+    def process_response(self, request, response):
+        with stage('session_write'):
+            return super().process_response(request, response)
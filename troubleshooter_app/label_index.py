@@ -0,0 +1,63 @@
+"""
+Prefix and substring search over a fixed set of labels, for typeaheads.
+
+Labels are matched case-insensitively. Prefix queries binary-search the
+sorted folded labels; other queries intersect the posting lists of the
+query's trigrams and verify the candidates. Results rank prefix matches
+first, then the remaining substring matches, each alphabetically, and are
+returned a page at a time.
+"""
+import bisect
+
+
+def _fold(text):
+    return " ".join(text.casefold().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class LabelIndex:
+    def __init__(self, labels):
+        pairs = sorted({(_fold(label), label) for label in labels})
+        self.keys = [key for key, _ in pairs]
+        self.labels = [label for _, label in pairs]
+        self._postings = {}
+        for i, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                self._postings.setdefault(gram, []).append(i)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _prefix_ids(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query + "\U0010ffff", lo=start)
+        return range(start, end)
+
+    def _substring_ids(self, query):
+        if len(query) < 3:
+            return [i for i, key in enumerate(self.keys) if query in key]
+        postings = sorted((self._postings.get(gram, []) for gram in _trigrams(query)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return sorted(i for i in candidates if query in self.keys[i])
+
+    def search(self, query="", offset=0, limit=20):
+        """
+        Returns {'results', 'total', 'next_offset'} for the labels containing
+        `query`. `next_offset` is None on the last page.
+        """
+        query = _fold(query)
+        if not query:
+            ids = range(len(self.labels))
+        else:
+            prefix = self._prefix_ids(query)
+            ids = list(prefix) + [i for i in self._substring_ids(query) if not prefix.start <= i < prefix.stop]
+        page = ids[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(ids) else None
+        return {'results': [self.labels[i] for i in page], 'total': len(ids), 'next_offset': next_offset}
@@ -0,0 +1,266 @@
+"""
+HTTP load testing against the Teradata stand-in.
+
+Requests are scheduled open-loop at a target rate and served by a pool of
+worker threads, either through Django's test client (in-process) or over HTTP
+against a local server. Latency is measured from each request's scheduled
+start, so queueing delay is included when the workers fall behind.
+"""
+import http.cookiejar
+import json
+import math
+import queue
+import random
+import re
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.test import Client
+
+# Default share of each kind of traffic.
+DEFAULT_MIX = {'get_choices': 60, 'teradata_api': 30, 'diagnose': 10}
+
+TERADATA_API_CHECKS = [
+    'threshold_sup_10450', 'threshold_sup_12000', 'threshold_sup_5000', 'discrete_sup_10',
+    'discrete_sup_20', 'mcrterrfm_check', 'limit_check', 'status_check', 'large_pump',
+    'small_pump', 'mterrstafm_check',
+]
+
+_CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def parse_mix(text):
+    """Parses 'get_choices=60,diagnose=10' into a dict of weights."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown traffic kind: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class TrafficMix:
+    """Picks realistic requests for the stand-in fleet and ontology."""
+
+    def __init__(self, metadata, failures, channels, mix=None, seed=0):
+        self.rows = metadata[['partition_id', 'serial_number', 'job_number', 'job_start']].to_dict('records')
+        self.failures = list(failures)
+        self.channels = list(channels)
+        self.kinds, self.weights = zip(*(mix or DEFAULT_MIX).items())
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self):
+        """Returns (endpoint, method, path, params)."""
+        with self._lock:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            row = self.rng.choice(self.rows)
+            failure = self.rng.choice(self.failures)
+            channel = self.rng.choice(self.channels)
+            check = self.rng.choice(TERADATA_API_CHECKS)
+            level = self.rng.choice(['serial_number', 'job_number', 'job_start'])
+
+        if kind == 'get_choices':
+            parent_value = {'serial_number': '', 'job_number': row['serial_number'], 'job_start': row['job_number']}[level]
+            return kind, 'GET', '/troubleshooter/api/get_choices/', {'parent_field': level, 'parent_value': parent_value}
+        if kind == 'teradata_api':
+            params = {'partition_id': row['partition_id'], 'triple_subject': channel}
+            return kind, 'GET', f'/troubleshooter/api/teradata/{check}/', params
+        params = {
+            'serial_number': row['serial_number'],
+            'job_number': row['job_number'],
+            'job_start': row['job_start'],
+            'failure_selectbox': failure,
+        }
+        return kind, 'POST', '/troubleshooter/', params
+
+
+# --- Transports ---
+
+class ClientTransport:
+    """Sends requests through Django's test client, one client per worker."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def send(self, method, path, params):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        if method == 'GET':
+            return client.get(path, params).status_code
+        return client.post(path, params).status_code
+
+
+class HttpTransport:
+    """Sends requests over HTTP, keeping cookies and a CSRF token per worker."""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _opener(self):
+        if getattr(self._local, 'opener', None) is None:
+            self._local.opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                _NoRedirect(),
+            )
+            self._local.csrf_token = None
+        return self._local.opener
+
+    def _open(self, request):
+        try:
+            with self._opener().open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def send(self, method, path, params):
+        url = self.base_url + path
+        if method == 'GET':
+            return self._open(urllib.request.Request(f"{url}?{urllib.parse.urlencode(params)}"))[0]
+
+        self._opener()
+        if self._local.csrf_token is None:
+            status, body = self._open(urllib.request.Request(url))
+            match = _CSRF_INPUT.search(body.decode('utf-8', 'replace'))
+            if not match:
+                return status if status >= 400 else 403
+            self._local.csrf_token = match.group(1)
+        data = urllib.parse.urlencode(dict(params, csrfmiddlewaretoken=self._local.csrf_token)).encode()
+        request = urllib.request.Request(url, data=data, headers={'Referer': url})
+        return self._open(request)[0]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Reports redirects (the diagnosis success response) instead of following them."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def local_server(port=0):
+    """Serves the Django application on localhost in a background thread."""
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server('127.0.0.1', port, get_wsgi_application(),
+                         server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# --- Runner ---
+
+def run_load(transport, traffic, rate, duration, concurrency):
+    """
+    Issues requests at `rate` per second for `duration` seconds using
+    `concurrency` workers. Returns the raw samples as
+    (endpoint, latency_seconds, ok) tuples and the wall-clock time taken.
+    """
+    slots = queue.Queue()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def worker():
+        while True:
+            slot = slots.get()
+            if slot is None:
+                return
+            scheduled, (endpoint, method, path, params) = slot
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                ok = transport.send(method, path, params) < 400
+            except Exception as e:
+                print(f"Load test request to {path} failed: {e}")
+                ok = False
+            latency = time.perf_counter() - scheduled
+            with samples_lock:
+                samples.append((endpoint, latency, ok))
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+
+    start = time.perf_counter()
+    total = max(int(rate * duration), 1)
+    for i in range(total):
+        slots.put((start + i / rate, traffic.next_request()))
+    for _ in workers:
+        slots.put(None)
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarise(samples, elapsed):
+    """Aggregates samples into per-endpoint throughput, latency percentiles and error rates."""
+    grouped = defaultdict(list)
+    for endpoint, latency, ok in samples:
+        grouped[endpoint].append((latency, ok))
+        grouped['all'].append((latency, ok))
+
+    report = {}
+    for endpoint, values in sorted(grouped.items()):
+        latencies = sorted(latency for latency, _ in values)
+        errors = sum(1 for _, ok in values if not ok)
+        report[endpoint] = {
+            'requests': len(values),
+            'throughput_rps': len(values) / elapsed if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': errors / len(values),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p90_ms': percentile(latencies, 0.90) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    return report
+
+
+def format_report(report):
+    lines = [f"{'endpoint':14} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for endpoint, r in report.items():
+        lines.append(
+            f"{endpoint:14} {r['requests']:>9} {r['throughput_rps']:>8.1f} {r['error_rate']:>6.1%} "
+            f"{r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def dump_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
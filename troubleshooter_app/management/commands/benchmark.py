@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from troubleshooter_app.benchmarks import BENCHMARKED_FUNCTIONS, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the ontology and diagnosis services on synthetic knowledge graphs "
+            "and a local Teradata stand-in, reporting time and peak memory per size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000',
+                            help="Comma-separated spreadsheet row counts (also used as fleet partition counts).")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per function and size.")
+        parser.add_argument('--functions', default=','.join(BENCHMARKED_FUNCTIONS),
+                            help="Comma-separated subset of functions to report.")
+        parser.add_argument('--check-partitions', type=int, default=3,
+                            help="Partitions that get check-table rows in the stand-in.")
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds of latency injected into every stand-in query.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare against the JSON results of a previous run.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative growth before a result counts as a regression.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers.")
+        functions = [name for name in options['functions'].split(',') if name]
+        unknown = set(functions) - set(BENCHMARKED_FUNCTIONS)
+        if unknown:
+            raise CommandError(f"Unknown functions: {', '.join(sorted(unknown))}")
+
+        records = run_benchmarks(
+            sizes, repeat=options['repeat'], check_partitions=options['check_partitions'],
+            latency=options['latency'], functions=functions,
+        )
+
+        self.stdout.write(f"{'function':32} {'size':>8} {'median ms':>12} {'min ms':>12} {'peak KiB':>12}")
+        for r in records:
+            self.stdout.write(
+                f"{r['function']:32} {r['size']:>8} {r['median_seconds'] * 1000:>12.2f} "
+                f"{r['min_seconds'] * 1000:>12.2f} {r['peak_bytes'] / 1024:>12.1f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(records, f, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = compare(records, json.load(f), options['tolerance'])
+            for r in regressions:
+                self.stdout.write(
+                    f"REGRESSION {r['function']} size={r['size']} {r['metric']}: {r['before']:.6g} -> {r['after']:.6g}"
+                )
+            if not regressions:
+                self.stdout.write("No regressions against the baseline.")
+            elif options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regression(s) against the baseline.")
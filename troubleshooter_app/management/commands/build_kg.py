@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from troubleshooter_app import ontology_build
+
+
+class Command(BaseCommand):
+    help = ("Builds the troubleshooting knowledge graph from the ontology-prep spreadsheet, "
+            "optionally only re-emitting triples for rows changed since the last build.")
+
+    def add_arguments(self, parser):
+        ontology_build.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        ontology_build.run(options, write=self.stdout.write)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from troubleshooter_app import loadtest, synthetic
+from troubleshooter_app.resources import registry
+from troubleshooter_app.services import get_all_failure_labels
+
+
+class Command(BaseCommand):
+    help = ("Drives a realistic mix of form-choice, diagnosis and Teradata API traffic at a target "
+            "rate against a local Teradata stand-in and reports per-endpoint throughput, latency "
+            "percentiles and error rates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['client', 'http'], default='client',
+                            help="'client' calls the app in-process; 'http' goes through a local server.")
+        parser.add_argument('--url', help="Base URL of an already running server (http mode). "
+                                          "By default a local server is started with the stand-in.")
+        parser.add_argument('--port', type=int, default=0, help="Port of the local server (http mode).")
+        parser.add_argument('--rate', type=float, default=10.0, help="Target requests per second.")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds of traffic to schedule.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads issuing requests.")
+        parser.add_argument('--mix', default=','.join(f"{k}={v}" for k, v in loadtest.DEFAULT_MIX.items()),
+                            help="Traffic weights, e.g. get_choices=60,teradata_api=30,diagnose=10.")
+        parser.add_argument('--partitions', type=int, default=2000, help="Jobs in the stand-in fleet.")
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds injected into every stand-in query.")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['rate'] <= 0 or options['concurrency'] <= 0:
+            raise CommandError("--rate and --concurrency must be positive.")
+
+        ontology = registry.get('ontology')
+        if ontology is None:
+            raise CommandError("The ontology graph could not be loaded.")
+        failures = get_all_failure_labels(ontology)
+        channels = synthetic.ontology_channels(ontology)
+
+        if options['url']:
+            # The remote server provides its own backend; only the traffic is synthetic,
+            # so partitions that are unknown to it will answer with an error message.
+            metadata = synthetic.generate_metadata(options['partitions'], seed=options['seed'])
+            traffic = loadtest.TrafficMix(metadata, failures, channels, mix, options['seed'])
+            report = self._run(loadtest.HttpTransport(options['url']), traffic, options)
+        else:
+            report = self._run_against_standin(mix, failures, channels, options)
+
+        self.stdout.write(loadtest.format_report(report))
+        if options['output']:
+            loadtest.dump_report(report, options['output'])
+
+    def _run_against_standin(self, mix, failures, channels, options):
+        metadata = synthetic.generate_metadata(options['partitions'], seed=options['seed'])
+        engine = synthetic.create_standin_engine(
+            metadata, channels, latency=options['latency'], jitter=options['jitter'], seed=options['seed'],
+            check_partitions=metadata['partition_id'][:200],
+        )
+        traffic = loadtest.TrafficMix(metadata.head(200), failures, channels, mix, options['seed'])
+
+        # Graph pages and sessions go to throwaway storage so the run leaves no trace.
+        with tempfile.TemporaryDirectory() as static_dir, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver', 'localhost', '127.0.0.1'],
+            STATICFILES_DIRS=[static_dir],
+            SESSION_ENGINE='django.contrib.sessions.backends.cache',
+        ), synthetic.use_engine(engine):
+            os.makedirs(os.path.join(static_dir, 'graphs'))
+            try:
+                if options['mode'] == 'client':
+                    return self._run(loadtest.ClientTransport(), traffic, options)
+                with loadtest.local_server(options['port']) as base_url:
+                    self.stdout.write(f"Serving the stand-in application at {base_url}")
+                    return self._run(loadtest.HttpTransport(base_url), traffic, options)
+            finally:
+                engine.standin_keepalive.close()
+                engine.dispose()
+
+    def _run(self, transport, traffic, options):
+        samples, elapsed = loadtest.run_load(
+            transport, traffic, options['rate'], options['duration'], options['concurrency'],
+        )
+        return loadtest.summarise(samples, elapsed)
@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from troubleshooter_app.admission import admission_lane
+from troubleshooter_app.check_store import get_watermark, save_check_results, set_watermark
+from troubleshooter_app.incremental import result_versions
+from troubleshooter_app.resilience import checks_connection, is_unknown, request_deadline
+from troubleshooter_app.resources import registry
+from troubleshooter_app.services import (
+    CHECK_FUNCTIONS,
+    evaluate_checks,
+    get_latest_partitions,
+    get_new_partitions,
+    ontology_check_invocations,
+)
+
+# Highest partition_id of FNFM_FLEET_METADATA already pre-warmed.
+WATERMARK = 'prewarm_checks.partition_id'
+
+
+def prewarm_partition(td_engine, invocations, partition_id, mapping=None, deadline=None):
+    """
+    Evaluates every check in `invocations` for one partition and stores the
+    results, with the versions of their source tables so that incremental
+    diagnoses, single-failure and all-failures alike, reuse them until new
+    rows land. Returns (stored, unknown)
+    counts.
+    """
+    mapping = CHECK_FUNCTIONS if mapping is None else mapping
+    keys = {(mapping[trigger], channel) for trigger, channel in invocations if trigger in mapping}
+    with request_deadline(deadline), checks_connection(td_engine) as conn:
+        versions = result_versions(conn, partition_id, keys)
+        results = evaluate_checks(invocations, mapping, conn, partition_id)
+    stored = save_check_results(partition_id, results, versions)
+    return stored, sum(1 for result in results.values() if is_unknown(result))
+
+
+class Command(BaseCommand):
+    help = ("Watches FNFM_FLEET_METADATA for newly landed partitions and evaluates every check "
+            "referenced by the ontology for them, storing the results so the first interactive "
+            "diagnosis of a new job is already warm.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=300.0, help="Seconds between polls.")
+        parser.add_argument('--batch-size', type=int, default=50, help="New partitions processed per poll.")
+        parser.add_argument('--backfill', type=int, default=0,
+                            help="On the first run, also pre-warm this many of the latest existing partitions "
+                                 "(otherwise only partitions landing from now on are pre-warmed).")
+        parser.add_argument('--deadline', type=float, default=600.0, help="Seconds allowed per partition.")
+        parser.add_argument('--once', action='store_true', help="Poll once and exit.")
+
+    def handle(self, *args, **options):
+        td_engine = registry.get('teradata_engine')
+        ontology = registry.get('ontology')
+        if td_engine is None or ontology is None:
+            raise CommandError("The Teradata engine or the ontology could not be loaded.")
+
+        if get_watermark(WATERMARK) is None:
+            # The partition just before the ones to backfill (all of them if the fleet is smaller).
+            latest = get_latest_partitions(td_engine, options['backfill'] + 1)
+            start = latest[0] if len(latest) > options['backfill'] else 0
+            set_watermark(WATERMARK, start)
+            self.stdout.write(f"Watching partitions after {start}.")
+
+        try:
+            # Behind interactive diagnoses and dashboard queries for the warehouse.
+            with admission_lane('batch'):
+                while True:
+                    self.poll(td_engine, ontology, options)
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
+
+    def poll(self, td_engine, ontology, options):
+        """Pre-warms the partitions landed since the watermark, advancing it after each one."""
+        after = int(get_watermark(WATERMARK, 0))
+        partitions = get_new_partitions(td_engine, after, options['batch_size'])
+        if not partitions:
+            return
+        # Recomputed only when the ontology changes.
+        invocations = ontology_check_invocations(ontology)
+        for partition_id in partitions:
+            start = time.perf_counter()
+            stored, unknown = prewarm_partition(td_engine, invocations, partition_id, deadline=options['deadline'])
+            if unknown and not stored:
+                # The warehouse is unavailable; retry this partition on the next poll.
+                self.stderr.write(f"Partition {partition_id}: no check could be evaluated, retrying later.")
+                return
+            set_watermark(WATERMARK, partition_id)
+            self.stdout.write(f"Partition {partition_id}: {stored} check results stored, {unknown} unknown "
+                              f"({time.perf_counter() - start:.1f}s).")
@@ -0,0 +1,133 @@
+import io
+import os
+import pstats
+import tracemalloc
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from troubleshooter_app.profiling import (
+    PROFILE_FILENAME,
+    SNAPSHOT_FILENAME,
+    list_profiles,
+    load_meta,
+    profiling_dir,
+)
+
+
+def _select(root, path_contains=None):
+    profiles = list_profiles(root)
+    if path_contains:
+        profiles = [p for p in profiles if path_contains in load_meta(p)['path']]
+    return profiles
+
+
+def _function_times(profiles):
+    """Returns ({function: cumulative seconds per request}, number of profiles)."""
+    totals = defaultdict(float)
+    for path in profiles:
+        stats = pstats.Stats(os.path.join(path, PROFILE_FILENAME))
+        for func, (_cc, _nc, _tt, cumulative, _callers) in stats.stats.items():
+            totals[func] += cumulative
+    count = len(profiles) or 1
+    return {func: total / count for func, total in totals.items()}, len(profiles)
+
+
+def _allocation_sizes(profiles):
+    """Returns ({'file:line': bytes still allocated per request}, number of profiles)."""
+    totals = defaultdict(int)
+    for path in profiles:
+        snapshot_path = os.path.join(path, SNAPSHOT_FILENAME)
+        if not os.path.exists(snapshot_path):
+            continue
+        for stat in tracemalloc.Snapshot.load(snapshot_path).statistics('lineno'):
+            frame = stat.traceback[0]
+            totals[f"{frame.filename}:{frame.lineno}"] += stat.size
+    count = len(profiles) or 1
+    return {line: size / count for line, size in totals.items()}, len(profiles)
+
+
+def _format_function(func):
+    filename, lineno, name = func
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class Command(BaseCommand):
+    help = "Lists, aggregates and diffs the profiles captured by SampledProfilerMiddleware."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        list_parser = subparsers.add_parser('list', help="List captured profiles.")
+        list_parser.add_argument('--dir', default=None, help="Profile directory (defaults to PROFILING_DIR).")
+
+        aggregate_parser = subparsers.add_parser('aggregate', help="Merge profiles and print the hottest functions.")
+        aggregate_parser.add_argument('--dir', default=None)
+        aggregate_parser.add_argument('--path-contains', default=None, help="Only include requests whose path contains this text.")
+        aggregate_parser.add_argument('--sort', default='cumulative', help="pstats sort key.")
+        aggregate_parser.add_argument('--limit', type=int, default=25)
+
+        diff_parser = subparsers.add_parser('diff', help="Compare two sets of profiles (e.g. before and after a change).")
+        diff_parser.add_argument('before', help="Profile directory, or a directory of profiles, for the baseline run.")
+        diff_parser.add_argument('after', help="Profile directory, or a directory of profiles, for the new run.")
+        diff_parser.add_argument('--path-contains', default=None)
+        diff_parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_list(self, options):
+        for path in list_profiles(options['dir'] or profiling_dir()):
+            meta = load_meta(path)
+            self.stdout.write(
+                f"{meta['id']}  {meta['method']} {meta['path']}  status={meta['status_code']}  "
+                f"{meta['duration_seconds'] * 1000:.1f} ms  peak={meta['peak_traced_bytes'] / 1024:.0f} KiB  "
+                f"({meta['trigger']})"
+            )
+
+    def handle_aggregate(self, options):
+        profiles = _select(options['dir'] or profiling_dir(), options['path_contains'])
+        if not profiles:
+            raise CommandError("No profiles matched.")
+
+        stream = io.StringIO()
+        stats = pstats.Stats(os.path.join(profiles[0], PROFILE_FILENAME), stream=stream)
+        for path in profiles[1:]:
+            stats.add(os.path.join(path, PROFILE_FILENAME))
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(f"Aggregated {len(profiles)} profile(s).")
+        self.stdout.write(stream.getvalue())
+
+        allocations, _ = _allocation_sizes(profiles)
+        self.stdout.write("Top allocation sites (bytes per request):")
+        for line, size in sorted(allocations.items(), key=lambda item: -item[1])[:options['limit']]:
+            self.stdout.write(f"  {size / 1024:10.1f} KiB  {line}")
+
+    def handle_diff(self, options):
+        before = _select(options['before'], options['path_contains'])
+        after = _select(options['after'], options['path_contains'])
+        if not before or not after:
+            raise CommandError("Both sides of the diff need at least one profile.")
+
+        before_times, before_count = _function_times(before)
+        after_times, after_count = _function_times(after)
+        self.stdout.write(f"Cumulative time per request ({before_count} before, {after_count} after):")
+        deltas = {
+            func: after_times.get(func, 0.0) - before_times.get(func, 0.0)
+            for func in set(before_times) | set(after_times)
+        }
+        for func, delta in sorted(deltas.items(), key=lambda item: -abs(item[1]))[:options['limit']]:
+            self.stdout.write(
+                f"  {delta * 1000:+10.2f} ms  {before_times.get(func, 0.0) * 1000:10.2f} -> "
+                f"{after_times.get(func, 0.0) * 1000:10.2f} ms  {_format_function(func)}"
+            )
+
+        before_sizes, _ = _allocation_sizes(before)
+        after_sizes, _ = _allocation_sizes(after)
+        self.stdout.write("Allocated bytes per request:")
+        size_deltas = {
+            line: after_sizes.get(line, 0) - before_sizes.get(line, 0)
+            for line in set(before_sizes) | set(after_sizes)
+        }
+        for line, delta in sorted(size_deltas.items(), key=lambda item: -abs(item[1]))[:options['limit']]:
+            self.stdout.write(f"  {delta / 1024:+10.1f} KiB  {line}")
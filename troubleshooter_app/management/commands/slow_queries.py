@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from troubleshooter_app.resources import registry
+from troubleshooter_app.slow_queries import explain, log_path, read_log, summarize
+
+
+def _shorten(sql, width=100):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= width else sql[:width - 3] + '...'
+
+
+class Command(BaseCommand):
+    help = "Summarises the slow-query log and captures EXPLAIN plans of logged statements."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        top_parser = subparsers.add_parser('top', help="Print the worst statements, grouped by fingerprint.")
+        top_parser.add_argument('--log', default=None, help="Log file (defaults to FNFM_SLOW_QUERY_LOG).")
+        top_parser.add_argument('--sort', choices=['total', 'max', 'count'], default='total')
+        top_parser.add_argument('--check', default=None, help="Only include statements of this check.")
+        top_parser.add_argument('--limit', type=int, default=10)
+        top_parser.add_argument('--json', action='store_true', help="Print the summary as JSON.")
+
+        list_parser = subparsers.add_parser('list', help="Print the latest logged statements.")
+        list_parser.add_argument('--log', default=None)
+        list_parser.add_argument('--limit', type=int, default=20)
+
+        explain_parser = subparsers.add_parser(
+            'explain', help="Run EXPLAIN for the slowest logged statement of a fingerprint.")
+        explain_parser.add_argument('fingerprint')
+        explain_parser.add_argument('--log', default=None)
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_top(self, options):
+        records = read_log(options['log'])
+        if options['check']:
+            records = (entry for entry in records if entry.get('check') == options['check'])
+        summary = summarize(records)
+        key = {'total': 'total_seconds', 'max': 'max_seconds', 'count': 'count'}[options['sort']]
+        summary.sort(key=lambda group: -group[key])
+        summary = summary[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, default=str, indent=2))
+            return
+        if not summary:
+            self.stdout.write(f"No slow statements logged in {options['log'] or log_path()}.")
+            return
+        for group in summary:
+            rows = '-' if group['max_rows'] is None else group['max_rows']
+            self.stdout.write(
+                f"{group['fingerprint']}  {group['count']:5d}x  total={group['total_seconds']:.2f}s  "
+                f"max={group['max_seconds']:.2f}s  mean={group['mean_seconds']:.2f}s  max_rows={rows}  "
+                f"checks={','.join(group['checks']) or '-'}  partitions={len(group['partitions'])}  "
+                f"errors={group['errors']}"
+            )
+            self.stdout.write(f"    {_shorten(group['slowest']['sql'])}")
+
+    def handle_list(self, options):
+        records = list(read_log(options['log']))[-options['limit']:]
+        for entry in records:
+            self.stdout.write(
+                f"{entry['time']}  {entry['fingerprint']}  {entry['duration_seconds'] * 1000:.0f} ms  "
+                f"rows={entry['rows'] if entry['rows'] is not None else '-'}  check={entry.get('check') or '-'}  "
+                f"channel={entry.get('data_channel') or '-'}  partition={entry.get('partition_id') or '-'}"
+                + ("  cancelled" if entry.get('cancelled') else f"  error={entry['error']}" if entry.get('error') else "")
+            )
+
+    def handle_explain(self, options):
+        matching = [entry for entry in read_log(options['log']) if entry['fingerprint'] == options['fingerprint']]
+        if not matching:
+            raise CommandError(f"No logged statement has the fingerprint {options['fingerprint']}.")
+        engine = registry.get('teradata_engine')
+        if engine is None:
+            raise CommandError("No Teradata engine; check the credentials.")
+        slowest = max(matching, key=lambda entry: entry['duration_seconds'])
+        self.stdout.write(f"-- {slowest['duration_seconds']:.3f}s, {len(matching)} occurrence(s)")
+        self.stdout.write(slowest['sql'])
+        self.stdout.write(explain(engine, slowest))
@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time:      self [us] |  cumulative | imported package"
+_IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+_PROBE = """
+import time
+start = time.perf_counter()
+import django
+django.setup()
+for name in {modules!r}:
+    __import__(name)
+print('setup_seconds', time.perf_counter() - start)
+"""
+
+
+def parse_import_times(stderr):
+    """Returns [(module, self seconds, cumulative seconds, depth)] from `-X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return entries
+
+
+def by_package(entries):
+    """Sums the self time of every module per top-level package."""
+    totals = defaultdict(float)
+    for module, self_seconds, _cumulative, _depth in entries:
+        totals[module.split('.')[0]] += self_seconds
+    return dict(totals)
+
+
+def measure_startup(modules, settings_module):
+    """Imports Django and `modules` in a fresh interpreter with `-X importtime`."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(modules=list(modules))],
+        capture_output=True, text=True, env=env, cwd=os.getcwd(),
+    )
+    if process.returncode:
+        raise CommandError(f"Importing {', '.join(modules)} failed:\n{process.stderr[-2000:]}")
+    setup_seconds = float(process.stdout.split('setup_seconds', 1)[1].split()[0])
+    return setup_seconds, parse_import_times(process.stderr)
+
+
+class Command(BaseCommand):
+    help = ("Reports the cold-start cost of the app: import time per package and module "
+            "(from a fresh `python -X importtime` run) and, optionally, resource warm-up times.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', default='troubleshooter_app.urls,fnfm_troubleshooter.urls',
+                            help="Comma-separated modules to import after django.setup().")
+        parser.add_argument('--limit', type=int, default=15, help="Rows per table.")
+        parser.add_argument('--warm-up', action='store_true',
+                            help="Also time the creation of the registered resources in this process.")
+        parser.add_argument('--output', help="Write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        modules = [name for name in options['modules'].split(',') if name]
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'fnfm_troubleshooter.settings')
+        setup_seconds, entries = measure_startup(modules, settings_module)
+        limit = options['limit']
+
+        self.stdout.write(f"django.setup() + import of {', '.join(modules)}: {setup_seconds * 1000:.1f} ms "
+                          f"({len(entries)} modules imported)")
+        self.stdout.write("Self import time per package:")
+        packages = sorted(by_package(entries).items(), key=lambda item: -item[1])
+        for package, seconds in packages[:limit]:
+            self.stdout.write(f"  {seconds * 1000:10.1f} ms  {package}")
+        self.stdout.write("Slowest imports (cumulative):")
+        for module, _self, cumulative, depth in sorted(entries, key=lambda e: -e[2])[:limit]:
+            self.stdout.write(f"  {cumulative * 1000:10.1f} ms  {'  ' * depth}{module}")
+
+        report = {
+            'modules': modules,
+            'setup_seconds': setup_seconds,
+            'packages': dict(packages),
+            'imports': [
+                {'module': module, 'self_seconds': self_seconds, 'cumulative_seconds': cumulative}
+                for module, self_seconds, cumulative, _depth in entries
+            ],
+        }
+
+        if options['warm_up']:
+            from troubleshooter_app.resources import registry
+
+            self.stdout.write("Resource warm-up:")
+            report['warm_up'] = registry.warm_up()
+            for name, seconds in report['warm_up'].items():
+                created = registry.peek(name) is not None
+                self.stdout.write(f"  {(seconds or 0) * 1000:10.1f} ms  {name}{'' if created else ' (unavailable)'}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troubleshooter_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('value', models.CharField(max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CheckResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition_id', models.BigIntegerField()),
+                ('check_name', models.CharField(max_length=100)),
+                ('data_channel', models.CharField(max_length=200)),
+                ('fired', models.BooleanField()),
+                ('evaluated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('partition_id', 'check_name', 'data_channel'), name='unique_check_result')],
+            },
+        ),
+    ]
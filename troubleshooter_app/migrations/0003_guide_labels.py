@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'troubleshooter_app_guide_fts'
+
+
+def create_guide_index(apps, schema_editor):
+    # Full-text index of the guides (see troubleshooter_app/guides.py); SQLite only.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, description, solution, labels, tokenize='porter unicode61')")
+    schema_editor.execute(f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, description, solution, labels)
+        SELECT id, title, description, solution, '' FROM troubleshooter_app_troubleshooterguide""")
+
+
+def drop_guide_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troubleshooter_app', '0002_check_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuideLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(db_index=True, max_length=200)),
+                ('kind', models.CharField(choices=[('root_cause', 'Root cause'), ('data_channel', 'Data channel')], default='root_cause', max_length=20)),
+                ('guide', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='labels', to='troubleshooter_app.troubleshooterguide')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('guide', 'label', 'kind'), name='unique_guide_label')],
+            },
+        ),
+        migrations.RunPython(create_guide_index, drop_guide_index),
+    ]
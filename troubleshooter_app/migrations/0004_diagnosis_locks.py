@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troubleshooter_app', '0003_guide_labels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('owner', models.CharField(max_length=64)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
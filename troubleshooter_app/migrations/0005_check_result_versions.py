@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troubleshooter_app', '0004_diagnosis_locks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkresult',
+            name='source_version',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+    ]
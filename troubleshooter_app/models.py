@@ -19,4 +19,75 @@ class TroubleshooterGuide(models.Model):
 
     class Meta:
         # A simple ordering for the guides.
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class GuideLabel(models.Model):
+    """
+    Links a guide to an ontology label (a root cause or a data channel) it
+    explains. The results page looks guides up by these labels.
+    """
+    ROOT_CAUSE = 'root_cause'
+    DATA_CHANNEL = 'data_channel'
+    KIND_CHOICES = [(ROOT_CAUSE, 'Root cause'), (DATA_CHANNEL, 'Data channel')]
+
+    guide = models.ForeignKey(TroubleshooterGuide, related_name='labels', on_delete=models.CASCADE)
+    label = models.CharField(max_length=200, db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=ROOT_CAUSE)
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.label}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['guide', 'label', 'kind'], name='unique_guide_label'),
+        ]
+
+class CheckResult(models.Model):
+    """
+    The outcome of one Teradata check for one partition and data channel,
+    evaluated ahead of time by the `prewarm_checks` watcher (or by an earlier
+    diagnosis) so interactive diagnoses don't have to run it again.
+    """
+    partition_id = models.BigIntegerField()
+    check_name = models.CharField(max_length=100)
+    data_channel = models.CharField(max_length=200)
+    fired = models.BooleanField()
+    evaluated_at = models.DateTimeField(auto_now=True)
+    # Version of the check's source table read before evaluating it (see
+    # incremental.py); empty when unknown.
+    source_version = models.CharField(max_length=200, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.check_name}({self.data_channel}) @ {self.partition_id}: {self.fired}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['partition_id', 'check_name', 'data_channel'], name='unique_check_result'),
+        ]
+
+
+class Watermark(models.Model):
+    """
+    The last position reached by an incremental job in a source table, e.g.
+    the highest partition_id of FNFM_FLEET_METADATA already pre-warmed.
+    """
+    name = models.CharField(max_length=200, unique=True)
+    value = models.CharField(max_length=200)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class DiagnosisLock(models.Model):
+    """
+    Held in the local database by the worker running a diagnosis, so workers
+    asked for the same diagnosis wait for its results (see coalesce.py).
+    A lock past `expires_at` was left by a dead worker and is taken over.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    owner = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} held by {self.owner} until {self.expires_at}"
@@ -0,0 +1,469 @@
+"""
+Column-wise knowledge-graph build from the ontology-prep spreadsheet.
+
+Every spreadsheet row describes a failure → root cause → trigger → data
+channel path. Instead of adding 23 triples per row, entities are deduplicated
+per column and links per column pair, and the triples are formatted as
+N-Triples lines with vectorised string operations. Output is streamed to
+N-Triples or Turtle.
+
+Incremental builds keep a small state file next to the output with the rows
+of the previous build. Only triples of added or removed rows are computed;
+the previous triples are streamed through with those changes applied.
+
+The prep workbook is converted once into a Parquet file keyed by its
+checksum (`load_prep_frame`), and the ontology's class shapes are cached the
+same way, so unchanged sources are never re-parsed.
+
+This module has no Django dependency so `data/ontology_to_kg.py` can run it
+as a plain script.
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+DATA_GRAPH_NAMESPACE = "http://www.slb.com/data-graphs/Troubleshooting_ORA_FNFM_Data_graph#"
+ONTOLOGY_NAMESPACE = "http://www.slb.com/ontologies/Troubleshooting_ORA_FNFM_Ontology_#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+
+# Entity type of each of the six spreadsheet columns.
+COLUMN_TYPES = ["Failure", "Failure", "RootCause", "RootCause", "Trigger", "DataChannel"]
+
+# (source column, predicate, target column) for the links of every row.
+COLUMN_LINKS = [
+    (0, "cause", 1),
+    (0, "hasRootCause", 2),
+    (2, "next", 3),
+    (2, "isTriggeredBy", 4),
+    (4, "consume", 5),
+]
+
+STATE_VERSION = 1
+
+# Characters that must be escaped inside an N-Triples IRI.
+_IRI_ESCAPE = r'[\x00-\x20<>"{}|^`\\]'
+
+
+# --- Reading ---
+
+def read_prep_spreadsheet(path):
+    """Reads the six ontology columns of the prep spreadsheet as strings."""
+    df = pd.read_excel(path, header=1, usecols=range(1, 7))
+    return labels_frame(df)
+
+
+def stream_prep_spreadsheet(path):
+    """
+    Reads the same cells as `read_prep_spreadsheet` with openpyxl's read-only
+    mode, which streams rows instead of loading the whole workbook.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(min_row=2, min_col=2, max_col=7, values_only=True)
+        header = next(rows)
+        records = [row for row in rows]
+    finally:
+        workbook.close()
+    # Like read_excel, ignore trailing rows without any value.
+    while records and all(value is None for value in records[-1]):
+        records.pop()
+    df = pd.DataFrame.from_records(records, columns=list(header))
+    return labels_frame(df.fillna(float("nan")))
+
+
+def labels_frame(df):
+    """
+    Converts every cell to the label `create_rdf_graph` would use (`str(value)`,
+    so missing cells become "nan"). Only unique values are converted.
+    """
+    out = {}
+    for column in df.columns:
+        values = df[column].astype(object)
+        uniques = pd.unique(values)
+        out[column] = values.map(dict(zip(uniques, (str(v) for v in uniques)))).astype(object)
+    return pd.DataFrame(out, index=df.index)
+
+
+# --- Source Cache ---
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+
+def file_checksum(path):
+    """SHA-256 of a file's contents, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(source_path, checksum, suffix, cache_dir):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{checksum[:16]}{suffix}")
+
+
+def _drop_stale(source_path, current, suffix, cache_dir):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(stem + ".") and name.endswith(suffix) and path != current:
+            os.unlink(path)
+
+
+def load_prep_frame(path, cache_dir=CACHE_DIR):
+    """
+    Returns the prep spreadsheet's label frame, converting the workbook to a
+    Parquet file keyed by its checksum on first use. Later calls with an
+    unchanged workbook read the Parquet file only.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = _cache_path(path, file_checksum(path), ".parquet", cache_dir)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path).astype(object)
+
+    df = stream_prep_spreadsheet(path)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _drop_stale(path, cache_path, ".parquet", cache_dir)
+    return df
+
+
+# --- Triple Formatting ---
+
+def _iri(labels, namespace=DATA_GRAPH_NAMESPACE):
+    iris = (namespace + labels.str.replace(" ", "_", regex=False)).str.replace(
+        _IRI_ESCAPE, lambda m: "\\u%04X" % ord(m.group()), regex=True)
+    return "<" + iris + ">"
+
+
+def _literal(labels):
+    escaped = (labels.str.replace("\\", "\\\\", regex=False)
+               .str.replace('"', '\\"', regex=False)
+               .str.replace("\n", "\\n", regex=False)
+               .str.replace("\r", "\\r", regex=False))
+    return '"' + escaped + '"'
+
+
+def triple_lines(df):
+    """
+    Returns the deduplicated N-Triples lines for the rows of `df` (six label
+    columns), computed column-wise.
+    """
+    if df.empty:
+        return pd.Series([], dtype=object)
+    columns = list(df.columns)
+
+    entity_frames = [
+        pd.DataFrame({'label': pd.unique(df[column]), 'type': entity_type})
+        for column, entity_type in zip(columns, COLUMN_TYPES)
+    ]
+    entities = pd.concat(entity_frames, ignore_index=True).drop_duplicates()
+    entity_iris = _iri(entities['label'].astype(str))
+    type_iris = "<" + ONTOLOGY_NAMESPACE + entities['type'] + ">"
+    parts = [
+        entity_iris + f" <{RDF_TYPE}> " + type_iris + " .",
+        entity_iris + f" <{RDFS_LABEL}> " + _literal(entities['label'].astype(str)) + " .",
+    ]
+
+    for source, predicate, target in COLUMN_LINKS:
+        pairs = df[[columns[source], columns[target]]].drop_duplicates()
+        parts.append(
+            _iri(pairs.iloc[:, 0].astype(str)) + f" <{ONTOLOGY_NAMESPACE}{predicate}> "
+            + _iri(pairs.iloc[:, 1].astype(str)) + " ."
+        )
+
+    lines = pd.concat(parts, ignore_index=True).drop_duplicates()
+    return lines.sort_values(ignore_index=True)
+
+
+def row_hashes(df):
+    """Stable 64-bit content hash of every row, used to detect changed rows."""
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return hashes.map("{:016x}".format)
+
+
+# --- Writing ---
+
+_TURTLE_PREFIXES = {
+    ONTOLOGY_NAMESPACE: "ns1:",
+    "http://www.w3.org/2000/01/rdf-schema#": "rdfs:",
+}
+
+
+def _turtle_term(term):
+    if term == f"<{RDF_TYPE}>":
+        return "a"
+    for namespace, prefix in _TURTLE_PREFIXES.items():
+        if term.startswith("<" + namespace):
+            return prefix + term[len(namespace) + 1:-1]
+    return term
+
+
+def _split_line(line):
+    subject, rest = line.split("> ", 1)
+    predicate, rest = rest.split("> ", 1)
+    return subject + ">", predicate + ">", rest[:-2]
+
+
+def write_ntriples(lines, out):
+    for line in lines:
+        out.write(line)
+        out.write("\n")
+
+
+def write_turtle(lines, out):
+    """
+    Streams sorted N-Triples lines as Turtle, grouping consecutive triples of
+    the same subject. Only the current subject is held in memory.
+    """
+    out.write(f"@prefix ns1: <{ONTOLOGY_NAMESPACE}> .\n")
+    out.write("@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n")
+    current = None
+    for line in lines:
+        subject, predicate, obj = _split_line(line)
+        if subject != current:
+            if current is not None:
+                out.write(" .\n")
+            out.write(f"\n{subject} {_turtle_term(predicate)} {_turtle_term(obj)}")
+            current = subject
+        else:
+            out.write(f" ;\n    {_turtle_term(predicate)} {_turtle_term(obj)}")
+    if current is not None:
+        out.write(" .\n")
+
+
+def _write_atomically(path, writer, lines):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".kg-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            writer(lines, out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# --- Incremental State ---
+
+def state_paths(output_path):
+    """Returns (state JSON, sorted N-Triples store) paths for an output file."""
+    return output_path + ".state.json", output_path + ".state.nt"
+
+
+def _load_state(output_path, output_format):
+    state_path, store_path = state_paths(output_path)
+    if not (os.path.exists(state_path) and os.path.exists(store_path) and os.path.exists(output_path)):
+        return None
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION or state.get("format") != output_format:
+        return None
+    return state
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def _surviving(removed_lines, current):
+    """
+    Returns the subset of `removed_lines` that the current rows still produce.
+    Only the entities and pairs touched by the removed rows are examined.
+    """
+    if removed_lines.empty or current.empty:
+        return set()
+    return set(removed_lines) & set(triple_lines(_rows_sharing_entities(removed_lines, current)))
+
+
+def _rows_sharing_entities(lines, current):
+    """Current rows mentioning any subject of the given lines."""
+    subjects = set(lines.str.split("> ", n=1).str[0] + ">")
+    mask = pd.Series(False, index=current.index)
+    for column in current.columns:
+        mask |= _iri(current[column]).isin(subjects)
+    return current[mask]
+
+
+# --- Build ---
+
+def build(source_df, output_path, output_format="turtle", incremental=False):
+    """
+    Builds the knowledge graph for the rows of `source_df` into `output_path`.
+    Returns a summary dict with the number of rows and triples written and,
+    for incremental builds, how many rows changed.
+    """
+    df = labels_frame(source_df)
+    df.columns = range(len(df.columns))
+    hashes = row_hashes(df)
+    df = df[~hashes.duplicated()]
+    hashes = hashes[~hashes.duplicated()]
+    writer = write_turtle if output_format == "turtle" else write_ntriples
+    state_path, store_path = state_paths(output_path)
+
+    state = _load_state(output_path, output_format) if incremental else None
+    if state is not None:
+        previous = state["rows"]
+        added_mask = ~hashes.isin(list(previous))
+        removed_hashes = set(previous) - set(hashes)
+        summary = {"rows": len(df), "added_rows": int(added_mask.sum()), "removed_rows": len(removed_hashes)}
+        if not summary["added_rows"] and not summary["removed_rows"]:
+            summary["triples"] = state["triples"]
+            summary["up_to_date"] = True
+            return summary
+
+        removed_df = pd.DataFrame([previous[h] for h in removed_hashes], columns=df.columns, dtype=object)
+        removed_lines = triple_lines(removed_df)
+        deleted = set(removed_lines) - _surviving(removed_lines, df)
+        added_lines = triple_lines(df[added_mask])
+
+        def merged():
+            old = (line for line in _read_lines(store_path) if line not in deleted)
+            last = None
+            for line in heapq.merge(old, added_lines):
+                if line != last:
+                    yield line
+                    last = line
+
+        # The new store is written to a temporary file, so the old one can be read meanwhile.
+        _write_atomically(store_path, write_ntriples, merged())
+        summary["incremental"] = True
+    else:
+        summary = {"rows": len(df), "added_rows": len(df), "removed_rows": 0}
+        _write_atomically(store_path, write_ntriples, triple_lines(df))
+
+    _write_atomically(output_path, writer, _read_lines(store_path))
+    triples = sum(1 for _ in _read_lines(store_path))
+    summary["triples"] = triples
+
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": STATE_VERSION,
+            "format": output_format,
+            "triples": triples,
+            "rows": {h: list(row) for h, row in zip(hashes, df.itertuples(index=False, name=None))},
+        }, f)
+    return summary
+
+
+# --- Ontology Shapes ---
+
+SHAPES_QUERY = """
+    PREFIX owl: <http://www.w3.org/2002/07/owl#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX sh: <http://www.w3.org/ns/shacl#>
+
+    SELECT ?entity ?relation ?next_entity
+    WHERE {
+        ?entity sh:property ?property;
+                rdfs:subClassOf owl:Thing.
+        ?property sh:class ?next_entity;
+                sh:path ?relation.
+    }
+"""
+
+
+def extract_shapes(ontology_path):
+    """
+    Returns the (entity, relation, next entity) shapes declared by the SHACL
+    ontology, i.e. which class links to which through which property.
+    """
+    from rdflib import Graph
+
+    graph = Graph()
+    graph.parse(ontology_path, format="turtle")
+    return [(str(row[0]), str(row[1]), str(row[2])) for row in graph.query(SHAPES_QUERY)]
+
+
+def load_shapes(ontology_path, cache_dir=CACHE_DIR):
+    """`extract_shapes`, rerun only when the ontology file's checksum changes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = _cache_path(ontology_path, file_checksum(ontology_path), ".shapes.json", cache_dir)
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return [tuple(shape) for shape in json.load(f)]
+
+    shapes = extract_shapes(ontology_path)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(shapes, f)
+    _drop_stale(ontology_path, cache_path, ".shapes.json", cache_dir)
+    return shapes
+
+
+# --- Command Line ---
+
+def add_arguments(parser):
+    parser.add_argument("--source", default=os.path.join(DATA_DIR, "flow_manager_ontology_poc_prep.xlsx"),
+                        help="Ontology-prep spreadsheet.")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "output_ORA_FNFM_KG.ttl"),
+                        help="Knowledge-graph file to write.")
+    parser.add_argument("--format", choices=["turtle", "ntriples"], default=None,
+                        help="Output format (defaults from the output extension).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only recompute triples for rows changed since the previous build.")
+    parser.add_argument("--shapes", metavar="ONTOLOGY_TTL", default=None,
+                        help="Also print the class shapes declared in this ontology file.")
+    parser.add_argument("--index", metavar="INDEX_PATH", default=None,
+                        help="Also compile the memory-mapped ontology index of the output (Turtle only).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="Directory for the Parquet and shape caches.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Read the spreadsheet and ontology directly, bypassing the caches.")
+
+
+def output_format_for(path, requested=None):
+    if requested:
+        return requested
+    return "ntriples" if path.endswith(".nt") else "turtle"
+
+
+def run(options, write=print):
+    output_format = output_format_for(options["output"], options.get("format"))
+    if options.get("no_cache"):
+        source_df = read_prep_spreadsheet(options["source"])
+    else:
+        source_df = load_prep_frame(options["source"], options.get("cache_dir") or CACHE_DIR)
+    summary = build(source_df, options["output"],
+                    output_format=output_format, incremental=options.get("incremental", False))
+    if summary.get("up_to_date"):
+        write(f"{options['output']} is up to date ({summary['rows']} rows, {summary['triples']} triples).")
+    else:
+        write(f"Wrote {summary['triples']} triples for {summary['rows']} rows to {options['output']} "
+              f"({summary['added_rows']} added, {summary['removed_rows']} removed rows).")
+    if options.get("index"):
+        from .ontology_index import load_index
+
+        index = load_index(options["output"], options["index"])
+        write(f"Mapped ontology index {options['index']} ({len(index)} concept triples).")
+    if options.get("shapes"):
+        if options.get("no_cache"):
+            shapes = extract_shapes(options["shapes"])
+        else:
+            shapes = load_shapes(options["shapes"], options.get("cache_dir") or CACHE_DIR)
+        for shape in shapes:
+            write(" ".join(shape))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the troubleshooting knowledge graph.")
+    add_arguments(parser)
+    run(vars(parser.parse_args(argv)))
@@ -0,0 +1,270 @@
+"""
+Read-only, memory-mapped index of the compiled ontology.
+
+The index holds what the diagnosis needs from the knowledge graph: every
+label, the types of the nodes carrying it, and for every concept label the
+(subject label, predicate name, object label) triples that
+`execute_query_for_concept` returns for it. Arrays are numpy views straight
+onto an `mmap` of the file, so every worker process that maps the same file
+shares its pages through the OS page cache instead of holding a private
+rdflib graph.
+
+File layout: an 8-byte magic, the length of a JSON header, the header
+(section offsets, predicate and type names, source checksum) and the
+8-byte aligned sections:
+
+    label_offsets   uint64[n_labels + 1]  byte offsets into label_blob
+    label_blob      UTF-8 labels, sorted bytewise for binary search
+    label_types     uint64[n_labels]      bitmask over header "types"
+    triple_offsets  uint64[n_labels + 1]  CSR row pointers by concept label
+    triple_subject  uint32[n_triples]     label ids
+    triple_predicate uint16[n_triples]    ids into header "predicates"
+    triple_object   uint32[n_triples]     label ids
+"""
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+from .resources import lazy_import
+
+np = lazy_import("numpy")
+
+MAGIC = b"FNFMIDX1"
+FORMAT_VERSION = 1
+
+ONTOLOGY_NAMESPACE = "http://www.slb.com/ontologies/Troubleshooting_ORA_FNFM_Ontology_#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+
+# Types accepted by the FILTER of `execute_query_for_concept`.
+TRAVERSED_TYPES = [ONTOLOGY_NAMESPACE + name for name in ("Failure", "RootCause", "Trigger", "DataChannel")]
+
+_SECTIONS = [
+    ("label_offsets", "<u8"),
+    ("label_blob", "u1"),
+    ("label_types", "<u8"),
+    ("triple_offsets", "<u8"),
+    ("triple_subject", "<u4"),
+    ("triple_predicate", "<u2"),
+    ("triple_object", "<u4"),
+]
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- Compilation ---
+
+def _concept_triples(graph):
+    """
+    Evaluates the traversal query for every concept at once. Returns
+    {concept label: set of (subject label, predicate name, object label)},
+    {node: labels} and {node: type IRIs}.
+    """
+    from rdflib import Literal, RDF, RDFS
+
+    labels, types = {}, {}
+    for node, label in graph.subject_objects(RDFS.label):
+        if isinstance(label, Literal):
+            labels.setdefault(node, set()).add(str(label))
+    for node, type_uri in graph.subject_objects(RDF.type):
+        types.setdefault(node, set()).add(str(type_uri))
+
+    traversed = set(TRAVERSED_TYPES)
+    concepts = {}
+    for subject, predicate, obj in graph:
+        if predicate == RDF.type or subject not in types or obj not in types:
+            continue
+        if subject not in labels or obj not in labels:
+            continue
+        if not (types[subject] & traversed or types[obj] & traversed):
+            continue
+        predicate_name = str(predicate).partition("#")[2]
+        rows = {(s, predicate_name, o) for s in labels[subject] for o in labels[obj]}
+        for concept in labels[subject]:
+            concepts.setdefault(concept, set()).update(rows)
+    return concepts, labels, types
+
+
+def compile_index(graph, path, source_checksum=""):
+    """Compiles an rdflib graph into an index file, replacing `path` atomically."""
+    concepts, node_labels, node_types = _concept_triples(graph)
+
+    all_labels = set()
+    for values in node_labels.values():
+        all_labels |= values
+    encoded = sorted(label.encode("utf-8") for label in all_labels)
+    label_ids = {label.decode("utf-8"): i for i, label in enumerate(encoded)}
+
+    type_names = sorted({t for values in node_types.values() for t in values})
+    if len(type_names) > 64:
+        raise ValueError("The ontology index supports at most 64 node types.")
+    type_bits = {name: 1 << i for i, name in enumerate(type_names)}
+    label_types = np.zeros(len(encoded), dtype=np.uint64)
+    for node, values in node_labels.items():
+        mask = 0
+        for type_name in node_types.get(node, ()):
+            mask |= type_bits[type_name]
+        for label in values:
+            label_types[label_ids[label]] |= np.uint64(mask)
+
+    predicates = sorted({p for rows in concepts.values() for _, p, _ in rows})
+    predicate_ids = {name: i for i, name in enumerate(predicates)}
+    triple_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    subjects, predicate_column, objects = [], [], []
+    for i, label in enumerate(encoded):
+        rows = sorted(concepts.get(label.decode("utf-8"), ()))
+        for s, p, o in rows:
+            subjects.append(label_ids[s])
+            predicate_column.append(predicate_ids[p])
+            objects.append(label_ids[o])
+        triple_offsets[i + 1] = len(subjects)
+
+    label_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    label_offsets[1:] = np.cumsum([len(label) for label in encoded], dtype=np.uint64)
+    arrays = {
+        "label_offsets": label_offsets,
+        "label_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "label_types": label_types,
+        "triple_offsets": triple_offsets,
+        "triple_subject": np.asarray(subjects, dtype=np.uint32),
+        "triple_predicate": np.asarray(predicate_column, dtype=np.uint16),
+        "triple_object": np.asarray(objects, dtype=np.uint32),
+    }
+    _write(path, arrays, {
+        "format_version": FORMAT_VERSION,
+        "source_checksum": source_checksum,
+        "types": type_names,
+        "predicates": predicates,
+    })
+
+
+def _write(path, arrays, header):
+    # Offsets are relative to the first section, so the header can be sized freely.
+    sections, offset = {}, 0
+    for name, dtype in _SECTIONS:
+        offset = (offset + 7) & ~7
+        sections[name] = [offset, len(arrays[name])]
+        offset += arrays[name].nbytes
+    header = json.dumps(dict(header, sections=sections)).encode("utf-8")
+    data_start = (len(MAGIC) + 8 + len(header) + 7) & ~7
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".idx-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, dtype in _SECTIONS:
+                out.write(b"\0" * (data_start + sections[name][0] - out.tell()))
+                out.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# --- Mapping ---
+
+class _Labels:
+    """Sequence view over the sorted label blob, so `bisect` can search it."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes()
+
+
+class OntologyIndex:
+    """A memory-mapped ontology index. Instances are read-only and thread-safe."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an ontology index.")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[header_start:header_start + header_length])
+        data_start = (header_start + header_length + 7) & ~7
+
+        for name, dtype in _SECTIONS:
+            offset, count = self.header["sections"][name]
+            setattr(self, name, np.frombuffer(self._mmap, dtype=dtype, count=count, offset=data_start + offset))
+        self.labels = _Labels(self.label_offsets, self.label_blob)
+        self.predicates = self.header["predicates"]
+        self.types = self.header["types"]
+        # Identifies the ontology the index was compiled from.
+        self.version = self.header["source_checksum"] or file_checksum(path)
+
+    def __len__(self):
+        return len(self.triple_subject)
+
+    def label(self, label_id):
+        return self.labels[label_id].decode("utf-8")
+
+    def label_id(self, label):
+        encoded = label.encode("utf-8")
+        i = bisect.bisect_left(self.labels, encoded)
+        if i < len(self.labels) and self.labels[i] == encoded:
+            return i
+        return None
+
+    def labels_of_type(self, type_name):
+        """Labels of the nodes typed with `type_name` (an IRI or an ontology class name)."""
+        if "#" not in type_name:
+            type_name = ONTOLOGY_NAMESPACE + type_name
+        if type_name not in self.types:
+            return []
+        bit = np.uint64(1 << self.types.index(type_name))
+        return [self.label(int(i)) for i in np.flatnonzero(self.label_types & bit)]
+
+    def concept_triples(self, concept):
+        """The (subject label, predicate name, object label) triples of a concept label."""
+        label_id = self.label_id(concept)
+        if label_id is None:
+            return []
+        start, end = int(self.triple_offsets[label_id]), int(self.triple_offsets[label_id + 1])
+        return [
+            (self.label(int(s)), self.predicates[int(p)], self.label(int(o)))
+            for s, p, o in zip(self.triple_subject[start:end], self.triple_predicate[start:end],
+                               self.triple_object[start:end])
+        ]
+
+
+def load_index(source_path, index_path):
+    """
+    Maps the index of `source_path` (a Turtle knowledge graph), compiling it
+    first when it is missing or was built from a different source.
+    """
+    checksum = file_checksum(source_path)
+    if os.path.exists(index_path):
+        try:
+            index = OntologyIndex(index_path)
+            if (index.header.get("format_version") == FORMAT_VERSION
+                    and index.header.get("source_checksum") == checksum):
+                return index
+        except ValueError:
+            pass
+
+    from rdflib import Graph
+
+    graph = Graph()
+    graph.parse(source_path, format="turtle")
+    compile_index(graph, index_path, source_checksum=checksum)
+    return OntologyIndex(index_path)
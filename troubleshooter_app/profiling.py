@@ -0,0 +1,154 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries the profiling header with the configured
+token, or when it is picked by the sampling rate. Profiled requests capture a
+cProfile dump and a tracemalloc snapshot, stored with the request metadata in
+a bounded directory that the `profiles` management command can aggregate and
+diff. When neither a token nor a sampling rate is configured the middleware
+removes itself, so unprofiled deployments pay nothing.
+"""
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_FILENAME = 'cprofile.prof'
+SNAPSHOT_FILENAME = 'tracemalloc.snapshot'
+META_FILENAME = 'meta.json'
+
+
+def profiling_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def list_profiles(root=None):
+    """
+    Returns the profile directories under `root`, oldest first. `root` may
+    also point at a single profile directory.
+    """
+    root = root or profiling_dir()
+    if os.path.isfile(os.path.join(root, META_FILENAME)):
+        return [root]
+    if not os.path.isdir(root):
+        return []
+    entries = [
+        os.path.join(root, name) for name in sorted(os.listdir(root))
+        if os.path.isfile(os.path.join(root, name, META_FILENAME))
+    ]
+    return entries
+
+
+def load_meta(profile_path):
+    with open(os.path.join(profile_path, META_FILENAME)) as f:
+        return json.load(f)
+
+
+def prune_profiles(root, keep):
+    """Deletes the oldest profiles so that at most `keep` remain."""
+    profiles = list_profiles(root)
+    for path in profiles[:max(len(profiles) - keep, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class SampledProfilerMiddleware:
+    """
+    Profiles a request when it is authorised through the profiling header or
+    selected by `PROFILING_SAMPLE_RATE`. Only one request is profiled at a
+    time; others running concurrently are served unprofiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0) or 0)
+        if not self.token and self.sample_rate <= 0:
+            raise MiddlewareNotUsed("Profiling is disabled.")
+        header = getattr(settings, 'PROFILING_HEADER', 'X-Profile-Token')
+        self.meta_key = 'HTTP_' + header.upper().replace('-', '_')
+        self.root = profiling_dir()
+        self.max_profiles = int(getattr(settings, 'PROFILING_MAX_PROFILES', 200))
+        self.frames = int(getattr(settings, 'PROFILING_TRACEMALLOC_FRAMES', 10))
+        self._lock = threading.Lock()
+
+    def _requested(self, request):
+        supplied = request.META.get(self.meta_key)
+        if supplied and self.token:
+            return 'header' if hmac.compare_digest(supplied, self.token) else None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self._requested(request)
+        if trigger is None or not self._lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, trigger)
+        finally:
+            self._lock.release()
+
+    def _profile(self, request, trigger):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+
+        profile_id = self._save(request, response, trigger, profiler, snapshot, duration, peak)
+        if profile_id:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+    def _save(self, request, response, trigger, profiler, snapshot, duration, peak):
+        now = datetime.now(timezone.utc)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')[:60] or 'root'
+        profile_id = f"{now:%Y%m%dT%H%M%S%f}_{request.method}_{slug}_{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.root, profile_id)
+        try:
+            os.makedirs(path)
+            profiler.dump_stats(os.path.join(path, PROFILE_FILENAME))
+            snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+            ]).dump(os.path.join(path, SNAPSHOT_FILENAME))
+            meta = {
+                'id': profile_id,
+                'timestamp': now.isoformat(),
+                'method': request.method,
+                'path': request.path,
+                'query_string': request.META.get('QUERY_STRING', ''),
+                'status_code': response.status_code,
+                'trigger': trigger,
+                'duration_seconds': duration,
+                'peak_traced_bytes': peak,
+            }
+            with open(os.path.join(path, META_FILENAME), 'w') as f:
+                json.dump(meta, f, indent=2)
+            prune_profiles(self.root, self.max_profiles)
+            return profile_id
+        except OSError as e:
+            print(f"Error saving profile: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
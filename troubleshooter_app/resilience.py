@@ -0,0 +1,351 @@
+"""
+Bounds on the time a diagnosis spends waiting for Teradata.
+
+A diagnosis runs under a deadline (`request_deadline`) and every check under
+a statement timeout. All checks also go through the circuit breaker of the
+Teradata engine. After FNFM_BREAKER_FAILURES consecutive failed or timed-out
+checks the breaker opens, and checks are skipped for
+FNFM_BREAKER_RESET_SECONDS. After that a single probe check is let through,
+and it closes the breaker again if it succeeds.
+
+A check that fails, times out, would start past the deadline, is skipped by
+the breaker or is not admitted in time (see admission.py) evaluates to
+UNKNOWN. The diagnosis then returns partial results
+instead of failing as a whole.
+
+A timed-out check whose statement can't be cancelled keeps running in its
+worker thread, inside the connection it was given. That connection is
+abandoned: nothing else uses it, and it is invalidated once the worker
+lets go of it. The later checks of the same `checks_connection` block run
+on a fresh pooled connection instead.
+"""
+import contextvars
+import math
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .instrumentation import metrics
+from .slow_queries import mark_cancelled, query_context
+
+# Status of a check that could not be evaluated.
+UNKNOWN = 'unknown'
+
+# How long a cancelled statement may take to unwind before its connection is dropped.
+CANCEL_GRACE_SECONDS = 1.0
+
+_deadline = contextvars.ContextVar('fnfm_deadline', default=None)
+_connections = contextvars.ContextVar('fnfm_check_connections', default=None)
+# Connections still in use by the worker of a timed-out check.
+_abandoned = weakref.WeakSet()
+_abandoned_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='fnfm-check')
+
+
+class CheckTimeout(Exception):
+    """Raised when a check runs past its statement timeout."""
+
+
+class QueueTimeout(Exception):
+    """Raised when a statement waits past its queue timeout for admission (see admission.py)."""
+
+
+def is_unknown(status):
+    return isinstance(status, str) and status == UNKNOWN
+
+
+def _setting(name, default):
+    value = getattr(settings, name, default)
+    return float(value) if value else None
+
+
+# --- Deadlines ---
+
+@contextmanager
+def request_deadline(seconds=None):
+    """
+    Bounds the enclosed block to `seconds` (FNFM_REQUEST_DEADLINE_SECONDS by
+    default; 0 disables it). A nested deadline never extends an outer one.
+    """
+    if seconds is None:
+        seconds = _setting('FNFM_REQUEST_DEADLINE_SECONDS', 60)
+    expires = time.monotonic() + seconds if seconds else None
+    outer = _deadline.get()
+    if outer is not None and (expires is None or outer < expires):
+        expires = outer
+    token = _deadline.set(expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """Seconds left before the current deadline, or None without a deadline."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def statement_timeout():
+    """FNFM_CHECK_TIMEOUT_SECONDS, capped by the current deadline; None without either."""
+    timeout = _setting('FNFM_CHECK_TIMEOUT_SECONDS', 15)
+    remaining = remaining_time()
+    if remaining is not None:
+        timeout = min(timeout or math.inf, remaining)
+    return timeout
+
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. `closed` lets every call through,
+    `open` rejects calls until `reset_timeout` has passed, then `half_open`
+    lets one probe call through.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, clock=time.monotonic):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def failure_threshold(self):
+        if self._failure_threshold is not None:
+            return self._failure_threshold
+        return int(_setting('FNFM_BREAKER_FAILURES', 5) or 0)
+
+    @property
+    def reset_timeout(self):
+        if self._reset_timeout is not None:
+            return self._reset_timeout
+        return _setting('FNFM_BREAKER_RESET_SECONDS', 30) or 0.0
+
+    def reset(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def rejecting(self):
+        """Returns whether calls are rejected now, without taking the probe of a half-open breaker."""
+        with self._lock:
+            if self.state == 'open':
+                return self.clock() - self.opened_at < self.reset_timeout
+            return self.state == 'half_open' and self._probing
+
+    def allow(self):
+        """Returns whether a call may go through now."""
+        with self._lock:
+            if self.state == 'open' and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._probing:
+                    return False
+                self._probing = True
+            return self.state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            threshold = self.failure_threshold
+            if self.state == 'half_open' or (threshold and self.failures >= threshold):
+                if self.state != 'open':
+                    metrics.inc('fnfm_circuit_opened_total', help_text='Times a circuit breaker opened.',
+                                breaker=self.name)
+                self.state = 'open'
+                self.opened_at = self.clock()
+
+
+# The breaker guarding the shared Teradata engine.
+teradata_breaker = CircuitBreaker('teradata')
+
+metrics.register_gauge(
+    'fnfm_circuit_open',
+    lambda: {(('breaker', teradata_breaker.name),): int(teradata_breaker.state != 'closed')},
+    'Whether a circuit breaker is open or half-open (1) or closed (0).',
+)
+
+
+# --- Guarded Checks ---
+
+def _count(outcome):
+    metrics.inc('fnfm_check_outcomes_total', help_text='Teradata check evaluations by outcome.', outcome=outcome)
+
+
+def _cancel(conn):
+    """Cancels the statement running on an SQLAlchemy connection. Returns whether the driver supports it."""
+    try:
+        raw = conn.connection.dbapi_connection
+        # teradatasql connections have cancel(), sqlite3 (the stand-in) has interrupt()
+        cancel = getattr(raw, 'cancel', None) or getattr(raw, 'interrupt', None)
+        if cancel is not None:
+            mark_cancelled(conn)
+            cancel()
+            return True
+    except Exception as e:
+        print(f"Error cancelling a check: {e}")
+    return False
+
+
+def _recover(conn):
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+
+
+def is_abandoned(conn):
+    with _abandoned_lock:
+        return conn in _abandoned
+
+
+def _invalidate(conn):
+    try:
+        conn.invalidate()
+    except Exception as e:
+        print(f"Error invalidating an abandoned connection: {e}")
+
+
+def _abandon(conn, future):
+    """Leaves `conn` to the worker running `future`, which invalidates it when done."""
+    with _abandoned_lock:
+        _abandoned.add(conn)
+    # Runs in the worker thread, or right away if it just finished.
+    future.add_done_callback(lambda _: _invalidate(conn))
+
+
+def call_with_timeout(function, conn, partition_id, datachannel, timeout):
+    """
+    Runs a check on `conn` with a statement timeout. On timeout the statement
+    is cancelled and CheckTimeout is raised; if it is still running after
+    CANCEL_GRACE_SECONDS, `conn` is abandoned to the worker (see
+    `is_abandoned`).
+    """
+    if timeout is None:
+        return function(conn, partition_id, datachannel)
+    # The check records its stages in the request's context from the worker thread.
+    context = contextvars.copy_context()
+    future = _executor.submit(context.run, function, conn, partition_id, datachannel)
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except FutureTimeoutError:
+        cancelled = _cancel(conn)
+        try:
+            future.result(timeout=CANCEL_GRACE_SECONDS if cancelled else 0)
+        except Exception:
+            pass
+        if not future.done():
+            _abandon(conn, future)
+        raise CheckTimeout(f"{getattr(function, '__name__', function)} exceeded {timeout:.1f}s")
+
+
+def guarded_check(function, conn, partition_id, datachannel, breaker=None):
+    """
+    Evaluates one check within the statement timeout, the request deadline
+    and the engine's circuit breaker. Returns the check result or UNKNOWN.
+    """
+    breaker = breaker or teradata_breaker
+    if conn is not None and is_abandoned(conn):
+        connections = _connections.get()
+        conn = connections.replace(conn) if connections is not None else None
+    remaining = remaining_time()
+    if conn is None or (remaining is not None and remaining <= 0):
+        _count('deadline' if conn is not None else 'no_connection')
+        return UNKNOWN
+    if not breaker.allow():
+        _count('circuit_open')
+        return UNKNOWN
+
+    timeout = statement_timeout()
+    try:
+        with query_context(check=getattr(function, '__name__', str(function)), data_channel=datachannel,
+                           partition_id=partition_id):
+            result = call_with_timeout(function, conn, partition_id, datachannel, timeout)
+    except QueueTimeout as e:
+        # The warehouse is busy, not failing: the breaker is left alone.
+        _count('queue_timeout')
+        print(f"Check {getattr(function, '__name__', function)} for {datachannel} not admitted: {e}")
+        _recover(conn)
+        return UNKNOWN
+    except Exception as e:
+        breaker.record_failure()
+        _count('timeout' if isinstance(e, CheckTimeout) else 'error')
+        print(f"Error in check {getattr(function, '__name__', function)} for {datachannel}: {e}")
+        if not is_abandoned(conn):
+            _recover(conn)
+        return UNKNOWN
+    breaker.record_success()
+    _count('ok')
+    return result
+
+
+class _CheckConnections:
+    """The connections of one `checks_connection` block: the current one and those abandoned before it."""
+
+    def __init__(self, engine, conn, breaker):
+        self.engine = engine
+        self.breaker = breaker
+        self.current = conn
+
+    def replace(self, conn):
+        """The connection to run a check on instead of the abandoned `conn`; None if none can be opened."""
+        if self.current is not None and not is_abandoned(self.current):
+            return self.current
+        try:
+            self.current = self.engine.connect()
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error reconnecting to Teradata: {e}")
+            self.current = None
+        return self.current
+
+    def close(self):
+        if self.current is not None and not is_abandoned(self.current):
+            self.current.close()
+
+
+@contextmanager
+def checks_connection(engine, breaker=None):
+    """
+    Yields a connection of `engine` for the checks, or None when the breaker
+    is open or the connection fails; the checks then evaluate to UNKNOWN.
+    A failed connection counts against the breaker, but a successful one
+    doesn't close it: pooled connections hardly ever fail, so only the
+    checks themselves tell whether Teradata is healthy, and the first one
+    run on a half-open breaker is its probe. Checks given the yielded
+    connection after a timed-out check abandoned it run on a new one.
+    """
+    breaker = breaker or teradata_breaker
+    if engine is None or breaker.rejecting():
+        yield None
+        return
+    try:
+        conn = engine.connect()
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Error connecting to Teradata: {e}")
+        yield None
+        return
+    connections = _CheckConnections(engine, conn, breaker)
+    token = _connections.set(connections)
+    try:
+        yield conn
+    finally:
+        _connections.reset(token)
+        connections.close()
@@ -0,0 +1,133 @@
+"""
+Lazily initialised application resources and imports.
+
+Importing the app must not connect to Teradata, parse the ontology or pull in
+pandas, duckdb, rdflib and pyvis: `migrate`, `collectstatic` and the test
+runner never need them. Resources are registered by name in
+`TroubleshooterAppConfig.ready` and created on first use, or up front by
+`registry.warm_up()` (called by the WSGI/ASGI entry points).
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.utils.module_loading import import_string
+
+
+class ResourceRegistry:
+    """
+    Creates each registered resource once per process. Factories are callables
+    or dotted paths to one. A factory returning None (e.g. missing Teradata
+    credentials) is not cached, so the next access tries again.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._values = {}
+        self._lock = threading.RLock()
+        self.timings = {}
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._values.pop(name, None)
+
+    def get(self, name):
+        value = self._values.get(name)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self._values.get(name)
+            if value is None:
+                factory = self._factories[name]
+                if isinstance(factory, str):
+                    factory = import_string(factory)
+                start = time.perf_counter()
+                value = factory()
+                self.timings[name] = time.perf_counter() - start
+                if value is not None:
+                    self._values[name] = value
+            return value
+
+    def peek(self, name):
+        """Returns the resource if it has already been created, without creating it."""
+        return self._values.get(name)
+
+    def warm_up(self, names=None):
+        """Creates the given (by default all) resources and returns their creation times."""
+        for name in names or list(self._factories):
+            self.get(name)
+        return {name: self.timings.get(name) for name in names or list(self._factories)}
+
+    def reset(self, *names):
+        with self._lock:
+            for name in names or list(self._values):
+                self._values.pop(name, None)
+
+    @contextmanager
+    def override(self, name, value):
+        """Serves `value` for `name` for the duration of the block."""
+        with self._lock:
+            previous = self._values.get(name)
+            self._values[name] = value
+        try:
+            yield value
+        finally:
+            with self._lock:
+                if previous is None:
+                    self._values.pop(name, None)
+                else:
+                    self._values[name] = previous
+
+
+registry = ResourceRegistry()
+
+
+def lazy_import(name):
+    """
+    Returns module `name`, deferring its execution until an attribute is
+    first accessed. Already imported modules are returned as they are.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyAttributes:
+    """
+    Module attributes resolved on first access: registry resources and
+    heavy imports. Install `getattr` as the module's `__getattr__` so that
+    `module.td_engine` keeps working (and stays patchable) without being
+    created at import time. Code inside the module reads them with
+    `lazy('td_engine')`; an attribute assigned on the module wins.
+    """
+
+    def __init__(self, module_globals, resources=None, imports=None):
+        self._globals = module_globals
+        self._resources = resources or {}
+        self._imports = imports or {}
+
+    def __call__(self, name):
+        if name in self._globals:
+            return self._globals[name]
+        if name in self._resources:
+            return registry.get(self._resources[name])
+        if name in self._imports:
+            # Imports are cached on the module like a regular import would be.
+            value = self._globals[name] = import_string(self._imports[name])
+            return value
+        raise AttributeError(f"module {self._globals['__name__']!r} has no attribute {name!r}")
+
+    def getattr(self, name):
+        return self(name)
@@ -1,12 +1,22 @@
 import os
 import urllib.parse
-import pandas as pd
-import duckdb
-from rdflib import Graph, Literal, Namespace, RDF, RDFS, URIRef
-from rdflib.namespace import OWL, RDF, RDFS, FOAF, XSD, DC, SKOS
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 from django.conf import settings
+from django.db import DatabaseError
+from . import admission, slow_queries
+from .batching import batched_check
+from .check_store import load_check_results, save_check_results
+from .coalesce import handoff_since
+from .fetch import fetch_frame
+from .instrumentation import count_cache, stage, timed, timed_check
+from .label_index import LabelIndex
+from .ontology_index import load_index
+from .resilience import checks_connection, guarded_check, is_unknown, request_deadline
+from .resources import lazy_import
+from .snapshot import duckdb_cursor, graph_version, is_snapshot, ontology_snapshot
+
+# Heavy libraries are loaded on first use so importing the app stays cheap.
+pd = lazy_import('pandas')
 
 # --- Data Access and Query Functions ---
 
@@ -26,11 +36,15 @@ def get_teradata_engine():
         return None
 
     try:
+        from sqlalchemy import create_engine
+
         encoded_pass = urllib.parse.quote_plus(pasw)
         # We don't use port as it is not needed in the connection string
         td_engine = create_engine(
             f'teradatasql://{user}:{encoded_pass}@{host}/?encryptdata=true'
         )
+        admission.install(td_engine)
+        slow_queries.install(td_engine)
         print("Teradata engine created successfully.")
         return td_engine
     except Exception as e:
@@ -42,6 +56,8 @@ def load_ontology_graph():
     Loads the ontology graph from the specified TTL file.
     Returns the graph object or None if it fails.
     """
+    from rdflib import Graph
+
     file_path = os.path.join(settings.BASE_DIR, 'data', 'output_ORA_FNFM_KG.ttl')
     g = Graph()
     try:
@@ -52,10 +68,29 @@ def load_ontology_graph():
         print(f"Error loading ontology: {e}")
         return None
 
+def load_ontology_index():
+    """
+    Maps the compiled ontology index, (re)compiling it from the TTL file
+    when the file changed. Worker processes mapping the same index share its
+    memory. Returns the index or None if it fails.
+    """
+    file_path = os.path.join(settings.BASE_DIR, 'data', 'output_ORA_FNFM_KG.ttl')
+    index_path = os.path.join(settings.BASE_DIR, 'data', '.cache', 'output_ORA_FNFM_KG.idx')
+    try:
+        index = load_index(file_path, index_path)
+        print("Ontology index mapped successfully.")
+        return index
+    except Exception as e:
+        print(f"Error loading ontology index: {e}")
+        return None
+
+@timed('failure_labels')
 def get_all_failure_labels(g):
     """
-    Queries the ontology graph to get all failure labels.
+    Queries the ontology graph (or its index or snapshot) to get all failure labels.
     """
+    if is_snapshot(g):
+        return g.labels_of_type("Failure")
     query= """
     PREFIX troubleshooting_ora_fnfm_ontology_: <http://www.slb.com/ontologies/Troubleshooting_ORA_FNFM_Ontology_#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -69,17 +104,129 @@ def get_all_failure_labels(g):
     df_failures = pd.DataFrame(failure_query_result, columns=["failure"])
     return df_failures["failure"].tolist()
 
+def ontology_version(g):
+    """
+    Identifies the ontology content of `g`: the version of an index or
+    snapshot, or the identity and size of an rdflib graph.
+    """
+    if is_snapshot(g):
+        return g.version
+    return graph_version(g)
+
+# Failure-label search index of the current ontology version.
+_failure_label_index = {}
+
+def get_failure_label_index(g):
+    """
+    Returns the LabelIndex of all failure labels, built once per ontology
+    version, so the labels are not queried again on every page load.
+    """
+    version = ontology_version(g)
+    index = _failure_label_index.get(version)
+    count_cache('failure_labels', index is not None)
+    if index is None:
+        index = LabelIndex(get_all_failure_labels(g))
+        _failure_label_index.clear()
+        _failure_label_index[version] = index
+    return index
+
+# Dtype hints of FNFM_FLEET_METADATA columns for the Arrow fetch layer.
+METADATA_DTYPES = {
+    'partition_id': 'int64',
+    'serial_number': 'category',
+    'job_number': 'category',
+    'job_start': 'timestamp',
+}
+
+@timed('metadata_fetch')
 def get_metadata(td_engine):
-    """Fetches the FNFM_FLEET_METADATA table from Teradata."""
+    """
+    Fetches the FNFM_FLEET_METADATA table from Teradata, streamed in chunks
+    through Arrow (serial and job numbers categorical, native timestamps).
+    """
     try:
         with td_engine.connect() as conn:
             sql = "SELECT * FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA"
-            df = pd.read_sql(sql, conn)
+            df = fetch_frame(conn, sql, dtypes=METADATA_DTYPES)
             return df
     except Exception as e:
         print(f"Error fetching metadata: {e}")
         return pd.DataFrame()
 
+# Searchable metadata columns: the SQL expression compared and returned for
+# each, and the column its parent selection filters on.
+METADATA_SEARCH_FIELDS = {
+    'serial_number': ('serial_number', None),
+    'job_number': ('job_number', 'serial_number'),
+    'job_start': ('CAST(job_start AS CHAR(26))', 'job_number'),
+}
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@timed('metadata_search')
+def search_metadata_values(td_engine, field, prefix='', cursor=None, parent_value=None, limit=20):
+    """
+    Returns one page of the distinct values of a FNFM_FLEET_METADATA field
+    starting with `prefix`, in ascending order after `cursor` (the last value
+    of the previous page), as (values, next_cursor). Filtering, ordering and
+    the page size are pushed down to Teradata so only `limit + 1` rows are
+    transferred. job_number pages are restricted to the serial number
+    `parent_value`, job_start pages to the job number `parent_value`.
+    """
+    from sqlalchemy import text
+
+    expression, parent_column = METADATA_SEARCH_FIELDS[field]
+    conditions = [f"{expression} IS NOT NULL"]
+    params = {}
+    if prefix:
+        conditions.append(f"{expression} LIKE :prefix ESCAPE '\\'")
+        params['prefix'] = _escape_like(prefix) + '%'
+    if cursor:
+        conditions.append(f"{expression} > :cursor")
+        params['cursor'] = cursor
+    if parent_column:
+        conditions.append(f"{parent_column} = :parent_value")
+        params['parent_value'] = parent_value
+    sql = f"""
+    SELECT TOP {int(limit) + 1} {expression} AS value
+    FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA
+    WHERE {' AND '.join(conditions)}
+    GROUP BY {expression}
+    ORDER BY 1"""
+
+    with td_engine.connect() as conn:
+        values = [str(row[0]) for row in conn.execute(text(sql), params)]
+    page = values[:limit]
+    return page, (page[-1] if len(values) > limit else None)
+
+def get_new_partitions(td_engine, after, limit=100):
+    """
+    Returns up to `limit` FNFM_FLEET_METADATA partition ids greater than
+    `after`, in ascending order, for incremental polling.
+    """
+    from sqlalchemy import text
+
+    sql = f"""
+    SELECT TOP {int(limit)} partition_id
+    FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA
+    WHERE partition_id > :after
+    ORDER BY partition_id"""
+    with td_engine.connect() as conn:
+        return [int(row[0]) for row in conn.execute(text(sql), {'after': int(after)})]
+
+def get_latest_partitions(td_engine, count):
+    """Returns the `count` highest partition ids of FNFM_FLEET_METADATA, in ascending order."""
+    from sqlalchemy import text
+
+    sql = f"""
+    SELECT TOP {int(count)} partition_id
+    FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA
+    ORDER BY partition_id DESC"""
+    with td_engine.connect() as conn:
+        return sorted(int(row[0]) for row in conn.execute(text(sql)))
+
+@timed('partition_lookup')
 def get_partition_id(td_engine, serial_number, job_number, job_start):
     """
     Fetches the partition ID based on user selections.
@@ -106,7 +253,10 @@ def get_partition_id(td_engine, serial_number, job_number, job_start):
 def execute_query_for_concept(g, concept):
     """
     Executes a SPARQL query to get triples for a given concept.
+    With an OntologyIndex or snapshot the precompiled triples are looked up instead.
     """
+    if is_snapshot(g):
+        return g.concept_triples(concept)
     query = f"""
     PREFIX troubleshooting_ora_fnfm_ontology_: <http://www.slb.com/ontologies/Troubleshooting_ORA_FNFM_Ontology_#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -162,6 +312,7 @@ def graph_search_tuple(g, concept, visited=None, result=None, max_depth=-1, dept
 
 # --- Teradata Query Functions (from your original view) ---
 # These functions are now cleanly separated in the services layer.
+@timed_check
 def threshold_sup_10450(conn, partition_id, triple_subject):
     sql = f""" sel sum(error_count) as count_of_error
     from PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB
@@ -171,6 +322,7 @@ def threshold_sup_10450(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return result_value > 10450 if result_value is not None else False
 
+@timed_check
 def threshold_sup_12000(conn, partition_id, triple_subject):
     sql = f""" sel sum(error_count) as sum_error_count
     from PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB
@@ -179,6 +331,7 @@ def threshold_sup_12000(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return result_value is not None and result_value > 12000
 
+@timed_check
 def threshold_sup_5000(conn, partition_id, triple_subject):
     sql = f""" sel sum(error_count) as sum_error_count
     from PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB
@@ -187,6 +340,7 @@ def threshold_sup_5000(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return result_value > 5000 if result_value is not None else False
 
+@timed_check
 def discrete_sup_10(conn, partition_id, triple_subject):
     sql = f""" sel sum(count_error) as count_of_error
     from PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB
@@ -195,6 +349,7 @@ def discrete_sup_10(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return int(result_value) > 10 if result_value is not None else False
 
+@timed_check
 def discrete_sup_20(conn, partition_id, triple_subject):
     sql = f""" sel sum(count_error) as count_of_error
     from PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB
@@ -203,6 +358,7 @@ def discrete_sup_20(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return int(result_value) > 20 if result_value is not None else False
 
+@timed_check
 def mcrterrfm_check(conn, partition_id, triple_subject):
     sql = f""" sel sum(count_error) as count_of_error
     from PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB
@@ -211,6 +367,7 @@ def mcrterrfm_check(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return int(result_value) > 1 if result_value is not None else False
 
+@timed_check
 def limit_check(conn, partition_id, triple_subject):
     sql = f""" sel sum(error_count),min("min"),max("max")
     from PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg
@@ -219,6 +376,7 @@ def limit_check(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return int(result_value) > 0 if result_value is not None else False
 
+@timed_check
 def status_check(conn, partition_id, triple_subject):
     sql = f""" sel partition_id
     from PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_status_checks
@@ -226,6 +384,7 @@ def status_check(conn, partition_id, triple_subject):
     df = pd.read_sql(sql, conn)
     return not df.empty
 
+@timed_check
 def large_pump(conn, partition_id, triple_subject):
     sql = f""" sel partition_id
     from PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_large_pump_cal_check
@@ -233,6 +392,7 @@ def large_pump(conn, partition_id, triple_subject):
     df = pd.read_sql(sql, conn)
     return not df.empty
 
+@timed_check
 def small_pump(conn, partition_id, triple_subject):
     sql = f""" sel partition_id
     from PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_small_pump_cal_check
@@ -240,6 +400,7 @@ def small_pump(conn, partition_id, triple_subject):
     df = pd.read_sql(sql, conn)
     return not df.empty
 
+@timed_check
 def mterrstafm_check(conn, partition_id, triple_subject):
     sql = f""" sel sum(count_error) as count_of_error
     from PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB
@@ -248,14 +409,38 @@ def mterrstafm_check(conn, partition_id, triple_subject):
     result_value = df.iloc[0, 0]
     return int(result_value) > 1 if result_value is not None else False
 
+# Maps each trigger label of the ontology to the check function evaluating it.
+CHECK_FUNCTIONS = {
+    "FNFM Uplink telemetry check": status_check,
+    "FNFM LIN device check": status_check,
+    "FNFM CAN device check": status_check,
+    "FNFM Motor Error Status": mterrstafm_check,
+    "FNFM Solenoid PHM HALL Voltage": limit_check,
+    "FNFM Solenoid PHM Digital Voltage": limit_check,
+    "FNFM Solenoid PHM LIN Voltage ADC": limit_check,
+    "FNFM Master Controller Reference Voltage": limit_check,
+    "FNFM Master Controller Digital Voltage": limit_check,
+    "FNFM Master Controller Input Voltage": limit_check,
+    "FNFM Master Controller Core Voltage": limit_check,
+    "FNFM Master Controller EIP Core Voltage": limit_check,
+    "FNFM Master Controller EIP Digital Voltage": limit_check,
+    "FNFM LVPS Digital Voltage": limit_check,
+    "FNFM LVPS Positive Analog Voltage": limit_check,
+    "FNFM LVPS Negative Analog Voltage": limit_check,
+    "FNFM Small pump calibration check": small_pump,
+    "FNFM Large pump calibration check": large_pump,
+}
+
 def execute_function_from_the_map(message, mapping, conn, partition_id, datachannel):
     """Execution of the function."""
     if message in mapping:
         return mapping[message](conn, partition_id, datachannel)
 
-def recursive_execute_function(dict_tuple_result, mapping, conn, partition_id):
-    """Recursive execution of all functions."""
-    result_list = []
+def check_invocations(dict_tuple_result):
+    """
+    Returns the DataFrame of (Trigger, Consume, DataChannel) rows of a
+    traversal result: every check the subgraph needs evaluated.
+    """
     all_tuples = [t for tuples in dict_tuple_result.values() for t in tuples]
     df_tuples = pd.DataFrame(all_tuples, columns=['Subject', 'Predicate', 'Object'])
     query_trigger_datachannel = """
@@ -264,16 +449,67 @@ def recursive_execute_function(dict_tuple_result, mapping, conn, partition_id):
     JOIN df_tuples t2 ON t1.Object = t2.Subject
     WHERE t1.Predicate = 'isTriggeredBy' AND t2.Predicate = 'consume'
     """
-    result_df = duckdb.query(query_trigger_datachannel).to_df()
-    for index, row in result_df.iterrows():
-        function = row.iloc[0]
-        consume = row.iloc[1]
-        datachannel = row.iloc[2]
-        result = execute_function_from_the_map(function, mapping, conn, partition_id, datachannel)
-        result_list.append((function, consume, datachannel, result))
-    df = pd.DataFrame(result_list, columns=['Subject', 'Predicate', 'Object', 'Status'])
-    return df
+    with stage('duckdb_join'):
+        return duckdb_cursor().query(query_trigger_datachannel).to_df()
 
+def evaluate_checks(invocations, mapping, conn, partition_id, results=None, store_results=False):
+    """
+    Evaluates the check of every (trigger, data channel) pair once per
+    (check function, data channel): triggers sharing a check and a channel
+    share the result. `results` ({(function, channel): result}) is updated
+    and returned, so several subgraphs can share one set of evaluations.
+    Checks that fail or time out are UNKNOWN (see resilience.py). Stored
+    results are only reused when another worker stored them while this
+    diagnosis waited for its lock (see coalesce.handoff_since); incremental
+    diagnoses reuse the others through incremental.rediagnose. With
+    `store_results` the newly evaluated ones are added to the store.
+    """
+    if results is None:
+        results = {}
+    pending = {}
+    for trigger, datachannel in invocations:
+        function = mapping.get(trigger)
+        if function is not None and (function, datachannel) not in results:
+            pending[function, datachannel] = None
+    since = handoff_since()
+    if since is not None:
+        results.update(load_check_results(partition_id, list(pending), since=since))
+    evaluated = {}
+    for function, datachannel in pending:
+        if (function, datachannel) not in results:
+            # Batched with the concurrent calls of the same check (see batching.py).
+            evaluated[function, datachannel] = guarded_check(batched_check(function), conn, partition_id, datachannel)
+    results.update(evaluated)
+    if store_results and evaluated:
+        try:
+            save_check_results(partition_id, evaluated)
+        except DatabaseError as e:
+            print(f"Error storing check results: {e}")
+    return results
+
+def check_status_frame(invocation_df, mapping, results):
+    """Fans evaluated checks back out to the (Subject, Predicate, Object, Status) rows of a subgraph."""
+    result_list = [
+        (trigger, consume, datachannel, results.get((mapping.get(trigger), datachannel)))
+        for trigger, consume, datachannel in invocation_df.itertuples(index=False)
+    ]
+    return pd.DataFrame(result_list, columns=['Subject', 'Predicate', 'Object', 'Status'])
+
+def recursive_execute_function(dict_tuple_result, mapping, conn, partition_id, store_results=False):
+    """Recursive execution of all functions."""
+    result_df = check_invocations(dict_tuple_result)
+    invocations = [(row.iloc[0], row.iloc[2]) for _, row in result_df.iterrows()]
+    results = evaluate_checks(invocations, mapping, conn, partition_id, store_results=store_results)
+    return check_status_frame(result_df, mapping, results)
+
+def merge_check_results(dict_tuple_result, result_df_functions):
+    """Joins the check statuses onto the traversed triples, keeping the evaluated rows."""
+    all_tuples = [t for tuples in dict_tuple_result.values() for t in tuples]
+    df_tuples = pd.DataFrame(all_tuples, columns=['Subject', 'Predicate', 'Object'])
+    df_final = pd.merge(df_tuples, result_df_functions, on=["Subject", "Predicate", "Object"], how="left")
+    return df_final[df_final["Status"].apply(lambda x: x is not None)]
+
+@timed('root_cause_analysis')
 def get_root_cause_analysis(df_clean, selected_failure):
     """
     Analyzes the clean DataFrame to identify root causes and their triggers.
@@ -281,13 +517,15 @@ def get_root_cause_analysis(df_clean, selected_failure):
     root_cause_table_data = []
     all_tuples = [tuple(x) for x in df_clean.values]
     df_clean_tuples = pd.DataFrame(all_tuples, columns=df_clean.columns)
+    # Only checks that fired count; UNKNOWN ones are reported separately.
+    df_clean_tuples['Status'] = df_clean_tuples['Status'].apply(lambda status: not is_unknown(status) and bool(status))
 
     query_rootcause = f"""
     SELECT Object
     FROM df_clean_tuples
     WHERE Subject = '{selected_failure}' AND Predicate = 'hasRootCause'
     """
-    rootcause_df = duckdb.query(query_rootcause).to_df()
+    rootcause_df = duckdb_cursor().query(query_rootcause).to_df()
 
     if not rootcause_df.empty:
         for root_cause in rootcause_df["Object"]:
@@ -296,7 +534,7 @@ def get_root_cause_analysis(df_clean, selected_failure):
             FROM df_clean_tuples
             WHERE Subject = '{root_cause}' AND Predicate = 'isTriggeredBy'
             """
-            trigger_df = duckdb.query(query_trigger).to_df()
+            trigger_df = duckdb_cursor().query(query_trigger).to_df()
 
             if not trigger_df.empty:
                 for trigger_value in trigger_df["Object"]:
@@ -305,7 +543,7 @@ def get_root_cause_analysis(df_clean, selected_failure):
                     FROM df_clean_tuples
                     WHERE Subject='{trigger_value}' AND Predicate='consume' AND Status=True
                     """
-                    datachannel_df = duckdb.query(query_datachannel).to_df()
+                    datachannel_df = duckdb_cursor().query(query_datachannel).to_df()
 
                     if not datachannel_df.empty:
                         for _, row in datachannel_df.iterrows():
@@ -314,42 +552,143 @@ def get_root_cause_analysis(df_clean, selected_failure):
 
     return root_cause_table_data
 
-def execute_troubleshooting_logic(g, td_engine, partition_id, selected_failure):
+def execute_troubleshooting_logic(g, td_engine, partition_id, selected_failure, mapping=None, deadline=None,
+                                  store_results=False, incremental=False):
     """
     Main function to execute the core troubleshooting logic.
+    `mapping` overrides CHECK_FUNCTIONS, e.g. for synthetic ontologies.
+    The checks run within `deadline` seconds (FNFM_REQUEST_DEADLINE_SECONDS
+    by default); checks that fail, time out or miss the deadline have the
+    Status UNKNOWN, so partial results are returned rather than none.
+    With `store_results`, evaluated checks are kept in the check-result
+    store for other workers (see coalesce.py). With `incremental`, only the
+    checks whose source tables advanced since their results were stored
+    are evaluated again, and the report of that re-diagnosis, including the
+    checks whose status changed, is kept in `df_clean.attrs['rediagnosis']`
+    (see incremental.py).
     """
-    try:
-        with td_engine.connect() as conn:
+    g = ontology_snapshot(g)
+    with request_deadline(deadline):
+        with stage('sparql_traversal'):
             dic_tuple_result = graph_search_tuple(g, selected_failure, max_depth=-1)
-            mapping_function = {
-                "FNFM Uplink telemetry check": status_check,
-                "FNFM LIN device check": status_check,
-                "FNFM CAN device check": status_check,
-                "FNFM Motor Error Status": mterrstafm_check,
-                "FNFM Solenoid PHM HALL Voltage": limit_check,
-                "FNFM Solenoid PHM Digital Voltage": limit_check,
-                "FNFM Solenoid PHM LIN Voltage ADC": limit_check,
-                "FNFM Master Controller Reference Voltage": limit_check,
-                "FNFM Master Controller Digital Voltage": limit_check,
-                "FNFM Master Controller Input Voltage": limit_check,
-                "FNFM Master Controller Core Voltage": limit_check,
-                "FNFM Master Controller EIP Core Voltage": limit_check,
-                "FNFM Master Controller EIP Digital Voltage": limit_check,
-                "FNFM LVPS Digital Voltage": limit_check,
-                "FNFM LVPS Positive Analog Voltage": limit_check,
-                "FNFM LVPS Negative Analog Voltage": limit_check,
-                "FNFM Small pump calibration check": small_pump,
-                "FNFM Large pump calibration check": large_pump
-            }
-
-            result_df_functions = recursive_execute_function(dic_tuple_result, mapping_function, conn, partition_id)
-
-            all_tuples = [t for tuples in dic_tuple_result.values() for t in tuples]
-            df_tuples = pd.DataFrame(all_tuples, columns=['Subject', 'Predicate', 'Object'])
-            df_final = pd.merge(df_tuples, result_df_functions, on=["Subject", "Predicate", "Object"], how="left")
-            df_clean = df_final[df_final["Status"].apply(lambda x: x is not None)]
-            return df_clean, dic_tuple_result
-
-    except Exception as e:
-        print(f"Error in core troubleshooting logic: {e}")
-        return pd.DataFrame(), {}
\ No newline at end of file
+        mapping_function = CHECK_FUNCTIONS if mapping is None else mapping
+
+        report = None
+        with checks_connection(td_engine) as conn:
+            if incremental:
+                from .incremental import rediagnose
+
+                result_df = check_invocations(dic_tuple_result)
+                invocations = [(row.iloc[0], row.iloc[2]) for _, row in result_df.iterrows()]
+                results, report = rediagnose(invocations, mapping_function, conn, partition_id)
+                result_df_functions = check_status_frame(result_df, mapping_function, results)
+            else:
+                result_df_functions = recursive_execute_function(dic_tuple_result, mapping_function, conn,
+                                                                 partition_id, store_results)
+
+        with stage('pandas_merge'):
+            df_clean = merge_check_results(dic_tuple_result, result_df_functions)
+        if report is not None:
+            df_clean.attrs['rediagnosis'] = report
+        return df_clean, dic_tuple_result
+
+def unknown_checks(df_clean):
+    """The (trigger, data channel) pairs of a diagnosis whose check could not be evaluated."""
+    unknown = df_clean[df_clean["Status"].apply(is_unknown)]
+    return sorted(set(zip(unknown["Subject"], unknown["Object"])))
+
+# (trigger, data channel) pairs of the whole ontology, per ontology version.
+_ontology_invocations = {}
+
+def ontology_check_invocations(g):
+    """
+    Returns the (trigger, data channel) pairs of every failure subgraph of
+    the ontology, i.e. every check a diagnosis of the ontology can request.
+    """
+    g = ontology_snapshot(g)
+    version = ontology_version(g)
+    invocations = _ontology_invocations.get(version)
+    count_cache('ontology_invocations', invocations is not None)
+    if invocations is None:
+        pairs = {}
+        for failure in get_all_failure_labels(g):
+            invocation_df = check_invocations(graph_search_tuple(g, failure, max_depth=-1))
+            for trigger, _consume, datachannel in invocation_df.itertuples(index=False):
+                pairs[trigger, datachannel] = None
+        invocations = list(pairs)
+        _ontology_invocations.clear()
+        _ontology_invocations[version] = invocations
+    return invocations
+
+@timed('partition_diagnosis')
+def diagnose_partition(g, td_engine, partition_id, failures=None, mapping=None, deadline=None, incremental=False):
+    """
+    Diagnoses every failure of the ontology (or the given `failures`) for
+    one partition. The (check, data channel) invocations of all failure
+    subgraphs are collected first and each distinct one is evaluated once;
+    the results are then fanned back out to every subgraph.
+
+    Returns (summary, df_by_failure): the summary ranks the failures with
+    red data channels, most red channels first; df_by_failure maps every
+    failure to its evaluated triples, as returned by
+    `execute_troubleshooting_logic`. Checks run under the same deadline,
+    timeouts and circuit breaker, and the summary counts the UNKNOWN ones.
+    With `incremental`, stored results (e.g. pre-warmed ones) whose source
+    tables haven't advanced are reused, and the summary holds the report
+    of that re-diagnosis under 'rediagnosis' (see incremental.py).
+    """
+    with request_deadline(deadline):
+        return _diagnose_partition(g, td_engine, partition_id, failures, mapping, incremental)
+
+def _diagnose_partition(g, td_engine, partition_id, failures, mapping, incremental=False):
+    g = ontology_snapshot(g)
+    mapping_function = CHECK_FUNCTIONS if mapping is None else mapping
+    if failures is None:
+        failures = get_all_failure_labels(g)
+
+    with stage('sparql_traversal'):
+        subgraphs = {failure: graph_search_tuple(g, failure, max_depth=-1) for failure in failures}
+    invocation_dfs = {failure: check_invocations(subgraph) for failure, subgraph in subgraphs.items()}
+
+    requested = [
+        (trigger, datachannel)
+        for invocation_df in invocation_dfs.values()
+        for trigger, _consume, datachannel in invocation_df.itertuples(index=False)
+        if trigger in mapping_function
+    ]
+    report = None
+    with checks_connection(td_engine) as conn:
+        if incremental:
+            from .incremental import rediagnose
+
+            results, report = rediagnose(requested, mapping_function, conn, partition_id)
+        else:
+            results = evaluate_checks(requested, mapping_function, conn, partition_id)
+
+    ranked, df_by_failure = [], {}
+    with stage('pandas_merge'):
+        for failure, subgraph in subgraphs.items():
+            status_df = check_status_frame(invocation_dfs[failure], mapping_function, results)
+            df_clean = merge_check_results(subgraph, status_df)
+            df_by_failure[failure] = df_clean
+            alerts = get_root_cause_analysis(df_clean, failure) if not df_clean.empty else []
+            if alerts:
+                ranked.append({
+                    'failure': failure,
+                    'red_channels': sorted({channel.removesuffix(' 🔴') for _, _, channel in alerts}),
+                    'root_causes': sorted({root_cause for root_cause, _, _ in alerts}),
+                    'alerts': len(alerts),
+                })
+    ranked.sort(key=lambda entry: (-len(entry['red_channels']), -entry['alerts'], entry['failure']))
+
+    summary = {
+        'partition_id': partition_id,
+        'failures_evaluated': len(subgraphs),
+        'checks_requested': len(requested),
+        'checks_run': len(results),
+        'checks_unknown': sum(1 for result in results.values() if is_unknown(result)),
+        'failures': ranked,
+    }
+    if report is not None:
+        summary['rediagnosis'] = report
+    return summary, df_by_failure
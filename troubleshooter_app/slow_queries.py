@@ -0,0 +1,253 @@
+"""
+Slow-query log of the Teradata statements.
+
+`install(engine)` hooks the engine's cursor events, so every statement run
+through it is timed: the checks' `pd.read_sql` calls as well as the metadata,
+fleet and timeline queries. Statements slower than FNFM_SLOW_QUERY_SECONDS
+are appended as JSON lines to FNFM_SLOW_QUERY_LOG, which is rotated at
+FNFM_SLOW_QUERY_LOG_BYTES with FNFM_SLOW_QUERY_LOG_BACKUPS old files kept.
+Each record holds the SQL, its bind values, duration, row count (as reported
+by the driver) and the check, data channel and partition being evaluated
+(see `query_context`), plus a fingerprint of the SQL with its literals
+removed so repeated checks group together. Statements that raise are
+logged with the error, and with `cancelled` set when the check timeout
+cancelled them (see resilience.call_with_timeout).
+
+The `slow_queries` management command summarises the worst offenders and
+captures the EXPLAIN plan of a logged statement on demand (`explain`).
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .instrumentation import metrics
+
+LOGGER_NAME = 'fnfm.slow_queries'
+CONTEXT_FIELDS = ('check', 'data_channel', 'partition_id')
+
+_context = contextvars.ContextVar('fnfm_query_context', default={})
+_handler_lock = threading.Lock()
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def log_path():
+    return _setting('FNFM_SLOW_QUERY_LOG', os.path.join(settings.BASE_DIR, 'logs', 'slow_queries.jsonl'))
+
+
+def plans_dir():
+    """Where `explain` keeps the captured plans, next to the log."""
+    return os.path.join(os.path.dirname(log_path()), 'plans')
+
+
+@contextmanager
+def query_context(**fields):
+    """Attributes the statements run inside the block to a check, data channel or partition."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def fingerprint(statement):
+    """Identifies a statement regardless of its literals and whitespace."""
+    normalized = _NUMBER_RE.sub('?', _STRING_RE.sub('?', statement))
+    normalized = _SPACE_RE.sub(' ', normalized).strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+
+def _logger():
+    """The slow-query logger, with its rotating file handler for the current log path."""
+    logger = logging.getLogger(LOGGER_NAME)
+    path = log_path()
+    if getattr(logger, 'fnfm_path', None) != path:
+        with _handler_lock:
+            if getattr(logger, 'fnfm_path', None) != path:
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    path, maxBytes=_setting('FNFM_SLOW_QUERY_LOG_BYTES', 10 * 1024 * 1024),
+                    backupCount=_setting('FNFM_SLOW_QUERY_LOG_BACKUPS', 5), encoding='utf-8', delay=True)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.fnfm_path = path
+    return logger
+
+
+def _plain(value):
+    # NumPy scalars (e.g. partition ids read with pandas) as JSON numbers.
+    return value.item() if hasattr(value, 'item') else value
+
+
+def record(statement, parameters, duration, rows, error=None, cancelled=False):
+    """Appends one slow statement to the log, with the current query context."""
+    context = _context.get()
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'fingerprint': fingerprint(statement),
+        'duration_seconds': round(duration, 6),
+        'rows': rows,
+        'sql': statement.strip(),
+        'parameters': parameters,
+        'error': error,
+        'cancelled': cancelled,
+        **{field: _plain(context.get(field)) for field in CONTEXT_FIELDS},
+    }
+    _logger().info(json.dumps(entry, default=str))
+    metrics.inc('fnfm_slow_queries_total', help_text='Teradata statements above the slow-query threshold.')
+
+
+# The start time and the cancel flag are kept on the statement's execution
+# context rather than on the connection, whose info is reset when the
+# connection is invalidated. The connection only points at its latest
+# statement, which may still be fetching when a check times out.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.fnfm_query_start = time.perf_counter()
+    conn.info['fnfm_running'] = context
+
+
+def _is_slow(duration):
+    threshold = _setting('FNFM_SLOW_QUERY_SECONDS', 2.0)
+    return bool(threshold) and duration >= threshold
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'fnfm_query_start', None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    if _is_slow(duration):
+        rows = getattr(cursor, 'rowcount', -1)
+        try:
+            record(statement, parameters, duration, rows if rows is not None and rows >= 0 else None)
+        except Exception as e:
+            print(f"Error writing the slow-query log: {e}")
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    start = getattr(context, 'fnfm_query_start', None)
+    if start is None:
+        # Failed before the statement was sent, e.g. not admitted (see admission.py).
+        return
+    duration = time.perf_counter() - start
+    cancelled = getattr(context, 'fnfm_cancelled', False)
+    if _is_slow(duration) or cancelled:
+        error = exception_context.original_exception
+        try:
+            # Errors raised while fetching carry the statement on the context only.
+            record(exception_context.statement or context.statement or '',
+                   exception_context.parameters or context.parameters, duration, None,
+                   error=f"{type(error).__name__}: {error}", cancelled=cancelled)
+        except Exception as e:
+            print(f"Error writing the slow-query log: {e}")
+
+
+def mark_cancelled(conn):
+    """Flags the statement running on `conn` as cancelled by the check timeout."""
+    context = conn.info.get('fnfm_running')
+    if context is not None:
+        context.fnfm_cancelled = True
+
+
+def install(engine):
+    """Times every statement of `engine` (idempotent). Returns the engine."""
+    from sqlalchemy import event
+
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    return engine
+
+
+def read_log(path=None):
+    """Yields the logged records, oldest first, across the rotated files."""
+    path = path or log_path()
+    backups = _setting('FNFM_SLOW_QUERY_LOG_BACKUPS', 5)
+    for name in [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def summarize(records):
+    """
+    Groups records by fingerprint. Returns dicts of fingerprint, count,
+    total/max/mean duration, max rows, failed statements (errors), the
+    checks and partitions involved and the slowest record, worst (highest
+    total duration) first.
+    """
+    groups = {}
+    for entry in records:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+            'max_rows': None, 'errors': 0, 'checks': set(), 'partitions': set(), 'slowest': entry,
+        })
+        duration = entry['duration_seconds']
+        group['count'] += 1
+        if entry.get('error'):
+            group['errors'] += 1
+        group['total_seconds'] += duration
+        if duration >= group['max_seconds']:
+            group['max_seconds'], group['slowest'] = duration, entry
+        if entry.get('rows') is not None:
+            group['max_rows'] = max(group['max_rows'] or 0, entry['rows'])
+        if entry.get('check'):
+            group['checks'].add(entry['check'])
+        if entry.get('partition_id') is not None:
+            group['partitions'].add(entry['partition_id'])
+
+    summary = []
+    for group in groups.values():
+        group['mean_seconds'] = group['total_seconds'] / group['count']
+        group['checks'] = sorted(group['checks'])
+        group['partitions'] = sorted(group['partitions'], key=str)
+        summary.append(group)
+    summary.sort(key=lambda group: (-group['total_seconds'], group['fingerprint']))
+    return summary
+
+
+def explain(engine, entry):
+    """
+    Runs EXPLAIN for a logged statement with its logged bind values and
+    returns the plan text. The plan is also kept in `plans_dir()`.
+    """
+    parameters = entry.get('parameters')
+    if isinstance(parameters, list):
+        parameters = tuple(parameters)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN {entry['sql']}", parameters or ()).fetchall()
+    plan = '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+    directory = plans_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{entry['fingerprint']}.txt"), 'w', encoding='utf-8') as f:
+        f.write(f"-- {entry['time']} {entry['duration_seconds']:.3f}s\n{entry['sql']}\n\n{plan}\n")
+    return plan
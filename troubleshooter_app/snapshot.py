@@ -0,0 +1,127 @@
+"""
+Immutable, read-only ontology snapshots and per-thread DuckDB cursors.
+
+rdflib's SPARQL evaluation and DuckDB's default connection are not safe for
+concurrent use, so the diagnosis core never touches either from several
+threads. It reads the ontology through a snapshot, which is either the
+memory-mapped OntologyIndex the app serves, or an OntologySnapshot frozen
+from an rdflib graph. Both only answer lookups, so threaded (`gthread`)
+and ASGI workers can run many diagnoses in parallel in one process. DuckDB
+queries go through `duckdb_cursor()`, a cursor per thread on one in-memory
+database.
+"""
+import os
+import threading
+from types import MappingProxyType
+
+from .ontology_index import ONTOLOGY_NAMESPACE, OntologyIndex, _concept_triples
+from .resources import lazy_import
+
+duckdb = lazy_import('duckdb')
+
+
+class OntologySnapshot:
+    """
+    The label types and per-concept triples of an rdflib graph, with the
+    read API of OntologyIndex. Instances cannot be modified.
+    """
+    __slots__ = ('version', '_labels_by_type', '_triples', '_size')
+
+    def __init__(self, version, labels_by_type, triples):
+        triples = MappingProxyType({concept: tuple(rows) for concept, rows in triples.items()})
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, '_labels_by_type', MappingProxyType({t: tuple(v) for t, v in labels_by_type.items()}))
+        object.__setattr__(self, '_triples', triples)
+        object.__setattr__(self, '_size', sum(len(rows) for rows in triples.values()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __len__(self):
+        return self._size
+
+    def labels_of_type(self, type_name):
+        """Labels of the nodes typed with `type_name` (an IRI or an ontology class name)."""
+        if "#" not in type_name:
+            type_name = ONTOLOGY_NAMESPACE + type_name
+        return list(self._labels_by_type.get(type_name, ()))
+
+    def concept_triples(self, concept):
+        """The (subject label, predicate name, object label) triples of a concept label."""
+        return list(self._triples.get(concept, ()))
+
+
+def build_snapshot(graph, version):
+    """Freezes an rdflib graph; labels and triples are sorted like in the index."""
+    concepts, node_labels, node_types = _concept_triples(graph)
+    labels_by_type = {}
+    for node, types in node_types.items():
+        for type_name in types:
+            labels_by_type.setdefault(type_name, set()).update(node_labels.get(node, ()))
+    return OntologySnapshot(
+        version,
+        {t: sorted(labels, key=lambda label: label.encode('utf-8')) for t, labels in labels_by_type.items()},
+        {concept: sorted(rows) for concept, rows in concepts.items()},
+    )
+
+
+# Snapshot of the current rdflib graph version.
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def is_snapshot(g):
+    return isinstance(g, (OntologyIndex, OntologySnapshot))
+
+
+def graph_version(graph):
+    """Identifies the content of an rdflib graph by its identity and size."""
+    return f"graph-{id(graph)}-{len(graph)}"
+
+
+def ontology_snapshot(g):
+    """
+    Returns a read-only snapshot of the ontology `g`: `g` itself when it
+    already is one, otherwise the snapshot of the rdflib graph, frozen once
+    per graph version.
+    """
+    if is_snapshot(g):
+        return g
+    version = graph_version(g)
+    snapshot = _snapshots.get(version)
+    if snapshot is None:
+        # Frozen under the lock: the graph is only read by one thread at a time.
+        with _snapshots_lock:
+            snapshot = _snapshots.get(version)
+            if snapshot is None:
+                snapshot = build_snapshot(g, version)
+                _snapshots.clear()
+                _snapshots[version] = snapshot
+    return snapshot
+
+
+_duckdb = threading.local()
+_duckdb_connection = None
+_duckdb_lock = threading.Lock()
+
+
+def duckdb_cursor():
+    """
+    Returns the calling thread's cursor on the process-wide in-memory DuckDB
+    database. A forked worker opens its own database.
+    """
+    global _duckdb_connection
+
+    pid = os.getpid()
+    cursor = getattr(_duckdb, 'cursor', None)
+    if cursor is not None and _duckdb.pid == pid:
+        return cursor
+    with _duckdb_lock:
+        if _duckdb_connection is None or _duckdb_connection[0] != pid:
+            _duckdb_connection = (pid, duckdb.connect(':memory:'))
+        cursor = _duckdb_connection[1].cursor()
+    _duckdb.cursor, _duckdb.pid = cursor, pid
+    return cursor
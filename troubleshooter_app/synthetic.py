@@ -0,0 +1,257 @@
+"""
+Synthetic data for benchmarks and load tests.
+
+`generate_ontology_rows` produces spreadsheet rows shaped like
+`flow_manager_ontology_poc_prep.xlsx` at any scale and `build_graph` turns
+them into the same triples as `ontology_to_kg.create_rdf_graph`.
+`create_standin_engine` returns an SQLAlchemy engine over in-memory SQLite
+databases that mirror the Teradata tables queried by `services.py`, so the
+unmodified check functions can run locally with an optional injected latency.
+"""
+import itertools
+import random
+import re
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+from rdflib import Graph, Literal, RDF, RDFS, URIRef
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+from .ontology_index import OntologyIndex
+from .services import large_pump, limit_check, mterrstafm_check, small_pump, status_check
+
+ONTOLOGY_COLUMNS = [
+    'ongoing failure mode screener',
+    'next failure mode screener',
+    'ongoing root cause verification',
+    'next root cause verification',
+    'evidence check',
+    'data channel',
+]
+
+DATA_GRAPH_NAMESPACE = "http://www.slb.com/data-graphs/Troubleshooting_ORA_FNFM_Data_graph#"
+ONTOLOGY_NAMESPACE = "http://www.slb.com/ontologies/Troubleshooting_ORA_FNFM_Ontology_#"
+
+# Check functions the synthetic triggers are dispatched to, in rotation.
+SYNTHETIC_CHECKS = [limit_check, limit_check, limit_check, status_check, mterrstafm_check, small_pump, large_pump]
+
+
+# --- Synthetic Ontology ---
+
+def generate_ontology_rows(n_rows, rows_per_failure=40, root_causes_per_failure=9, seed=0):
+    """
+    Returns a DataFrame with the six prep-spreadsheet columns. Rows are grouped
+    by failure like the real sheet: every failure has `root_causes_per_failure`
+    root causes chained through "next", and every row has its own trigger and
+    data channel.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        failure = i // rows_per_failure
+        root_cause = rng.randrange(root_causes_per_failure)
+        rows.append((
+            f"synthetic failure {failure}",
+            f"synthetic consequence {failure}",
+            f"synthetic root cause {failure}-{root_cause}",
+            f"synthetic root cause {failure}-{(root_cause + 1) % root_causes_per_failure}",
+            f"synthetic trigger {i}",
+            f"SYN{i:06d}FM",
+        ))
+    return pd.DataFrame(rows, columns=ONTOLOGY_COLUMNS)
+
+
+def build_graph(df):
+    """Builds the knowledge graph exactly as `create_rdf_graph` does."""
+    graph = Graph()
+    failure = URIRef(ONTOLOGY_NAMESPACE + "Failure")
+    root_cause = URIRef(ONTOLOGY_NAMESPACE + "RootCause")
+    trigger = URIRef(ONTOLOGY_NAMESPACE + "Trigger")
+    data_channel = URIRef(ONTOLOGY_NAMESPACE + "DataChannel")
+    types = [failure, failure, root_cause, root_cause, trigger, data_channel]
+    links = [
+        (0, "cause", 1),
+        (0, "hasRootCause", 2),
+        (2, "next", 3),
+        (2, "isTriggeredBy", 4),
+        (4, "consume", 5),
+    ]
+    for values in df.itertuples(index=False):
+        labels = [str(value) for value in values]
+        uris = [URIRef(DATA_GRAPH_NAMESPACE + label.replace(" ", "_")) for label in labels]
+        for uri, label, type_uri in zip(uris, labels, types):
+            graph.add((uri, RDF.type, type_uri))
+            graph.add((uri, RDFS.label, Literal(label)))
+        for source, predicate, target in links:
+            graph.add((uris[source], URIRef(ONTOLOGY_NAMESPACE + predicate), uris[target]))
+    return graph
+
+
+def ontology_channels(graph):
+    """Returns the labels of every data channel consumed by a trigger."""
+    if isinstance(graph, OntologyIndex):
+        return sorted(graph.labels_of_type("DataChannel"))
+    consume = URIRef(ONTOLOGY_NAMESPACE + "consume")
+    return sorted({str(graph.value(channel, RDFS.label)) for channel in graph.objects(None, consume)})
+
+
+def synthetic_check_mapping(df):
+    """Maps every synthetic trigger label to a real check function."""
+    checks = itertools.cycle(SYNTHETIC_CHECKS)
+    return {trigger: next(checks) for trigger in df['evidence check'].unique()}
+
+
+# --- Teradata Stand-in ---
+
+STANDIN_SCHEMAS = ['PRD_RP_PRODUCT_VIEW', 'PRD_GLBL_DATA_PRODUCTS']
+
+STANDIN_TABLES = {
+    'PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA':
+        'partition_id INTEGER, serial_number TEXT, job_number TEXT, job_start TEXT',
+    'PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB':
+        'partition_id INTEGER, xcol TEXT, metric_name TEXT, error_count INTEGER',
+    'PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB':
+        'partition_id INTEGER, xcol TEXT, xcol_decoded TEXT, count_error INTEGER',
+    'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg':
+        'partition_id INTEGER, xcol TEXT, error_count INTEGER, "min" REAL, "max" REAL',
+    'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_status_checks':
+        'partition_id INTEGER, event_name TEXT',
+    'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_large_pump_cal_check':
+        'partition_id INTEGER, health_indicator TEXT',
+    'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_small_pump_cal_check':
+        'partition_id INTEGER, health_indicator TEXT',
+}
+
+STATUS_WORDS = [
+    'FNFM_TripPhaseAFM', 'FNFM_TripPhaseBFM', 'FNFM_FaultIaFM', 'FNFM_EIPUplinkMessageSend',
+    'FNFM_EIPITCMessageSend', 'FNFM_EIPDownlinkMessageReceive',
+]
+
+_SEL = re.compile(r'^(\s*)sel\b', re.IGNORECASE)
+_TOP = re.compile(r'^(\s*select\s+)top\s+(\d+)\s+', re.IGNORECASE)
+
+
+def translate_teradata_sql(statement):
+    """Rewrites the Teradata-only syntax used by the services into SQLite."""
+    statement = _SEL.sub(r'\1select', statement)
+    top = _TOP.match(statement)
+    if top:
+        statement = f"{top.group(1)}{statement[top.end():].rstrip().rstrip(';')} LIMIT {top.group(2)}"
+    return statement
+
+
+def generate_metadata(n_partitions, jobs_per_serial=20, first_partition_id=10000, seed=0):
+    """Returns FNFM_FLEET_METADATA rows for `n_partitions` jobs."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_partitions):
+        serial = i // jobs_per_serial
+        day = rng.randrange(365)
+        rows.append({
+            'partition_id': first_partition_id + i,
+            'serial_number': f"SN{serial:06d}",
+            'job_number': f"JOB{i:07d}",
+            'job_start': (pd.Timestamp('2025-01-01') + pd.Timedelta(days=day, seconds=rng.randrange(86400)))
+                         .strftime('%Y-%m-%d %H:%M:%S.%f'),
+        })
+    return pd.DataFrame(rows)
+
+
+def _check_rows(partition_ids, channels, fire_rate, rng):
+    """Generates fact rows for every (partition, channel) pair."""
+    limit_per_job, status_words, limit_agg, status_events, large, small = [], [], [], [], [], []
+    for partition_id in partition_ids:
+        for channel in channels:
+            fired = rng.random() < fire_rate
+            for metric in ('above_sigma_one', 'below_sigma_one'):
+                limit_per_job.append((partition_id, channel, metric, rng.randrange(20000) if fired else 0))
+            for word in STATUS_WORDS:
+                status_words.append((partition_id, channel, word, rng.randrange(50) if fired else 0))
+            limit_agg.append((partition_id, channel, rng.randrange(10) if fired else 0,
+                              rng.uniform(-5, 0), rng.uniform(0, 5)))
+            if fired:
+                status_events.append((partition_id, channel))
+        large.append((partition_id, 'Fail' if rng.random() < fire_rate else 'Pass'))
+        small.append((partition_id, 'Fail' if rng.random() < fire_rate else 'Pass'))
+    return {
+        'PRD_RP_PRODUCT_VIEW.FNFM_LIMIT_CHECK_PER_JOB': limit_per_job,
+        'PRD_RP_PRODUCT_VIEW.FNFM_STATUS_WORDS_AGGREGATED_PER_JOB': status_words,
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg': limit_agg,
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_status_checks': status_events,
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_large_pump_cal_check': large,
+        'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_small_pump_cal_check': small,
+    }
+
+
+def create_standin_engine(metadata, channels, check_partitions=None, latency=0.0, jitter=0.0,
+                          fire_rate=0.2, pool_size=10, seed=0):
+    """
+    Creates an in-memory SQLite engine mimicking the Teradata schemas.
+
+    `metadata` fills FNFM_FLEET_METADATA. Check tables get one row per
+    (partition, channel) for `check_partitions` (all partitions by default).
+    Every statement sleeps `latency` seconds plus up to `jitter` seconds to
+    emulate warehouse round trips.
+    """
+    name = f"standin_{uuid.uuid4().hex}"
+
+    def connect():
+        conn = sqlite3.connect(f"file:{name}_main?mode=memory&cache=shared", uri=True, check_same_thread=False)
+        for schema in STANDIN_SCHEMAS:
+            conn.execute(f"ATTACH DATABASE 'file:{name}_{schema}?mode=memory&cache=shared' AS {schema}")
+        return conn
+
+    engine = create_engine('sqlite://', creator=connect, poolclass=QueuePool,
+                           pool_size=pool_size, max_overflow=pool_size * 2)
+    # Shared-cache memory databases live as long as one connection is open.
+    engine.standin_keepalive = connect()
+    engine.standin_latency = latency
+
+    jitter_rng = random.Random(seed)
+
+    @event.listens_for(engine, 'before_cursor_execute', retval=True)
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        delay = engine.standin_latency + (jitter_rng.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        return translate_teradata_sql(statement), parameters
+
+    keepalive = engine.standin_keepalive
+    for table, columns in STANDIN_TABLES.items():
+        keepalive.execute(f"CREATE TABLE {table} ({columns})")
+
+    rows = metadata[['partition_id', 'serial_number', 'job_number', 'job_start']].itertuples(index=False)
+    keepalive.executemany("INSERT INTO PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA VALUES (?, ?, ?, ?)",
+                          [tuple(row) for row in rows])
+
+    if check_partitions is None:
+        check_partitions = metadata['partition_id'].tolist()
+    facts = _check_rows([int(p) for p in check_partitions], list(channels), fire_rate, random.Random(seed))
+    for table, values in facts.items():
+        if values:
+            placeholders = ', '.join('?' * len(values[0]))
+            keepalive.executemany(f"INSERT INTO {table} VALUES ({placeholders})", values)
+    keepalive.commit()
+    return engine
+
+
+@contextmanager
+def use_engine(engine):
+    """
+    Serves `engine` as the app's shared Teradata engine (views and API views)
+    and from `get_teradata_engine` for the duration of the block.
+    """
+    from . import services
+    from .resources import registry
+
+    original = services.get_teradata_engine
+    services.get_teradata_engine = lambda: engine
+    try:
+        with registry.override('teradata_engine', engine):
+            yield engine
+    finally:
+        services.get_teradata_engine = original
@@ -0,0 +1,46 @@
+"""
+Result tables kept as plain JSON rows and served a page at a time.
+
+The diagnosis stores each table as {'columns': [...], 'rows': [[...], ...]}
+in the session instead of pre-rendered HTML; the results page fetches the
+visible window of rows, sorted and filtered on the server.
+"""
+import json
+
+# Sort buckets: numbers (and booleans) before text; missing values always last.
+_NUMBER, _TEXT = 0, 1
+
+
+def table_payload(df):
+    """Converts a DataFrame to a JSON-serialisable table (numpy values included)."""
+    return {'columns': [str(column) for column in df.columns], 'rows': json.loads(df.to_json(orient='values'))}
+
+
+def _sort_key(value):
+    if isinstance(value, (bool, int, float)):
+        return (_NUMBER, value, '')
+    return (_TEXT, 0, str(value).casefold())
+
+
+def page_table(table, offset=0, limit=100, sort=None, descending=False, query=''):
+    """
+    Returns {'columns', 'rows', 'offset', 'total', 'filtered'}: the rows
+    containing `query` (case-insensitive, any column), ordered by the column
+    `sort`, from `offset` on.
+    """
+    columns, rows = table['columns'], table['rows']
+    if query:
+        needle = query.casefold()
+        rows = [row for row in rows if any(needle in str(value).casefold() for value in row if value is not None)]
+    if sort in columns:
+        i = columns.index(sort)
+        present = [row for row in rows if row[i] is not None]
+        missing = [row for row in rows if row[i] is None]
+        rows = sorted(present, key=lambda row: _sort_key(row[i]), reverse=descending) + missing
+    return {
+        'columns': columns,
+        'rows': rows[offset:offset + limit],
+        'offset': offset,
+        'total': len(table['rows']),
+        'filtered': len(rows),
+    }
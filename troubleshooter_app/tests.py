@@ -767,11 +767,1929 @@ class TroubleshooterResultsViewTests(TestCase):
         self.assertRedirects(response, reverse('troubleshooter_app:troubleshooter'))
 
 
+# ------------------------------
+# Latency instrumentation tests
+# ------------------------------
+
+from troubleshooter_app import instrumentation
+from troubleshooter_app.services import limit_check
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.metrics.reset()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = instrumentation.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        cumulative, total, count = histogram.snapshot()
+        self.assertEqual(cumulative, [1, 3, 4])
+        self.assertEqual(count, 4)
+        self.assertAlmostEqual(total, 6.05)
+
+    @patch('troubleshooter_app.services.pd.read_sql')
+    def test_check_functions_are_timed(self, mock_read_sql):
+        mock_read_sql.return_value = pd.DataFrame({'sum': [3], 'min': [0], 'max': [1]})
+        self.assertTrue(limit_check(Mock(), 11377, 'MCDIGVLTFM'))
+        histogram = instrumentation.metrics.histogram('fnfm_stage_duration_seconds', stage='check.limit_check')
+        self.assertEqual(histogram.snapshot()[2], 1)
+
+    def test_server_timing_header_and_metrics_endpoint(self):
+        with instrumentation.stage('sparql_traversal'):
+            pass
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertContains(response, 'fnfm_stage_duration_seconds_bucket{stage="sparql_traversal",le="+Inf"} 1')
+
+    def test_server_timing_aggregates_repeated_stages(self):
+        header = instrumentation.server_timing_header({'check.limit_check': [0.012, 3]})
+        self.assertEqual(header, 'check.limit_check;dur=12.0;desc="3 calls"')
+
+
+# ------------------------------
+# On-demand profiling tests
+# ------------------------------
+
+import io
+import tempfile
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from troubleshooter_app import profiling
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(profiling.shutil.rmtree, self.profile_dir, True)
+        self.factory = RequestFactory()
+
+    def _middleware(self):
+        return profiling.SampledProfilerMiddleware(lambda request: HttpResponse('ok'))
+
+    @override_settings(PROFILING_TOKEN='', PROFILING_SAMPLE_RATE=0)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            self._middleware()
+
+    def test_authorised_header_captures_profile(self):
+        with override_settings(PROFILING_TOKEN='secret', PROFILING_SAMPLE_RATE=0, PROFILING_DIR=self.profile_dir):
+            middleware = self._middleware()
+            skipped = middleware(self.factory.get('/troubleshooter/', HTTP_X_PROFILE_TOKEN='wrong'))
+            response = middleware(self.factory.get('/troubleshooter/', HTTP_X_PROFILE_TOKEN='secret'))
+
+        self.assertNotIn('X-Profile-Id', skipped)
+        profiles = profiling.list_profiles(self.profile_dir)
+        self.assertEqual(len(profiles), 1)
+        meta = profiling.load_meta(profiles[0])
+        self.assertEqual(meta['id'], response['X-Profile-Id'])
+        self.assertEqual(meta['path'], '/troubleshooter/')
+        self.assertEqual(meta['trigger'], 'header')
+
+    def test_profile_directory_is_bounded(self):
+        with override_settings(PROFILING_TOKEN='', PROFILING_SAMPLE_RATE=1.0,
+                               PROFILING_DIR=self.profile_dir, PROFILING_MAX_PROFILES=2):
+            middleware = self._middleware()
+            for _ in range(4):
+                middleware(self.factory.get('/metrics'))
+        self.assertEqual(len(profiling.list_profiles(self.profile_dir)), 2)
+
+    def test_profiles_command_aggregates_and_diffs(self):
+        with override_settings(PROFILING_TOKEN='', PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=self.profile_dir):
+            middleware = self._middleware()
+            middleware(self.factory.get('/metrics'))
+            middleware(self.factory.get('/metrics'))
+        before, after = profiling.list_profiles(self.profile_dir)
+
+        out = io.StringIO()
+        call_command('profiles', 'aggregate', '--dir', self.profile_dir, stdout=out)
+        self.assertIn('Aggregated 2 profile(s).', out.getvalue())
+        out = io.StringIO()
+        call_command('profiles', 'diff', before, after, stdout=out)
+        self.assertIn('Cumulative time per request (1 before, 1 after)', out.getvalue())
+
+
+# ------------------------------
+# Synthetic benchmark tests
+# ------------------------------
+
+from troubleshooter_app import benchmarks, synthetic
+from troubleshooter_app.services import get_metadata, get_partition_id, status_check
+
+
+class SyntheticBenchmarkTests(TestCase):
+    def test_generated_rows_follow_the_prep_spreadsheet_shape(self):
+        df = synthetic.generate_ontology_rows(100, rows_per_failure=40)
+        self.assertEqual(list(df.columns), synthetic.ONTOLOGY_COLUMNS)
+        self.assertEqual(df['ongoing failure mode screener'].nunique(), 3)
+        self.assertEqual(df['data channel'].nunique(), 100)
+
+        graph = synthetic.build_graph(df.head(1))
+        # Six typed and labelled entities plus five links, as in create_rdf_graph.
+        self.assertEqual(len(graph), 6 * 2 + 5)
+
+    def test_standin_engine_answers_the_check_functions(self):
+        metadata = synthetic.generate_metadata(5)
+        engine = synthetic.create_standin_engine(metadata, ['SYN000000FM'], fire_rate=1.0)
+        self.addCleanup(engine.dispose)
+        partition_id = int(metadata['partition_id'][0])
+
+        self.assertEqual(len(get_metadata(engine)), 5)
+        row = metadata.iloc[0]
+        self.assertEqual(get_partition_id(engine, row['serial_number'], row['job_number'], row['job_start']), partition_id)
+        with engine.connect() as conn:
+            self.assertTrue(status_check(conn, partition_id, 'SYN000000FM'))
+            self.assertFalse(status_check(conn, partition_id, 'UNKNOWNFM'))
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = [{'function': 'build_graph', 'size': 100, 'median_seconds': 1.0, 'peak_bytes': 100}]
+        current = [{'function': 'build_graph', 'size': 100, 'median_seconds': 1.1, 'peak_bytes': 200}]
+        regressions = benchmarks.compare(current, baseline, tolerance=0.25)
+        self.assertEqual([r['metric'] for r in regressions], ['peak_bytes'])
+
+    def test_benchmark_command_reports_each_size(self):
+        out = io.StringIO()
+        call_command('benchmark', '--sizes', '20,40', '--repeat', '1',
+                     '--functions', 'build_graph,get_form_choices', stdout=out)
+        lines = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual([(line[0], line[1]) for line in lines], [
+            ('build_graph', '20'), ('get_form_choices', '20'),
+            ('build_graph', '40'), ('get_form_choices', '40'),
+        ])
+
+
+# ------------------------------
+# Load test harness tests
+# ------------------------------
+
+from troubleshooter_app import loadtest
+
+
+class LoadTestHarnessTests(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 11))
+        self.assertEqual(loadtest.percentile(values, 0.5), 5)
+        self.assertEqual(loadtest.percentile(values, 0.99), 10)
+        self.assertIsNone(loadtest.percentile([], 0.5))
+
+    def test_parse_mix_rejects_unknown_traffic(self):
+        self.assertEqual(loadtest.parse_mix('get_choices=3,diagnose=1'), {'get_choices': 3.0, 'diagnose': 1.0})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('unknown=1')
+
+    def test_run_load_reports_per_endpoint_errors(self):
+        class FakeTransport:
+            def send(self, method, path, params):
+                return 500 if path.startswith('/troubleshooter/api/teradata/') else 200
+
+        traffic = loadtest.TrafficMix(synthetic.generate_metadata(10), ['failure'], ['MCDIGVLTFM'])
+        samples, elapsed = loadtest.run_load(FakeTransport(), traffic, rate=200, duration=0.2, concurrency=4)
+        report = loadtest.summarise(samples, elapsed)
+
+        self.assertEqual(report['all']['requests'], 40)
+        self.assertEqual(report['teradata_api']['error_rate'], 1.0)
+        self.assertEqual(report['get_choices']['errors'], 0)
+
+    def test_loadtest_command_runs_against_the_standin(self):
+        out = io.StringIO()
+        call_command('loadtest', '--rate', '40', '--duration', '0.5', '--partitions', '50', '--latency', '0',
+                     '--mix', 'get_choices=1,teradata_api=1', stdout=out)
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[1:]}
+        self.assertEqual(rows['all'][1], '20')
+        self.assertEqual(rows['all'][3], '0.0%')
+
+
+# ------------------------------
+# Knowledge-graph build tests
+# ------------------------------
+
+import os
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from troubleshooter_app import ontology_build
+
+
+class OntologyBuildTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.rows = synthetic.generate_ontology_rows(200, rows_per_failure=20)
+
+    def _parse(self, path, format='turtle'):
+        graph = Graph()
+        graph.parse(path, format=format)
+        return graph
+
+    def test_build_matches_row_by_row_graph(self):
+        for format, extension in (('turtle', 'ttl'), ('ntriples', 'nt')):
+            path = os.path.join(self.tmp.name, f'kg.{extension}')
+            summary = ontology_build.build(self.rows, path, format)
+            graph = self._parse(path, 'turtle' if format == 'turtle' else 'nt')
+            self.assertEqual(summary['triples'], len(graph))
+            self.assertTrue(isomorphic(graph, synthetic.build_graph(self.rows)))
+
+    def test_incremental_build_matches_full_rebuild(self):
+        path = os.path.join(self.tmp.name, 'kg.ttl')
+        ontology_build.build(self.rows, path, incremental=True)
+        self.assertTrue(ontology_build.build(self.rows, path, incremental=True)['up_to_date'])
+
+        changed = self.rows.drop(index=[3, 4])
+        changed.loc[1000] = ['new failure', 'new consequence', 'new root cause', 'synthetic root cause 0-1',
+                             'new trigger', 'NEWCHFM']
+        summary = ontology_build.build(changed, path, incremental=True)
+        self.assertEqual((summary['added_rows'], summary['removed_rows']), (1, 2))
+        self.assertTrue(summary['incremental'])
+
+        full_path = os.path.join(self.tmp.name, 'full.ttl')
+        ontology_build.build(changed, full_path)
+        with open(path) as incremental_file, open(full_path) as full_file:
+            self.assertEqual(incremental_file.read(), full_file.read())
+
+    def test_build_kg_command(self):
+        out = io.StringIO()
+        path = os.path.join(self.tmp.name, 'kg.ttl')
+        call_command('build_kg', '--output', path, '--cache-dir', os.path.join(self.tmp.name, 'cache'), stdout=out)
+        self.assertIn('for 40 rows', out.getvalue())
+        self.assertEqual(len(self._parse(path)), 283)
+
+    def _write_workbook(self, path, rows):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append([])
+        sheet.append([None, *synthetic.ONTOLOGY_COLUMNS])
+        for row in rows:
+            sheet.append([None, *row])
+        workbook.save(path)
+
+    def test_prep_frame_is_cached_by_checksum(self):
+        source = os.path.join(self.tmp.name, 'prep.xlsx')
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        self._write_workbook(source, self.rows.head(5).values.tolist())
+
+        first = ontology_build.load_prep_frame(source, cache_dir)
+        self.assertTrue(first.equals(ontology_build.read_prep_spreadsheet(source)))
+        with patch.object(ontology_build, 'stream_prep_spreadsheet') as stream:
+            self.assertTrue(ontology_build.load_prep_frame(source, cache_dir).equals(first))
+        stream.assert_not_called()
+
+        self._write_workbook(source, self.rows.head(7).values.tolist())
+        self.assertEqual(len(ontology_build.load_prep_frame(source, cache_dir)), 7)
+        self.assertEqual(len([name for name in os.listdir(cache_dir) if name.endswith('.parquet')]), 1)
+
+    def test_shapes_rerun_only_when_ontology_changes(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        ontology = os.path.join(self.tmp.name, 'my_ontology.ttl')
+        with open(os.path.join(ontology_build.DATA_DIR, 'my_ontology.ttl'), 'rb') as f:
+            content = f.read()
+        with open(ontology, 'wb') as f:
+            f.write(content)
+
+        with patch.object(ontology_build, 'extract_shapes', wraps=ontology_build.extract_shapes) as extract:
+            shapes = ontology_build.load_shapes(ontology, cache_dir)
+            self.assertEqual(ontology_build.load_shapes(ontology, cache_dir), shapes)
+            self.assertEqual(extract.call_count, 1)
+            with open(ontology, 'ab') as f:
+                f.write(b'\n# edited\n')
+            ontology_build.load_shapes(ontology, cache_dir)
+            self.assertEqual(extract.call_count, 2)
+
+
+# ------------------------------
+# Ontology index tests
+# ------------------------------
+
+from troubleshooter_app import ontology_index
+from troubleshooter_app.services import execute_query_for_concept, get_all_failure_labels, graph_search_tuple
+
+
+class OntologyIndexTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.rows = synthetic.generate_ontology_rows(60, rows_per_failure=20, root_causes_per_failure=4)
+        self.graph = synthetic.build_graph(self.rows)
+        self.path = os.path.join(self.tmp.name, 'kg.idx')
+        ontology_index.compile_index(self.graph, self.path)
+        self.index = ontology_index.OntologyIndex(self.path)
+
+    def test_concept_triples_match_the_sparql_query(self):
+        for concept in ['synthetic failure 1', 'synthetic root cause 2-3', 'synthetic trigger 5', 'SYN000005FM']:
+            self.assertEqual(self.index.concept_triples(concept),
+                             sorted(set(execute_query_for_concept(self.graph, concept))))
+        self.assertEqual(self.index.concept_triples('unknown concept'), [])
+
+    def test_labels_and_traversal(self):
+        self.assertEqual(sorted(get_all_failure_labels(self.index)), sorted(get_all_failure_labels(self.graph)))
+        # Depths depend on the order the query returns rows in, so only the reached triples are compared.
+        expected = graph_search_tuple(self.graph, 'synthetic failure 0')
+        actual = graph_search_tuple(self.index, 'synthetic failure 0')
+        self.assertEqual({t for ts in actual.values() for t in ts}, {t for ts in expected.values() for t in ts})
+
+    def test_load_index_recompiles_when_the_source_changes(self):
+        source = os.path.join(self.tmp.name, 'kg.ttl')
+        index_path = os.path.join(self.tmp.name, 'cache', 'kg.idx')
+        self.graph.serialize(source, format='turtle')
+        first = ontology_index.load_index(source, index_path)
+        with patch.object(ontology_index, 'compile_index') as compile_index:
+            self.assertEqual(ontology_index.load_index(source, index_path).version, first.version)
+        compile_index.assert_not_called()
+
+        synthetic.build_graph(self.rows.head(10)).serialize(source, format='turtle')
+        second = ontology_index.load_index(source, index_path)
+        self.assertNotEqual(second.version, first.version)
+        self.assertEqual(len(second.labels_of_type('Failure')), 2)
+
+
+# ------------------------------
+# Lazy resource tests
+# ------------------------------
+
+import json
+from troubleshooter_app import api_views, resources
+
+
+class LazyResourceTests(TestCase):
+    def test_registry_creates_once_and_retries_unavailable_resources(self):
+        registry = resources.ResourceRegistry()
+        created = []
+        registry.register('engine', lambda: created.append(1) or (object() if len(created) > 1 else None))
+
+        self.assertIsNone(registry.get('engine'))
+        engine = registry.get('engine')
+        self.assertIsNotNone(engine)
+        self.assertIs(registry.get('engine'), engine)
+        self.assertEqual(len(created), 2)
+
+        with registry.override('engine', 'standin'):
+            self.assertEqual(registry.get('engine'), 'standin')
+        self.assertIs(registry.peek('engine'), engine)
+
+    def test_module_attributes_resolve_through_the_registry(self):
+        engine = Mock()
+        with resources.registry.override('teradata_engine', engine):
+            self.assertIs(api_views.td_engine, engine)
+            self.assertIs(views.td_engine, engine)
+            with patch.object(api_views, 'td_engine', new='patched'):
+                self.assertEqual(api_views.lazy('td_engine'), 'patched')
+            self.assertIs(api_views.lazy('td_engine'), engine)
+
+    def test_importing_the_app_defers_heavy_libraries(self):
+        out = io.StringIO()
+        report_path = os.path.join(tempfile.mkdtemp(), 'startup.json')
+        call_command('startup_report', '--modules', 'troubleshooter_app.urls', '--output', report_path, stdout=out)
+        with open(report_path) as f:
+            imported = {entry['module'] for entry in json.load(f)['imports']}
+        self.assertIn('troubleshooter_app.views', imported)
+        for heavy in ('pyvis', 'rdflib', 'sqlalchemy', 'pandas', 'duckdb', 'numpy'):
+            self.assertNotIn(heavy, imported)
+
+
+# ------------------------------
+# Failure typeahead tests
+# ------------------------------
+
+from django.urls import reverse
+from troubleshooter_app import services
+from troubleshooter_app.label_index import LabelIndex
+
+
+class FailureTypeaheadTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rows = synthetic.generate_ontology_rows(500, rows_per_failure=10)
+        path = os.path.join(self.tmp.name, 'kg.idx')
+        ontology_index.compile_index(synthetic.build_graph(rows), path, source_checksum='synthetic-v1')
+        self.index = ontology_index.OntologyIndex(path)
+
+    def test_label_index_ranks_prefix_matches_first_and_pages(self):
+        index = LabelIndex(['Pump failure', 'Flow rate is null', 'flow meter drift', 'Low flow', 'Packer'])
+        self.assertEqual(index.search('flow')['results'], ['flow meter drift', 'Flow rate is null', 'Low flow'])
+        self.assertEqual(index.search('ow ra')['results'], ['Flow rate is null'])
+        self.assertEqual(index.search('zz')['total'], 0)
+
+        first = index.search('', limit=2)
+        self.assertEqual((first['total'], first['next_offset']), (5, 2))
+        self.assertIsNone(index.search('', offset=4, limit=2)['next_offset'])
+
+    def test_failure_labels_are_memoised_per_ontology_version(self):
+        with patch.object(services, 'get_all_failure_labels', wraps=services.get_all_failure_labels) as labels:
+            first = services.get_failure_label_index(self.index)
+            self.assertIs(services.get_failure_label_index(self.index), first)
+            self.assertEqual(labels.call_count, 1)
+        self.assertEqual(len(first), 100)
+
+    def test_typeahead_endpoint_pages_through_matches(self):
+        url = reverse('troubleshooter_app:failure_typeahead')
+        with resources.registry.override('ontology', self.index):
+            data = self.client.get(url, {'q': 'failure 4', 'limit': 5}).json()
+            self.assertEqual(data['results'][0], 'synthetic failure 4')
+            self.assertEqual(data['total'], 11)
+            self.assertEqual(data['next_offset'], 5)
+            rest = self.client.get(url, {'q': 'failure 4', 'offset': 5, 'limit': 10}).json()
+            self.assertEqual(len(rest['results']), 6)
+            self.assertIsNone(rest['next_offset'])
+            self.assertEqual(self.client.get(url, {'offset': 'x'}).status_code, 400)
+
+
+# ------------------------------
+# Metadata search tests
+# ------------------------------
+
+from sqlalchemy import event
+from troubleshooter_app.services import search_metadata_values
+
+
+class MetadataSearchTests(TestCase):
+    def setUp(self):
+        self.metadata = synthetic.generate_metadata(300, jobs_per_serial=20)
+        self.engine = synthetic.create_standin_engine(self.metadata, ['MCDIGVLTFM'], check_partitions=[])
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+
+    def test_pages_follow_the_cursor(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = search_metadata_values(self.engine, 'serial_number', cursor=cursor, limit=4)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(self.metadata['serial_number'].unique()))
+
+    def test_prefix_and_parent_filters_are_pushed_down(self):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, self.engine, 'before_cursor_execute', listener)
+
+        page, cursor = search_metadata_values(self.engine, 'serial_number', prefix='SN00001')
+        self.assertEqual(page, ['SN000010', 'SN000011', 'SN000012', 'SN000013', 'SN000014'])
+        self.assertIsNone(cursor)
+        # The stand-in rewrites TOP n into LIMIT n before the statement reaches SQLite.
+        self.assertRegex(statements[-1], r"LIKE \? ESCAPE[\s\S]*GROUP BY serial_number[\s\S]*LIMIT 21$")
+        self.assertEqual(search_metadata_values(self.engine, 'serial_number', prefix='SN_')[0], [])
+
+        jobs, _ = search_metadata_values(self.engine, 'job_number', parent_value='SN000002', limit=50)
+        self.assertEqual(len(jobs), 20)
+        starts, _ = search_metadata_values(self.engine, 'job_start', parent_value=jobs[0])
+        self.assertEqual(starts, self.metadata.loc[self.metadata['job_number'] == jobs[0], 'job_start'].tolist())
+
+    def test_search_endpoint(self):
+        url = reverse('troubleshooter_app:search_form_choices')
+        with synthetic.use_engine(self.engine):
+            data = self.client.get(url, {'field': 'serial_number', 'q': 'SN0000', 'limit': 3}).json()
+            self.assertEqual(data, {'choices': [['SN000000', 'SN000000'], ['SN000001', 'SN000001'],
+                                                ['SN000002', 'SN000002']], 'next_cursor': 'SN000002'})
+            self.assertEqual(self.client.get(url, {'field': 'job_number'}).json()['choices'], [])
+            self.assertEqual(self.client.get(url, {'field': 'partition_id'}).status_code, 400)
+
+
+# ------------------------------
+# Results table tests
+# ------------------------------
+
+from troubleshooter_app.tables import page_table, table_payload
+
+
+class ResultsTableTests(TestCase):
+    def setUp(self):
+        df = pd.DataFrame({
+            'Subject': [f'trigger {i}' for i in range(250)],
+            'Predicate': ['consume'] * 250,
+            'Object': [f'CH{i % 7}' for i in range(250)],
+            'Status': [None if i % 5 == 0 else bool(i % 2) for i in range(250)],
+        })
+        self.table = table_payload(df)
+
+    def test_payload_is_json_serialisable(self):
+        df = pd.DataFrame({'Status': pd.Series([True, False]).to_numpy(), 'Value': [1.5, None]})
+        self.assertEqual(table_payload(df), {'columns': ['Status', 'Value'], 'rows': [[True, 1.5], [False, None]]})
+
+    def test_filter_sort_and_page(self):
+        page = page_table(self.table, offset=10, limit=5, sort='Object', descending=True, query='ch6')
+        self.assertEqual((page['total'], page['filtered'], len(page['rows'])), (250, 35, 5))
+        self.assertTrue(all(row[2] == 'CH6' for row in page['rows']))
+
+        by_status = page_table(self.table, limit=250, sort='Status')['rows']
+        self.assertEqual([row[3] for row in by_status[:100]], [False] * 100)
+        self.assertIsNone(by_status[-1][3])
+
+    def test_results_endpoint_serves_the_session_tables(self):
+        session = self.client.session
+        session['troubleshooter_tables'] = {'triples': self.table}
+        session['troubleshooter_results'] = {'partition_id': 1, 'messages': [], 'table_rows': {'triples': 250}}
+        session.save()
+
+        response = self.client.get(reverse('troubleshooter_app:troubleshooter_results'))
+        self.assertContains(response, 'id="triples-table"')
+        self.assertNotContains(response, 'trigger 1')
+
+        url = reverse('troubleshooter_app:results_table', args=['triples'])
+        data = self.client.get(url, {'offset': 200, 'limit': 100, 'sort': 'Subject'}).json()
+        self.assertEqual((len(data['rows']), data['filtered']), (50, 250))
+        self.assertEqual(self.client.get(reverse('troubleshooter_app:results_table', args=['root_causes'])).status_code, 404)
+
+
+# ------------------------------
+# Partition diagnosis tests
+# ------------------------------
+
+from troubleshooter_app import services
+from troubleshooter_app.resources import registry
+from troubleshooter_app.services import diagnose_partition
+from unittest.mock import MagicMock
+
+
+class PartitionDiagnosisTests(TestCase):
+    def setUp(self):
+        rows = [
+            ("failure A", "consequence A", "rc 1", "rc 2", "trigger shared", "CH1"),
+            ("failure A", "consequence A", "rc 1", "rc 2", "trigger a2", "CH1"),
+            ("failure A", "consequence A", "rc 2", "rc 1", "trigger a", "CH2"),
+            ("failure B", "consequence B", "rc 3", "rc 4", "trigger shared", "CH1"),
+            ("failure B", "consequence B", "rc 4", "rc 3", "trigger b", "CH3"),
+            ("failure C", "consequence C", "rc 5", "rc 5", "trigger a", "CH2"),
+        ]
+        self.graph = synthetic.build_graph(pd.DataFrame(rows, columns=synthetic.ONTOLOGY_COLUMNS))
+        self.calls = []
+
+        def check_x(conn, partition_id, channel):
+            self.calls.append(('x', channel))
+            return channel == 'CH1'
+
+        def check_y(conn, partition_id, channel):
+            self.calls.append(('y', channel))
+            return True
+
+        self.mapping = {'trigger shared': check_x, 'trigger a2': check_x, 'trigger a': check_x, 'trigger b': check_y}
+        self.engine = MagicMock()
+
+    def test_shared_checks_run_once_and_failures_are_ranked(self):
+        summary, df_by_failure = diagnose_partition(self.graph, self.engine, 7, mapping=self.mapping)
+
+        self.assertEqual(sorted(self.calls), [('x', 'CH1'), ('x', 'CH2'), ('y', 'CH3')])
+        # The consequences are failures too; they have no checks of their own
+        self.assertEqual((summary['failures_evaluated'], summary['checks_requested'], summary['checks_run']), (6, 6, 3))
+        self.assertEqual([entry['failure'] for entry in summary['failures']], ['failure B', 'failure A'])
+        self.assertEqual(summary['failures'][0]['red_channels'], ['CH1', 'CH3'])
+        self.assertEqual(summary['failures'][1], {
+            'failure': 'failure A', 'red_channels': ['CH1'], 'root_causes': ['rc 1'], 'alerts': 2,
+        })
+
+        # Every failure gets the same rows as a diagnosis of that failure alone
+        df_alone, _ = services.execute_troubleshooting_logic(self.graph, self.engine, 7, 'failure A', mapping=self.mapping)
+        columns = ['Subject', 'Predicate', 'Object']
+        pd.testing.assert_frame_equal(
+            df_by_failure['failure A'].sort_values(columns).reset_index(drop=True),
+            df_alone.sort_values(columns).reset_index(drop=True),
+        )
+
+    def test_api_diagnoses_the_chosen_failures(self):
+        with registry.override('ontology', self.graph), registry.override('teradata_engine', self.engine), \
+                patch.dict(services.CHECK_FUNCTIONS, self.mapping, clear=True):
+            response = self.client.get(reverse('troubleshooter_app:diagnose_partition'),
+                                       {'partition_id': 7, 'failure': ['failure A', 'failure C']})
+        data = response.json()
+        self.assertEqual(data['failures_evaluated'], 2)
+        self.assertEqual([entry['failure'] for entry in data['failures']], ['failure A'])
+        self.assertEqual(self.client.get(reverse('troubleshooter_app:diagnose_partition')).status_code, 400)
+
+
+# ------------------------------
+# Check deadline and circuit breaker tests
+# ------------------------------
+
+from troubleshooter_app import resilience
+import time
+from troubleshooter_app.resilience import UNKNOWN, CircuitBreaker
+
+
+def _endless_check(conn, partition_id, channel):
+    # Runs until the statement is cancelled
+    return pd.read_sql("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c", conn)
+
+
+def _quick_check(conn, partition_id, channel):
+    return bool(pd.read_sql("SELECT 1", conn).iloc[0, 0])
+
+
+def _add_sleep_function(engine):
+    # fnfm_sleep(seconds) blocks inside SQLite, where a cancel only lands once it returns.
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function('fnfm_sleep', 1, lambda seconds: time.sleep(seconds) or 1)
+
+
+def _hung_check(conn, partition_id, channel):
+    return pd.read_sql("SELECT fnfm_sleep(1.0)", conn)
+
+
+def _wait_until(condition, seconds=5):
+    for _ in range(int(seconds * 100)):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class CheckResilienceTests(TestCase):
+    def setUp(self):
+        rows = [
+            ("failure A", "consequence A", "rc 1", "rc 2", "trigger slow", "CH1"),
+            ("failure A", "consequence A", "rc 2", "rc 1", "trigger quick", "CH2"),
+            ("failure A", "consequence A", "rc 2", "rc 1", "trigger quick", "CH3"),
+        ]
+        self.graph = synthetic.build_graph(pd.DataFrame(rows, columns=synthetic.ONTOLOGY_COLUMNS))
+        self.engine = synthetic.create_standin_engine(synthetic.generate_metadata(1), [])
+        self.mapping = {'trigger slow': _endless_check, 'trigger quick': _quick_check}
+        resilience.teradata_breaker.reset()
+        self.addCleanup(resilience.teradata_breaker.reset)
+
+    def statuses(self, df_clean):
+        return {(row.Subject, row.Object): row.Status for row in df_clean.itertuples()
+                if row.Predicate == 'consume'}
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_timed_out_check_is_unknown_and_the_rest_still_run(self):
+        start = time.perf_counter()
+        df_clean, _ = services.execute_troubleshooting_logic(self.graph, self.engine, 10000, 'failure A', mapping=self.mapping)
+        self.assertLess(time.perf_counter() - start, 3)
+        self.assertEqual(self.statuses(df_clean), {
+            ('trigger slow', 'CH1'): UNKNOWN, ('trigger quick', 'CH2'): True, ('trigger quick', 'CH3'): True,
+        })
+        self.assertEqual(services.unknown_checks(df_clean), [('trigger slow', 'CH1')])
+        self.assertEqual(services.get_root_cause_analysis(df_clean, 'failure A'),
+                         [['rc 2', 'trigger quick', 'CH2 🔴'], ['rc 2', 'trigger quick', 'CH3 🔴']])
+
+    def test_deadline_marks_the_remaining_checks_unknown(self):
+        def slow_check(conn, partition_id, channel):
+            time.sleep(0.3)
+            return True
+
+        with resilience.request_deadline(0.4):
+            results = services.evaluate_checks([('trigger', 'CH1'), ('trigger', 'CH2'), ('trigger', 'CH3')],
+                                               {'trigger': slow_check}, MagicMock(), 10000)
+        self.assertEqual([results[slow_check, channel] for channel in ('CH1', 'CH2', 'CH3')], [True, UNKNOWN, UNKNOWN])
+
+    def test_unreachable_warehouse_gives_partial_results_instead_of_none(self):
+        engine = MagicMock()
+        engine.connect.side_effect = OSError("connection refused")
+        df_clean, dic_tuple_result = services.execute_troubleshooting_logic(
+            self.graph, engine, 10000, 'failure A', mapping=self.mapping)
+        self.assertTrue(dic_tuple_result)
+        self.assertEqual(set(self.statuses(df_clean).values()), {UNKNOWN})
+
+    def test_breaker_opens_and_lets_one_probe_through_after_the_reset_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        failing = MagicMock(side_effect=RuntimeError("spool space"))
+        conn = MagicMock()
+
+        for _ in range(3):
+            self.assertEqual(resilience.guarded_check(failing, conn, 1, 'CH1', breaker=breaker), UNKNOWN)
+        self.assertEqual((failing.call_count, breaker.state), (2, 'open'))
+
+        now[0] = 11
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(resilience.guarded_check(lambda *args: True, conn, 1, 'CH1', breaker=breaker))
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_checks_move_off_a_connection_abandoned_to_a_hung_check(self):
+        release, used = threading.Event(), []
+
+        def hung_check(conn, partition_id, channel):
+            # Ignores the cancel, like a driver without one.
+            used.append(conn)
+            release.wait(5)
+            return True
+
+        def quick_check(conn, partition_id, channel):
+            used.append(conn)
+            return _quick_check(conn, partition_id, channel)
+        with patch.object(resilience, 'CANCEL_GRACE_SECONDS', 0.05):
+            with resilience.checks_connection(self.engine) as conn:
+                self.assertEqual(resilience.guarded_check(hung_check, conn, 10000, 'CH1'), UNKNOWN)
+                self.assertTrue(resilience.is_abandoned(conn))
+                self.assertFalse(conn.invalidated)
+                self.assertTrue(resilience.guarded_check(quick_check, conn, 10000, 'CH2'))
+                self.assertTrue(resilience.guarded_check(quick_check, conn, 10000, 'CH3'))
+            release.set()
+            for _ in range(100):
+                if conn.invalidated:
+                    break
+                time.sleep(0.01)
+
+        self.assertIs(used[0], conn)
+        self.assertIsNot(used[1], conn)
+        self.assertIs(used[2], used[1])
+        self.assertTrue(used[1].closed)
+        # The worker let go of the abandoned connection, which was then invalidated.
+        self.assertTrue(conn.invalidated)
+
+    def test_connecting_neither_resets_the_failures_nor_takes_the_probe(self):
+        now = [0.0]
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        failing = MagicMock(side_effect=RuntimeError("spool space"))
+        engine = MagicMock()
+
+        # One failed check per diagnosis still adds up across diagnoses.
+        for _ in range(2):
+            with resilience.checks_connection(engine, breaker=breaker) as conn:
+                self.assertIsNotNone(conn)
+                resilience.guarded_check(failing, conn, 1, 'CH1', breaker=breaker)
+        self.assertEqual(breaker.state, 'open')
+        with resilience.checks_connection(engine, breaker=breaker) as conn:
+            self.assertIsNone(conn)
+
+        now[0] = 11
+        with resilience.checks_connection(engine, breaker=breaker) as conn:
+            self.assertEqual(breaker.state, 'open')
+            # The first check is the probe, and its failure opens the breaker again.
+            self.assertEqual(resilience.guarded_check(failing, conn, 1, 'CH1', breaker=breaker), UNKNOWN)
+            self.assertEqual(resilience.guarded_check(failing, conn, 1, 'CH2', breaker=breaker), UNKNOWN)
+        self.assertEqual((failing.call_count, breaker.state), (3, 'open'))
+
+
+# ------------------------------
+# Check pre-warming tests
+# ------------------------------
+
+from datetime import timedelta
+from django.utils import timezone
+from troubleshooter_app.check_store import get_watermark, load_check_results, save_check_results
+from troubleshooter_app.models import CheckResult
+
+
+class PrewarmChecksTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(8, rows_per_failure=4)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.metadata = synthetic.generate_metadata(5)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph), fire_rate=0.5)
+        resilience.teradata_breaker.reset()
+
+    def prewarm(self, **options):
+        out = io.StringIO()
+        with registry.override('ontology', self.graph), registry.override('teradata_engine', self.engine), \
+                patch.dict(services.CHECK_FUNCTIONS, self.mapping, clear=True):
+            call_command('prewarm_checks', '--once', stdout=out, stderr=io.StringIO(), **options)
+        return out.getvalue()
+
+    def test_new_partitions_are_prewarmed_incrementally(self):
+        self.prewarm(backfill=2)
+        self.assertEqual(get_watermark('prewarm_checks.partition_id'), '10004')
+        self.assertEqual(sorted(set(CheckResult.objects.values_list('partition_id', flat=True))), [10003, 10004])
+        self.assertEqual(CheckResult.objects.filter(partition_id=10004).count(), 8)
+
+        self.engine.standin_keepalive.execute(
+            "INSERT INTO PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA VALUES (10005, 'SN000000', 'JOB0000005', '2025-01-01')")
+        self.engine.standin_keepalive.commit()
+        output = self.prewarm()
+        self.assertIn("Partition 10005: 8 check results stored", output)
+        self.assertNotIn("10004", output)
+        self.assertEqual(get_watermark('prewarm_checks.partition_id'), '10005')
+
+    def test_stored_results_are_read_back_without_unknown_ones(self):
+        check = MagicMock(__name__='stored_check', return_value=True)
+        save_check_results(10001, {(check, 'CH1'): False, (check, 'CH2'): UNKNOWN})
+        self.assertEqual(load_check_results(10001, [(check, 'CH1'), (check, 'CH2')]), {(check, 'CH1'): False})
+
+        # Unversioned results aren't reused by plain diagnoses.
+        results = services.evaluate_checks([('trigger', 'CH1')], {'trigger': check}, MagicMock(), 10001)
+        self.assertEqual(results, {(check, 'CH1'): True})
+
+    def test_all_failures_diagnosis_reuses_prewarmed_results(self):
+        from troubleshooter_app.management.commands.prewarm_checks import prewarm_partition
+
+        prewarm_partition(self.engine, services.ontology_check_invocations(self.graph), 10001, mapping=self.mapping)
+        statements = []
+        event.listen(self.engine, 'after_cursor_execute', lambda *args: statements.append(args[2]))
+        summary, _ = services.diagnose_partition(self.graph, self.engine, 10001, mapping=self.mapping,
+                                                 incremental=True)
+        # Only the version query reaches the warehouse.
+        self.assertEqual(len(statements), 1)
+        self.assertIn('UNION ALL', statements[0])
+        self.assertEqual(summary['rediagnosis']['checks_evaluated'], 0)
+        self.assertEqual(summary['rediagnosis']['checks_reused'], summary['checks_run'])
+
+        cold, _ = services.diagnose_partition(self.graph, self.engine, 10001, mapping=self.mapping)
+        self.assertEqual(summary['failures'], cold['failures'])
+
+    def test_stored_results_expire(self):
+        check = MagicMock(__name__='stored_check', return_value=True)
+        save_check_results(10001, {(check, 'CH1'): False})
+        CheckResult.objects.update(evaluated_at=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(load_check_results(10001, [(check, 'CH1')]), {})
+        with override_settings(FNFM_CHECK_RESULT_MAX_AGE_SECONDS=600):
+            self.assertEqual(load_check_results(10001, [(check, 'CH1')]), {(check, 'CH1'): False})
+        self.assertEqual(load_check_results(10001, [(check, 'CH1')], since=timezone.now()), {})
+
+
+# ------------------------------
+# Fleet heatmap tests
+# ------------------------------
+
+from datetime import datetime
+from django.core.cache import cache
+from troubleshooter_app import fleet
+
+
+class FleetHeatmapTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(16, rows_per_failure=8, root_causes_per_failure=3)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.metadata = synthetic.generate_metadata(20, jobs_per_serial=5)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph), fire_rate=0.3)
+        self.window = (datetime(2025, 1, 1), datetime(2026, 1, 1))
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_grouped_rules_match_the_per_partition_checks(self):
+        firings, unsupported = fleet.compute_firings(self.graph, self.engine, *self.window, mapping=self.mapping)
+        self.assertEqual(unsupported, [])
+
+        paths = fleet.ontology_paths(self.graph, self.mapping)
+        expected = set()
+        with self.engine.connect() as conn:
+            for partition_id in self.metadata['partition_id']:
+                for path in paths.itertuples(index=False):
+                    if self.mapping[path.trigger](conn, partition_id, path.data_channel):
+                        expected.add((int(partition_id), path.failure, path.root_cause, path.trigger, path.data_channel))
+        actual = set(firings[['partition_id'] + fleet.DIMENSIONS].itertuples(index=False, name=None))
+        self.assertTrue(expected)
+        self.assertEqual(actual, expected)
+
+    def test_heatmap_counts_partitions_per_bucket(self):
+        firings = pd.DataFrame([
+            (1, 'SN1', '2025-01', 'f', 'rc A', 't1', 'CH1'),
+            (1, 'SN1', '2025-01', 'f', 'rc A', 't2', 'CH2'),
+            (2, 'SN1', '2025-02', 'f', 'rc A', 't1', 'CH1'),
+            (3, 'SN2', '2025-02', 'f', 'rc B', 't3', 'CH3'),
+        ], columns=['partition_id', 'serial_number', 'month'] + fleet.DIMENSIONS)
+        data = fleet.heatmap(firings, 'root_cause', 'month')
+        self.assertEqual((data['rows'], data['columns'], data['values']), (['rc A', 'rc B'], ['2025-01', '2025-02'], [[1, 1], [0, 1]]))
+        self.assertEqual((data['totals'], data['partitions']), ([2, 1], 3))
+        with self.assertRaises(ValueError):
+            fleet.heatmap(firings, 'partition', 'month')
+
+    def test_aggregate_api_and_page_serve_the_cached_heatmap(self):
+        with registry.override('ontology', self.graph), registry.override('teradata_engine', self.engine), \
+                patch.dict(services.CHECK_FUNCTIONS, self.mapping, clear=True):
+            params = {'dimension': 'data_channel', 'by': 'serial_number', 'start': '2025-01', 'end': '2025-12'}
+            data = self.client.get(reverse('troubleshooter_app:fleet_aggregate'), params).json()
+            self.assertEqual(data['columns'], ['SN000000', 'SN000001', 'SN000002', 'SN000003'])
+            self.assertEqual(len(data['rows']), len(data['values']))
+
+            with patch.object(fleet, 'compute_firings', side_effect=AssertionError("not cached")):
+                response = self.client.get(reverse('troubleshooter_app:fleet_heatmap'), params)
+            self.assertContains(response, 'id="fleet-heatmap"')
+            self.assertEqual(self.client.get(reverse('troubleshooter_app:fleet_aggregate'), {'by': 'week'}).status_code, 400)
+
 
+# ------------------------------
+# Serial timeline tests
+# ------------------------------
 
+from troubleshooter_app import timeline
 
 
+class SerialTimelineTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(14, rows_per_failure=7)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.metadata = synthetic.generate_metadata(10, jobs_per_serial=5)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph), fire_rate=0.5)
+
+    def test_matrix_matches_the_per_partition_checks(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        with patch.object(timeline, 'TIMELINE_BATCH_SIZE', 2):
+            data = timeline.serial_timeline(self.graph, self.engine, 'SN000001', mapping=self.mapping)
+
+        jobs = self.metadata[self.metadata['serial_number'] == 'SN000001'].sort_values('job_start')
+        self.assertEqual([job['partition_id'] for job in data['jobs']], jobs['partition_id'].tolist())
+        self.assertEqual(len(data['rows']), 14)
+        # One metadata query, then three batches of at most two partitions per check rule
+        rules = {row['check'] for row in data['rows']}
+        self.assertEqual(len(statements), 1 + 3 * len(rules))
+
+        with self.engine.connect() as conn:
+            for row in data['rows']:
+                expected = [bool(self.mapping[row['trigger']](conn, job['partition_id'], row['data_channel']))
+                            for job in data['jobs']]
+                self.assertEqual([cell['status'] for cell in row['cells']], expected, row['trigger'])
+                if row['check'] == 'limit_check':
+                    partition_id = data['jobs'][0]['partition_id']
+                    min_max = pd.read_sql(
+                        'select min("min"), max("max") from PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg '
+                        f"where xcol = '{row['data_channel']}' and partition_id = {partition_id}", conn).iloc[0].tolist()
+                    self.assertEqual([row['cells'][0]['min'], row['cells'][0]['max']], min_max)
+
+    def test_timeline_page_and_api(self):
+        with registry.override('ontology', self.graph), registry.override('teradata_engine', self.engine), \
+                patch.dict(services.CHECK_FUNCTIONS, self.mapping, clear=True):
+            data = self.client.get(reverse('troubleshooter_app:serial_timeline_api'),
+                                   {'serial_number': 'SN000000', 'failure': 'synthetic failure 0'}).json()
+            self.assertEqual((len(data['jobs']), len(data['rows'])), (5, 7))
+            response = self.client.get(reverse('troubleshooter_app:serial_timeline'), {'serial_number': 'SN000000'})
+        self.assertContains(response, 'id="serial-timeline"')
+        self.assertEqual(self.client.get(reverse('troubleshooter_app:serial_timeline_api')).status_code, 400)
 
 
+# ------------------------------
+# Arrow fetch tests
+# ------------------------------
+
+from troubleshooter_app import fetch
+from troubleshooter_app.services import METADATA_DTYPES, get_metadata
 
 
+class ArrowFetchTests(TestCase):
+    def setUp(self):
+        self.metadata = synthetic.generate_metadata(10, jobs_per_serial=4)
+        self.engine = synthetic.create_standin_engine(self.metadata, [], check_partitions=[])
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+        self.sql = "SELECT * FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA ORDER BY partition_id"
+
+    def test_rows_are_streamed_in_chunks(self):
+        with self.engine.connect() as conn:
+            batches = list(fetch.iter_batches(conn, self.sql, dtypes=METADATA_DTYPES, chunk_size=3))
+        self.assertEqual([batch.num_rows for batch in batches], [3, 3, 3, 1])
+        self.assertEqual(str(batches[0].schema.field('serial_number').type), 'dictionary<values=string, indices=int32, ordered=0>')
+
+    def test_frame_dtypes_and_values(self):
+        with self.engine.connect() as conn:
+            df = fetch.fetch_frame(conn, self.sql, dtypes=METADATA_DTYPES, chunk_size=4)
+        self.assertIsInstance(df['serial_number'].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(df['job_number'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['job_start']))
+        self.assertEqual(df['partition_id'].dtype, 'int64')
+        # Dictionaries of the separate chunks are unified into one set of categories.
+        self.assertEqual(sorted(df['serial_number'].cat.categories), ['SN000000', 'SN000001', 'SN000002'])
+
+        expected = self.metadata.sort_values('partition_id').reset_index(drop=True)
+        self.assertEqual(df['serial_number'].astype(str).tolist(), expected['serial_number'].tolist())
+        self.assertEqual(df['job_start'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').tolist(), expected['job_start'].tolist())
+
+    def test_empty_result_and_arrow_dtypes(self):
+        with self.engine.connect() as conn:
+            empty = fetch.fetch_frame(conn, self.sql.replace('ORDER BY', 'WHERE partition_id < 0 ORDER BY'),
+                                      dtypes=METADATA_DTYPES)
+            arrow = fetch.fetch_frame(conn, self.sql, arrow_dtypes=True)
+        self.assertEqual(list(empty.columns), ['partition_id', 'serial_number', 'job_number', 'job_start'])
+        self.assertTrue(empty.empty)
+        self.assertIsInstance(arrow['partition_id'].dtype, pd.ArrowDtype)
+
+    def test_get_metadata_feeds_the_form_choices(self):
+        df = get_metadata(self.engine)
+        self.assertEqual(len(df), 10)
+        self.assertIsInstance(df['serial_number'].dtype, pd.CategoricalDtype)
+
+        job = self.metadata.iloc[0]
+        with synthetic.use_engine(self.engine), patch('troubleshooter_app.views.get_metadata', get_metadata):
+            url = reverse('troubleshooter_app:get_form_choices')
+            serials = self.client.get(url, {'parent_field': 'serial_number'}).json()['choices']
+            starts = self.client.get(url, {'parent_field': 'job_start', 'parent_value': job['job_number']}).json()['choices']
+        self.assertEqual(serials, [[s, s] for s in ['SN000000', 'SN000001', 'SN000002']])
+        # Formatted like CAST(job_start AS CHAR(26)), so get_partition_id finds the job again.
+        self.assertEqual(starts, [[job['job_start'], job['job_start']]])
+
+
+# ------------------------------
+# Static asset tests
+# ------------------------------
+
+import gzip
+import shutil
+from django.templatetags.static import static
+from troubleshooter_app import assets
+
+
+class StaticAssetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings = override_settings(STATIC_ROOT=cls.static_root)
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.static_root)
+        super().tearDownClass()
+
+    def test_collectstatic_hashes_and_precompresses(self):
+        hashed = static('pyvis/vis-9.1.2/vis-network.min.js')
+        self.assertRegex(hashed, r'^/static/pyvis/vis-9\.1\.2/vis-network\.min\.[0-9a-f]{12}\.js$')
+        path = os.path.join(self.static_root, hashed.removeprefix('/static/'))
+        with open(path, 'rb') as f, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), f.read())
+        # Images are already compressed.
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, 'FNFM_UH_view_Tool_string.jpeg.gz')))
+
+    def test_serve_variants_and_cache_headers(self):
+        hashed = static('pyvis/vis-9.1.2/vis-network.css')
+        response = self.client.get(hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        response = self.client.get('/static/pyvis/vis-9.1.2/vis-network.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(self.client.get('/static/missing.js').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+    def test_graph_pages_reference_the_hashed_assets(self):
+        from pyvis.network import Network
+
+        net = Network(directed=True)
+        net.add_node('a')
+        path = os.path.join(self.static_root, 'graph.html')
+        assets.save_graph(net, path)
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        self.assertNotIn('cdnjs.cloudflare.com', html)
+        self.assertNotIn('"lib/', html)
+        self.assertIn(f'src="{static("pyvis/vis-9.1.2/vis-network.min.js")}"', html)
+        self.assertIn(f'href="{static("pyvis/vis-9.1.2/vis-network.css")}"', html)
+
+
+# ------------------------------
+# Troubleshooting guide tests
+# ------------------------------
+
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from troubleshooter_app import guides
+from troubleshooter_app.models import GuideLabel, TroubleshooterGuide
+
+
+class TroubleshooterGuideTests(TestCase):
+    def setUp(self):
+        self.guide = TroubleshooterGuide.objects.create(
+            title='Recalibrate the deflector voltage', description='Deflector drifts after a bake-out.',
+            solution='Run the calibration recipe and reseat the HV connector.')
+        self.guide.labels.create(label='Deflector Failure', kind=GuideLabel.ROOT_CAUSE)
+        self.guide.labels.create(label='MCDIGVLTFM', kind=GuideLabel.DATA_CHANNEL)
+        self.other = TroubleshooterGuide.objects.create(
+            title='Vacuum leaks', description='Pressure rises slowly.', solution='Check the deflector gasket.')
+        self.other.labels.create(label='Vacuum Leak', kind=GuideLabel.ROOT_CAUSE)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual([hit['id'] for hit in guides.search_guides('mcdigvltfm')], [self.guide.pk])
+        self.guide.title = 'Replace the HV supply'
+        self.guide.save()
+        self.assertEqual(guides.search_guides('supply')[0]['labels'], ['Deflector Failure', 'MCDIGVLTFM'])
+        self.guide.delete()
+        self.assertEqual(guides.search_guides('supply'), [])
+        self.assertEqual(guides.search_guides('  -- '), [])
+
+    def test_title_matches_rank_first(self):
+        hits = guides.search_guides('deflector')
+        self.assertEqual([hit['id'] for hit in hits], [self.guide.pk, self.other.pk])
+        self.assertGreater(hits[0]['score'], hits[1]['score'])
+        # The last word matches as a prefix, all words must match.
+        self.assertEqual([hit['id'] for hit in guides.search_guides('deflector gask')], [self.other.pk])
+
+    def test_guides_for_red_labels_in_one_query(self):
+        with self.assertNumQueries(1):
+            entries = guides.guides_for_labels(root_causes=['Deflector Failure', 'Vacuum Leak', 'Unknown'],
+                                               data_channels=['MCDIGVLTFM', 'Deflector Failure'])
+        self.assertEqual([(entry['label'], entry['kind']) for entry in entries],
+                         [('Deflector Failure', 'root_cause'), ('MCDIGVLTFM', 'data_channel'), ('Vacuum Leak', 'root_cause')])
+        self.assertEqual(entries[0]['guides'][0]['title'], 'Recalibrate the deflector voltage')
+
+    def test_search_scales_to_thousands_of_guides(self):
+        TroubleshooterGuide.objects.bulk_create(
+            TroubleshooterGuide(title=f'Guide {i}', description=f'Symptom s{i % 97} of subsystem u{i % 13}',
+                                solution=f'Procedure {i}') for i in range(5000))
+        guides.rebuild_index()
+        with CaptureQueriesContext(connection) as queries:
+            hits = guides.search_guides('symptom s15 subsystem u7', limit=10)
+        self.assertEqual(len(hits), 4)
+        self.assertTrue(all(hit['description'] == 'Symptom s15 of subsystem u7' for hit in hits))
+        # One query, answered from the full-text index rather than by scanning the guides.
+        self.assertEqual(len(queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn(f"{guides.FTS_TABLE} VIRTUAL TABLE INDEX", plan)
+        self.assertNotIn(f"SCAN {TroubleshooterGuide._meta.db_table}", plan)
+
+    def test_search_endpoint_and_results_page(self):
+        url = reverse('troubleshooter_app:guide_search')
+        data = self.client.get(url, {'q': 'vacuum', 'limit': 5}).json()
+        self.assertEqual([hit['title'] for hit in data['results']], ['Vacuum leaks'])
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        session = self.client.session
+        session['troubleshooter_results'] = {
+            'partition_id': 1, 'messages': [], 'table_rows': {'root_causes': 1},
+            'guides': guides.guides_for_labels(root_causes=['Vacuum Leak']),
+        }
+        session.save()
+        response = self.client.get(reverse('troubleshooter_app:troubleshooter_results'))
+        self.assertContains(response, 'id="troubleshooting-guides"')
+        self.assertContains(response, 'Check the deflector gasket.')
+
+    def test_single_failure_diagnosis_gets_the_guides_of_red_data_channels(self):
+        rows = [("failure A", "consequence A", "Unlisted cause", "rc 2", "trigger quick", "MCDIGVLTFM")]
+        graph = synthetic.build_graph(pd.DataFrame(rows, columns=synthetic.ONTOLOGY_COLUMNS))
+        engine = synthetic.create_standin_engine(synthetic.generate_metadata(1), [])
+        self.addCleanup(engine.dispose)
+        self.addCleanup(engine.standin_keepalive.close)
+        resilience.teradata_breaker.reset()
+
+        request = RequestFactory().post('/', {'serial_number': 'SN000000', 'job_number': 'JOB0000000',
+                                              'job_start': '2025-01-01', 'failure_selectbox': 'failure A'})
+        request.session = self.client.session
+        with registry.override('ontology', graph), registry.override('teradata_engine', engine), \
+                patch.object(views, 'get_partition_id', return_value=10000), \
+                patch.object(views.assets, 'save_graph'), \
+                patch.dict(services.CHECK_FUNCTIONS, {'trigger quick': _quick_check}, clear=True):
+            response = views.troubleshooter_view(request)
+
+        self.assertEqual(response.status_code, 302)
+        entries = request.session['troubleshooter_results']['guides']
+        self.assertEqual([(entry['label'], entry['kind']) for entry in entries], [('MCDIGVLTFM', 'data_channel')])
+        self.assertEqual(entries[0]['guides'][0]['title'], 'Recalibrate the deflector voltage')
+
+
+# ------------------------------
+# Concurrent diagnosis tests
+# ------------------------------
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from troubleshooter_app import snapshot
+from troubleshooter_app.services import get_root_cause_analysis
+
+
+class ConcurrentDiagnosisTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(24, rows_per_failure=6, root_causes_per_failure=3)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.metadata = synthetic.generate_metadata(4)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph),
+                                                      fire_rate=0.5, pool_size=16)
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+
+    def test_snapshot_matches_the_graph_and_is_immutable(self):
+        frozen = snapshot.ontology_snapshot(self.graph)
+        self.assertIs(snapshot.ontology_snapshot(self.graph), frozen)
+        self.assertEqual(sorted(frozen.labels_of_type('Failure')), sorted(get_all_failure_labels(self.graph)))
+        for failure in get_all_failure_labels(self.graph):
+            self.assertEqual(frozen.concept_triples(failure), sorted(execute_query_for_concept(self.graph, failure)))
+        with self.assertRaises(AttributeError):
+            frozen.version = 'changed'
+        with self.assertRaises(TypeError):
+            frozen._triples['new concept'] = ()
+
+    def _diagnose(self, partition_id, failure):
+        df_clean, _ = services.execute_troubleshooting_logic(self.graph, self.engine, partition_id, failure,
+                                                             mapping=self.mapping)
+        rows = sorted(map(tuple, df_clean.astype(str).values.tolist()))
+        alerts = get_root_cause_analysis(df_clean, failure) if not df_clean.empty else []
+        return rows, alerts, id(snapshot.duckdb_cursor())
+
+    def test_parallel_diagnoses_match_serial_ones(self):
+        failures = get_all_failure_labels(self.graph)
+        jobs = [(partition_id, failure) for partition_id in self.metadata['partition_id'] for failure in failures]
+        with patch.object(services, 'load_check_results', return_value={}):
+            expected = {job: self._diagnose(*job)[:2] for job in jobs}
+
+            # Start from an rdflib graph nobody has frozen yet, and with every
+            # thread entering the diagnosis core at the same time.
+            snapshot._snapshots.clear()
+            barrier = threading.Barrier(16)
+
+            def run(job):
+                if job in jobs[:16]:
+                    barrier.wait(timeout=10)
+                return job, self._diagnose(*job)
+
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(run, jobs * 3))
+
+        self.assertEqual(len(results), 3 * len(jobs))
+        for job, (rows, alerts, _) in results:
+            self.assertEqual((rows, alerts), expected[job], job)
+        self.assertTrue(any(alerts for _, (_, alerts, _) in results))
+        # Every worker thread queried DuckDB through its own cursor.
+        self.assertEqual(len({cursor for _, (_, _, cursor) in results}), 16)
+
+
+# ------------------------------
+# Slow-query log tests
+# ------------------------------
+
+from django.core.management.base import CommandError
+from sqlalchemy import text
+from troubleshooter_app import slow_queries
+from troubleshooter_app.resources import registry
+from troubleshooter_app.resilience import guarded_check
+from troubleshooter_app.services import limit_check
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        self.metadata = synthetic.generate_metadata(3)
+        self.engine = synthetic.create_standin_engine(self.metadata, ['MCDIGVLTFM'])
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+        slow_queries.install(self.engine)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log = os.path.join(directory, 'slow.jsonl')
+        self.settings = override_settings(FNFM_SLOW_QUERY_LOG=self.log, FNFM_SLOW_QUERY_SECONDS=60)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_slow_checks_are_logged_with_their_context(self):
+        with self.engine.connect() as conn:
+            with override_settings(FNFM_SLOW_QUERY_SECONDS=1e-9):
+                guarded_check(limit_check, conn, pd.Series([10001]).iloc[0], 'MCDIGVLTFM')
+                conn.execute(text("SELECT partition_id FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA "
+                                  "WHERE serial_number = :serial"), {'serial': 'SN000000'}).fetchall()
+            guarded_check(limit_check, conn, 10002, 'MCDIGVLTFM')
+
+        # pandas' table-existence probes (PRAGMAs on the stand-in) are logged too.
+        check, lookup = [entry for entry in slow_queries.read_log() if not entry['sql'].startswith('PRAGMA')]
+        self.assertEqual((check['check'], check['partition_id'], check['data_channel']), ('limit_check', 10001, 'MCDIGVLTFM'))
+        self.assertIn('FNFM_fleet_timeseries_generic_limit_checks_agg_mavg', check['sql'])
+        self.assertGreater(check['duration_seconds'], 0)
+        self.assertEqual(lookup['parameters'], ['SN000000'])
+        self.assertIsNone(lookup['check'])
+        # Literals don't change the fingerprint.
+        self.assertEqual(slow_queries.fingerprint(check['sql']), slow_queries.fingerprint(check['sql'].replace('10001', '42')))
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_failed_and_cancelled_statements_are_logged(self):
+        with self.engine.connect() as conn:
+            self.assertEqual(guarded_check(_endless_check, conn, 10001, 'MCDIGVLTFM'), UNKNOWN)
+            with override_settings(FNFM_SLOW_QUERY_SECONDS=1e-9):
+                self.assertEqual(guarded_check(lambda *args: pd.read_sql("SELECT * FROM missing_table", conn),
+                                               conn, 10002, 'MCDIGVLTFM'), UNKNOWN)
+
+        cancelled, failed = [entry for entry in slow_queries.read_log() if not entry['sql'].startswith('PRAGMA')]
+        self.assertTrue(cancelled['cancelled'])
+        self.assertIn('interrupted', cancelled['error'])
+        self.assertEqual((cancelled['partition_id'], cancelled['rows']), (10001, None))
+        self.assertGreater(cancelled['duration_seconds'], 0)
+        self.assertFalse(failed['cancelled'])
+        self.assertIn('missing_table', failed['error'])
+        self.assertEqual(slow_queries.summarize([cancelled, failed])[0]['errors'], 1)
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_statements_outliving_the_cancel_grace_are_logged(self):
+        self.addCleanup(resilience.teradata_breaker.reset)
+        _add_sleep_function(self.engine)
+        with patch.object(resilience, 'CANCEL_GRACE_SECONDS', 0.05), \
+                resilience.checks_connection(self.engine) as conn:
+            self.assertEqual(guarded_check(_hung_check, conn, 10001, 'MCDIGVLTFM'), UNKNOWN)
+            self.assertTrue(resilience.is_abandoned(conn))
+        self.assertTrue(_wait_until(lambda: conn.invalidated))
+
+        entry, = [entry for entry in slow_queries.read_log() if 'fnfm_sleep' in entry['sql']]
+        self.assertTrue(entry['cancelled'])
+        self.assertEqual((entry['check'], entry['partition_id']), ('_hung_check', 10001))
+        self.assertGreater(entry['duration_seconds'], 0.2)
+
+    def test_log_rotates(self):
+        with override_settings(FNFM_SLOW_QUERY_LOG_BYTES=2000, FNFM_SLOW_QUERY_LOG_BACKUPS=2):
+            for i in range(30):
+                slow_queries.record(f"sel * from t where partition_id = {i}", None, 0.5, 1)
+            entries = list(slow_queries.read_log())
+        self.assertTrue(os.path.exists(self.log + '.2'))
+        self.assertLess(len(entries), 30)
+        self.assertEqual(entries[-1]['sql'], 'sel * from t where partition_id = 29')
+
+    def test_summary_and_explain_commands(self):
+        with self.engine.connect() as conn, override_settings(FNFM_SLOW_QUERY_SECONDS=1e-9):
+            for partition_id in (10000, 10001, 10002):
+                guarded_check(limit_check, conn, partition_id, 'MCDIGVLTFM')
+            conn.execute(text("SELECT serial_number FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA "
+                              "WHERE partition_id = :partition_id"), {'partition_id': 10000}).fetchall()
+        summary = slow_queries.summarize(slow_queries.read_log())
+        fingerprint = next(group['fingerprint'] for group in summary if group['slowest']['sql'].startswith('select'))
+        self.assertEqual(sum(1 for group in summary if group['checks'] == []), 1)
+
+        out = io.StringIO()
+        call_command('slow_queries', 'top', '--check', 'limit_check', '--limit', '10', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 * (len(summary) - 1))
+        line = next(line for line in lines if line.startswith(fingerprint))
+        self.assertTrue(line.startswith(f"{fingerprint}      3x"))
+        self.assertIn('checks=limit_check  partitions=3', line)
+
+        out = io.StringIO()
+        with registry.override('teradata_engine', self.engine):
+            call_command('slow_queries', 'explain', fingerprint, stdout=out)
+        self.assertIn('FNFM_fleet_timeseries_generic_limit_checks_agg_mavg', out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(slow_queries.plans_dir(), f"{fingerprint}.txt")))
+        with self.assertRaises(CommandError):
+            call_command('slow_queries', 'explain', 'unknown')
+
+
+# ------------------------------
+# Single-flight diagnosis tests
+# ------------------------------
+
+from troubleshooter_app import coalesce, views
+from troubleshooter_app.models import DiagnosisLock
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(6, rows_per_failure=6, root_causes_per_failure=2)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.failure = get_all_failure_labels(self.graph)[0]
+        self.metadata = synthetic.generate_metadata(2)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph),
+                                                      fire_rate=0.5, latency=0.02, pool_size=8)
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+        self.statements = []
+        event.listen(self.engine, 'after_cursor_execute', lambda *args: self.statements.append(args[2]))
+
+    def _diagnose(self, **kwargs):
+        return services.execute_troubleshooting_logic(self.graph, self.engine, 10000, self.failure,
+                                                      mapping=self.mapping, **kwargs)
+
+    def _run_together(self, count, function):
+        barrier = threading.Barrier(count)
+        outcomes = [None] * count
+
+        def run(i):
+            barrier.wait()
+            try:
+                outcomes[i] = function()
+            except Exception as e:
+                outcomes[i] = e
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    @override_settings(FNFM_COALESCE_DB_LOCK=False)
+    def test_concurrent_identical_diagnoses_run_once(self):
+        key = coalesce.diagnosis_key(10000, self.failure, services.ontology_version(self.graph))
+        self.assertEqual(key, coalesce.diagnosis_key('10000', self.failure, services.ontology_version(self.graph)))
+        with patch.object(services, 'load_check_results', return_value={}):
+            self._diagnose()
+            alone = len(self.statements)
+            self.statements.clear()
+            outcomes = self._run_together(8, lambda: coalesce.single_flight(key, self._diagnose))
+
+        self.assertGreater(alone, 0)
+        self.assertEqual(len(self.statements), alone)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+        self.assertNotIn(key, coalesce._flights)
+
+    @override_settings(FNFM_COALESCE_DB_LOCK=False)
+    def test_followers_get_the_leaders_error(self):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            time.sleep(0.1)
+            raise RuntimeError('warehouse down')
+        outcomes = self._run_together(4, lambda: coalesce.single_flight('key', failing))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(outcome, RuntimeError) for outcome in outcomes))
+
+    @override_settings(FNFM_COALESCE_DB_LOCK=False)
+    def test_api_requests_share_one_diagnosis(self):
+        df_clean = pd.DataFrame({'Subject': ['T'], 'Predicate': ['consume'], 'Object': ['C'], 'Status': [True]})
+        calls = []
+
+        def logic(*args, **kwargs):
+            calls.append(kwargs)
+            time.sleep(0.1)
+            return df_clean, {}
+        request = RequestFactory().get('/api/data/', {'partition_id': '10000', 'failure': self.failure})
+        with registry.override('ontology', self.graph), registry.override('teradata_engine', self.engine), \
+                patch.object(views, 'execute_troubleshooting_logic', side_effect=logic):
+            responses = self._run_together(4, lambda: views.get_troubleshooter_data(request))
+
+        self.assertEqual(calls, [{'store_results': True, 'incremental': True}])
+        self.assertEqual({response.content for response in responses}, {responses[0].content})
+        self.assertEqual(json.loads(responses[0].content)['data'][0]['Object'], 'C')
+
+    def test_workers_wait_for_the_lock_holder_and_reuse_its_results(self):
+        key = coalesce.diagnosis_key(10000, self.failure, services.ontology_version(self.graph))
+        name = coalesce.lock_name(key)
+        DiagnosisLock.objects.create(key=name, owner='other worker', expires_at=timezone.now() + timedelta(minutes=1))
+        expected, _ = self._diagnose(store_results=True)
+        CheckResult.objects.all().delete()
+
+        def other_worker_finishes():
+            # The other worker's diagnosis stores its check results and releases the lock.
+            self._diagnose(store_results=True)
+            DiagnosisLock.objects.filter(key=name).delete()
+            self.statements.clear()
+        with patch.object(coalesce, '_poll_wait', side_effect=other_worker_finishes) as wait:
+            df_clean, _ = coalesce.single_flight(key, self._diagnose, store_results=True)
+
+        self.assertEqual(wait.call_count, 1)
+        self.assertEqual(self.statements, [])
+        self.assertTrue(df_clean.reset_index(drop=True).equals(expected.reset_index(drop=True)))
+        self.assertFalse(DiagnosisLock.objects.exists())
+
+    def test_only_results_stored_while_waiting_are_handed_off(self):
+        check = MagicMock(__name__='stored_check', return_value=True)
+        save_check_results(10000, {(check, 'CH1'): False})
+        key = coalesce.diagnosis_key(10000, self.failure, services.ontology_version(self.graph))
+        DiagnosisLock.objects.create(key=coalesce.lock_name(key), owner='other worker',
+                                     expires_at=timezone.now() + timedelta(minutes=1))
+
+        def other_worker_finishes():
+            save_check_results(10000, {(check, 'CH2'): False})
+            DiagnosisLock.objects.all().delete()
+
+        def diagnose():
+            return services.evaluate_checks([('trigger', 'CH1'), ('trigger', 'CH2')], {'trigger': check}, MagicMock(), 10000)
+        with patch.object(coalesce, '_poll_wait', side_effect=other_worker_finishes):
+            results = coalesce.single_flight(key, diagnose)
+
+        self.assertEqual(results, {(check, 'CH1'): True, (check, 'CH2'): False})
+        self.assertIsNone(coalesce.handoff_since())
+        self.assertEqual(diagnose(), {(check, 'CH1'): True, (check, 'CH2'): True})
+
+    def test_diagnoses_see_rows_landing_after_an_earlier_diagnosis(self):
+        table = 'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg'
+
+        def fired_checks(df_clean):
+            return sorted((row.Subject, row.Object) for row in df_clean.itertuples() if row.Status is True)
+        with override_settings(FNFM_COALESCE_DB_LOCK=False):
+            before, _ = self._diagnose(store_results=True)
+            _, partition_before = services.diagnose_partition(self.graph, self.engine, 10000, mapping=self.mapping)
+        self.engine.standin_keepalive.execute(f"UPDATE {table} SET error_count = CASE WHEN error_count > 0 THEN 0 ELSE 3 END")
+        self.engine.standin_keepalive.commit()
+        after, _ = self._diagnose(store_results=True)
+        _, partition_after = services.diagnose_partition(self.graph, self.engine, 10000, mapping=self.mapping)
+
+        self.assertNotEqual(fired_checks(after), fired_checks(before))
+        self.assertEqual(fired_checks(partition_after[self.failure]), fired_checks(after))
+        self.assertEqual(fired_checks(partition_before[self.failure]), fired_checks(before))
+
+    def test_expired_locks_are_taken_over(self):
+        name = coalesce.lock_name('key')
+        DiagnosisLock.objects.create(key=name, owner='dead worker', expires_at=timezone.now() - timedelta(seconds=1))
+        with patch.object(coalesce, '_poll_wait') as wait:
+            self.assertEqual(coalesce.single_flight('key', lambda: 'done'), 'done')
+        wait.assert_not_called()
+        self.assertFalse(DiagnosisLock.objects.exists())
+
+
+# ------------------------------
+# Admission control tests
+# ------------------------------
+
+from troubleshooter_app import admission
+from troubleshooter_app.resilience import QueueTimeout, teradata_breaker
+
+
+class AdmissionControlTests(TestCase):
+    def _wait_for_depths(self, controller, **depths):
+        for _ in range(200):
+            if all(controller.queue_depths()[lane] == depth for lane, depth in depths.items()):
+                return
+            time.sleep(0.005)
+        self.fail(f"queue depths {controller.queue_depths()} never reached {depths}")
+
+    def test_slots_go_to_the_highest_priority_lane_first(self):
+        controller = admission.AdmissionController('test', limit=1)
+        admitted = []
+
+        def run(lane):
+            with controller.slot(lane, timeout=5):
+                admitted.append(lane)
+        controller.acquire('interactive')
+        threads = []
+        for lane, depths in (('batch', {'batch': 1}), ('batch', {'batch': 2}), ('api', {'api': 1}),
+                             ('interactive', {'interactive': 1})):
+            threads.append(threading.Thread(target=run, args=(lane,)))
+            threads[-1].start()
+            self._wait_for_depths(controller, **depths)
+        controller.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(admitted, ['interactive', 'api', 'batch', 'batch'])
+        self.assertEqual(controller.running, 0)
+        self.assertEqual(controller.queue_depths(), {'interactive': 0, 'api': 0, 'batch': 0})
+
+    def test_queue_timeout(self):
+        controller = admission.AdmissionController('test', limit=1)
+        controller.acquire('batch')
+        rejected = instrumentation.metrics.counter_value('fnfm_admission_rejected_total', controller='test', lane='api')
+        with self.assertRaises(QueueTimeout):
+            controller.acquire('api', timeout=0.05)
+        self.assertEqual(instrumentation.metrics.counter_value('fnfm_admission_rejected_total', controller='test', lane='api'),
+                         rejected + 1)
+        self.assertEqual(controller.queue_depths()['api'], 0)
+        controller.release()
+        with controller.slot('api', timeout=0):
+            self.assertEqual(controller.running, 1)
+        # Without a limit nothing queues.
+        unlimited = admission.AdmissionController('test', limit=0)
+        for _ in range(3):
+            unlimited.acquire('batch', timeout=0)
+        self.assertEqual(unlimited.running, 3)
+
+    def test_engine_statements_are_admitted_within_the_budget(self):
+        metadata = synthetic.generate_metadata(2)
+        engine = synthetic.create_standin_engine(metadata, ['MCDIGVLTFM'], latency=0.03, pool_size=8)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(engine.standin_keepalive.close)
+        admission.install(admission.install(engine))
+        peak = []
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: peak.append(admission.teradata_admission.running))
+
+        def query():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT COUNT(*) FROM PRD_RP_PRODUCT_VIEW.FNFM_FLEET_METADATA")).fetchall()
+        with override_settings(FNFM_ADMISSION_MAX_QUERIES=2):
+            threads = [threading.Thread(target=query) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(peak), 6)
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(admission.teradata_admission.running, 0)
+        self.assertIn('fnfm_admission_queue_depth{controller="teradata",lane="batch"} 0', instrumentation.metrics.render())
+
+        # A check that cannot be admitted in time is UNKNOWN and doesn't open the breaker.
+        teradata_breaker.reset()
+        queue_seconds = {'interactive': 0.05, 'api': 0.05, 'batch': 0.05}
+        with override_settings(FNFM_ADMISSION_MAX_QUERIES=1, FNFM_ADMISSION_QUEUE_SECONDS=queue_seconds), \
+                engine.connect() as conn, admission.teradata_admission.slot('interactive'):
+            self.assertEqual(guarded_check(limit_check, conn, 10001, 'MCDIGVLTFM'), UNKNOWN)
+        self.assertEqual((teradata_breaker.state, teradata_breaker.failures), ('closed', 0))
+        self.assertEqual(admission.teradata_admission.running, 0)
+        with engine.connect() as conn, admission.admission_lane('batch'):
+            self.assertNotEqual(guarded_check(limit_check, conn, 10001, 'MCDIGVLTFM'), UNKNOWN)
+
+    def test_statements_of_an_invalidated_connection_release_their_slot(self):
+        metadata = synthetic.generate_metadata(1)
+        engine = synthetic.create_standin_engine(metadata, ['MCDIGVLTFM'])
+        self.addCleanup(engine.dispose)
+        self.addCleanup(engine.standin_keepalive.close)
+        admission.install(engine)
+        running = admission.teradata_admission.running
+        # Invalidated by its own statement, as resilience.py does with a connection abandoned to a hung
+        # check; the SQLite connection itself can't be closed while it runs.
+        with engine.connect() as conn, patch.object(engine.dialect, 'do_close'):
+            conn.connection.dbapi_connection.create_function('fnfm_invalidate', 0, lambda: conn.invalidate() or 1)
+            try:
+                conn.execute(text("SELECT fnfm_invalidate()")).fetchall()
+            except Exception:
+                pass
+            self.assertTrue(conn.invalidated)
+        self.assertEqual(admission.teradata_admission.running, running)
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_statements_outliving_the_cancel_grace_release_their_slot(self):
+        metadata = synthetic.generate_metadata(1)
+        engine = synthetic.create_standin_engine(metadata, ['MCDIGVLTFM'])
+        self.addCleanup(engine.dispose)
+        self.addCleanup(engine.standin_keepalive.close)
+        self.addCleanup(teradata_breaker.reset)
+        admission.install(engine)
+        _add_sleep_function(engine)
+        running = admission.teradata_admission.running
+        with patch.object(resilience, 'CANCEL_GRACE_SECONDS', 0.05), \
+                resilience.checks_connection(engine) as conn:
+            self.assertEqual(guarded_check(_hung_check, conn, 10001, 'MCDIGVLTFM'), UNKNOWN)
+            self.assertTrue(resilience.is_abandoned(conn))
+        self.assertTrue(_wait_until(lambda: conn.invalidated))
+        self.assertEqual(admission.teradata_admission.running, running)
+
+
+# ------------------------------
+# Check batching tests
+# ------------------------------
+
+from troubleshooter_app import batching
+from troubleshooter_app.resilience import CheckTimeout
+from troubleshooter_app.services import discrete_sup_10, large_pump
+
+
+class CheckBatchingTests(TestCase):
+    def setUp(self):
+        self.metadata = synthetic.generate_metadata(6)
+        self.channels = ['MCDIGVLTFM', 'MCREFVLTFM', 'MCINVLTFM']
+        self.engine = synthetic.create_standin_engine(self.metadata, self.channels, fire_rate=0.5, pool_size=20)
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+        self.statements = []
+        event.listen(self.engine, 'after_cursor_execute', lambda *args: self.statements.append(args[2]))
+
+    def _direct(self, calls):
+        with self.engine.connect() as conn:
+            return [function(conn, partition_id, channel) for function, partition_id, channel in calls]
+
+    def test_concurrent_calls_of_a_check_share_grouped_queries(self):
+        partitions = [int(p) for p in self.metadata['partition_id']]
+        calls = [(function, partition_id, channel) for function in (limit_check, discrete_sup_10, large_pump)
+                 for partition_id in partitions for channel in self.channels]
+        expected = self._direct(calls)
+        self.statements.clear()
+
+        self.engine.standin_latency = 0.05
+        barrier = threading.Barrier(len(calls))
+        results = [None] * len(calls)
+
+        def run(i, function, partition_id, channel):
+            barrier.wait()
+            with self.engine.connect() as conn:
+                results[i] = batching.batched_check(function)(conn, str(partition_id), channel)
+        threads = [threading.Thread(target=run, args=(i, *call)) for i, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [bool(value) for value in expected])
+        self.assertTrue(any(expected))
+        # The first call of each check is queried alone, the others join the next grouped query.
+        self.assertLessEqual(len(self.statements), 3 * 3)
+        self.assertTrue(all('IN (' in statement for statement in self.statements))
+
+    def test_only_service_checks_with_a_fleet_rule_are_batched(self):
+        custom = lambda conn, partition_id, triple_subject: True
+        self.assertIs(batching.batched_check(custom), custom)
+        wrapper = batching.batched_check(limit_check)
+        self.assertIs(batching.batched_check(limit_check), wrapper)
+        self.assertEqual(wrapper.__name__, 'limit_check')
+
+        def timed_calls():
+            histogram = instrumentation.metrics.histogram('fnfm_stage_duration_seconds', stage='check.limit_check')
+            return histogram.snapshot()[2] if histogram else 0
+        with self.engine.connect() as conn:
+            self.statements.clear()
+            calls = timed_calls()
+            with override_settings(FNFM_CHECK_BATCHING=False):
+                wrapper(conn, 10001, 'MCDIGVLTFM')
+            self.assertNotIn('IN (', self.statements[-1])
+            wrapper(conn, 10001, 'MCDIGVLTFM')
+            self.assertIn('IN (', self.statements[-1])
+            # Batched or not, every call is timed as its check's stage.
+            self.assertEqual(timed_calls(), calls + 2)
+
+    def _call_in_thread(self, batcher, check, lane, partition_id, outcomes, deadline=None):
+        def run():
+            try:
+                with admission.admission_lane(lane), resilience.request_deadline(deadline):
+                    outcomes[partition_id] = batcher.call(check, fleet.FLEET_RULES['limit_check'], MagicMock(),
+                                                          partition_id, 'CH1')
+            except Exception as e:
+                outcomes[partition_id] = e
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        return thread
+
+    def _wait_for_calls(self, batcher, count):
+        for _ in range(200):
+            batch = batcher._collecting.get('limit_check')
+            if batch is not None and len(batch.keys) == count:
+                return
+            time.sleep(0.01)
+        self.fail(f"{count} calls never joined the batch")
+
+    def test_batch_runs_in_the_best_lane_and_members_fall_back_when_it_fails(self):
+        batcher, check = batching.CheckBatcher(), MagicMock(__name__='limit_check', return_value=True)
+        release, lanes, outcomes = threading.Event(), [], {}
+
+        def query(name, rule, conn, keys):
+            lanes.append(admission.current_lane())
+            if len(lanes) == 1:
+                release.wait(5)
+                return {(10000, 'CH1'): False}
+            raise CheckTimeout("cancelled")
+        with patch.object(batcher, '_query', side_effect=query):
+            first = self._call_in_thread(batcher, check, 'batch', 10000, outcomes)
+            while not lanes:
+                time.sleep(0.01)
+            # These two collect in the next batch while the first query is in flight.
+            threads = [self._call_in_thread(batcher, check, 'batch', 10001, outcomes)]
+            self._wait_for_calls(batcher, 1)
+            threads.append(self._call_in_thread(batcher, check, 'interactive', 10002, outcomes))
+            self._wait_for_calls(batcher, 2)
+            release.set()
+            for thread in [first] + threads:
+                thread.join()
+
+        self.assertEqual(lanes, ['batch', 'interactive'])
+        self.assertIs(outcomes[10000], False)
+        # The batch's leader gets its error, the other member runs its check unbatched.
+        self.assertIsInstance(outcomes[10001], CheckTimeout)
+        self.assertIs(outcomes[10002], True)
+        self.assertEqual([call.args[1] for call in check.call_args_list], [10002])
+
+    def test_members_wait_for_their_batch_until_their_deadline(self):
+        batcher, check = batching.CheckBatcher(), MagicMock(__name__='limit_check', return_value=True)
+        release, started, outcomes = threading.Event(), threading.Event(), {}
+
+        def query(name, rule, conn, keys):
+            started.set()
+            release.wait(5)
+            return {}
+        with patch.object(batcher, '_query', side_effect=query):
+            first = self._call_in_thread(batcher, check, 'batch', 10000, outcomes)
+            started.wait(5)
+            second = self._call_in_thread(batcher, check, 'batch', 10001, outcomes)
+            self._wait_for_calls(batcher, 1)
+            third = self._call_in_thread(batcher, check, 'interactive', 10002, outcomes, deadline=0.1)
+            third.join(2)
+            self.assertFalse(third.is_alive())
+            release.set()
+            first.join()
+            second.join()
+
+        self.assertIsInstance(outcomes[10002], CheckTimeout)
+        self.assertEqual((outcomes[10000], outcomes[10001]), (False, False))
+
+    def test_leaders_wait_for_the_previous_query_until_their_deadline(self):
+        batcher, check = batching.CheckBatcher(), MagicMock(__name__='limit_check', return_value=True)
+        release, started, outcomes = threading.Event(), threading.Event(), {}
+
+        def query(name, rule, conn, keys):
+            started.set()
+            release.wait(5)
+            return {}
+        with patch.object(batcher, '_query', side_effect=query):
+            first = self._call_in_thread(batcher, check, 'batch', 10000, outcomes)
+            started.wait(5)
+            second = self._call_in_thread(batcher, check, 'interactive', 10001, outcomes, deadline=0.3)
+            self._wait_for_calls(batcher, 1)
+            third = self._call_in_thread(batcher, check, 'batch', 10002, outcomes)
+            self._wait_for_calls(batcher, 2)
+            second.join(2)
+            third.join(2)
+            self.assertFalse(second.is_alive() or third.is_alive())
+            release.set()
+            first.join()
+            # The next call opens a new batch.
+            self.assertIs(batcher.call(check, fleet.FLEET_RULES['limit_check'], MagicMock(), 10003, 'CH1'), False)
+
+        self.assertIs(outcomes[10000], False)
+        self.assertIsInstance(outcomes[10001], CheckTimeout)
+        # The stuck batch's other member runs its check unbatched.
+        self.assertIs(outcomes[10002], True)
+        self.assertEqual([call.args[1] for call in check.call_args_list], [10002])
+
+
+# ------------------------------
+# Incremental re-diagnosis tests
+# ------------------------------
+
+from troubleshooter_app import incremental
+
+
+class IncrementalDiagnosisTests(TestCase):
+    def setUp(self):
+        df = synthetic.generate_ontology_rows(6, rows_per_failure=6, root_causes_per_failure=2)
+        self.graph = synthetic.build_graph(df)
+        self.mapping = synthetic.synthetic_check_mapping(df)
+        self.failure = get_all_failure_labels(self.graph)[0]
+        self.metadata = synthetic.generate_metadata(2)
+        self.engine = synthetic.create_standin_engine(self.metadata, synthetic.ontology_channels(self.graph),
+                                                      fire_rate=0.5)
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.engine.standin_keepalive.close)
+        self.statements = []
+        event.listen(self.engine, 'after_cursor_execute', lambda *args: self.statements.append(args[2]))
+
+    def _diagnose(self):
+        self.statements.clear()
+        df_clean, _ = services.execute_troubleshooting_logic(self.graph, self.engine, 10000, self.failure,
+                                                             mapping=self.mapping, incremental=True)
+        return df_clean, df_clean.attrs['rediagnosis']
+
+    def test_unchanged_partition_reuses_every_check(self):
+        first, report = self._diagnose()
+        self.assertEqual(report['checks_reused'], 0)
+        self.assertGreater(report['checks_evaluated'], 0)
+        self.assertEqual(report['changes'], [])
+
+        second, report = self._diagnose()
+        self.assertEqual(report['advanced_tables'], [])
+        self.assertEqual(report['checks_evaluated'], 0)
+        # Only the version query reaches the warehouse.
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn('UNION ALL', self.statements[0])
+        pd.testing.assert_frame_equal(first.reset_index(drop=True), second.reset_index(drop=True))
+
+    def test_only_checks_of_advanced_tables_are_evaluated_again(self):
+        table = 'PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg'
+        _, first = self._diagnose()
+        keepalive = self.engine.standin_keepalive
+        keepalive.execute(f"UPDATE {table} SET error_count = CASE WHEN error_count > 0 THEN 0 ELSE 3 END "
+                          "WHERE partition_id = 10000")
+        keepalive.commit()
+
+        _, report = self._diagnose()
+        self.assertEqual(report['advanced_tables'], [table])
+        self.assertGreater(report['checks_reused'], 0)
+        self.assertEqual(report['checks_evaluated'] + report['checks_reused'], first['checks_evaluated'])
+        self.assertGreater(len(report['changes']), 0)
+        self.assertEqual(report['checks_evaluated'], len(report['changes']))
+        self.assertTrue(all(change['check'] == 'limit_check' and change['current'] != change['previous']
+                            for change in report['changes']))
+
+        stored = load_check_results(10000, [(limit_check, change['data_channel']) for change in report['changes']])
+        self.assertEqual({channel: fired for (_, channel), fired in stored.items()},
+                         {change['data_channel']: change['current'] for change in report['changes']})
+        _, report = self._diagnose()
+        self.assertEqual(report['checks_evaluated'], 0)
+
+    def test_diagnoses_of_other_failures_reading_the_same_table_see_new_rows(self):
+        rows = [
+            ("failure A", "consequence A", "rc A", "rc A2", "trigger A", "CH_A"),
+            ("failure B", "consequence B", "rc B", "rc B2", "trigger B", "CH_B"),
+        ]
+        graph = synthetic.build_graph(pd.DataFrame(rows, columns=synthetic.ONTOLOGY_COLUMNS))
+        mapping = {'trigger A': limit_check, 'trigger B': limit_check}
+        engine = synthetic.create_standin_engine(synthetic.generate_metadata(1), ['CH_A', 'CH_B'], fire_rate=0)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(engine.standin_keepalive.close)
+
+        def diagnose(failure):
+            df_clean, _ = services.execute_troubleshooting_logic(graph, engine, 10000, failure, mapping=mapping,
+                                                                 incremental=True)
+            statuses = {row.Object: row.Status for row in df_clean.itertuples() if row.Predicate == 'consume'}
+            return statuses, df_clean.attrs['rediagnosis']
+        self.assertEqual(diagnose('failure A')[0], {'CH_A': False})
+        self.assertEqual(diagnose('failure B')[0], {'CH_B': False})
+
+        engine.standin_keepalive.execute("UPDATE PRD_GLBL_DATA_PRODUCTS.FNFM_fleet_timeseries_generic_limit_checks_agg_mavg "
+                                         "SET error_count = 3 WHERE partition_id = 10000")
+        engine.standin_keepalive.commit()
+        self.assertEqual(diagnose('failure A')[0], {'CH_A': True})
+        statuses, report = diagnose('failure B')
+        self.assertEqual(statuses, {'CH_B': True})
+        self.assertEqual((report['checks_evaluated'], report['checks_reused']), (1, 0))
+        self.assertEqual([(change['data_channel'], change['current']) for change in report['changes']], [('CH_B', True)])
+
+    def test_prewarmed_results_are_reused_until_new_rows_land(self):
+        from troubleshooter_app.management.commands.prewarm_checks import prewarm_partition
+
+        invocations = services.ontology_check_invocations(self.graph)
+        prewarm_partition(self.engine, invocations, 10000, mapping=self.mapping)
+        _, report = self._diagnose()
+        self.assertEqual(report['checks_evaluated'], 0)
+        self.assertGreater(report['checks_reused'], 0)
+
+    def test_configured_version_expressions(self):
+        table = incremental.LIMIT_CHECK_PER_JOB
+        with override_settings(FNFM_SOURCE_VERSION_EXPRESSIONS={table: ('MAX(error_count)',)}):
+            self.assertEqual(incremental.version_expressions(table), ('MAX(error_count)',))
+            with self.engine.connect() as conn:
+                versions = incremental.source_versions(conn, 10000, [table, incremental.STATUS_WORDS_PER_JOB])
+        self.assertEqual(set(versions), {table, incremental.STATUS_WORDS_PER_JOB})
+        self.assertEqual(versions[table].count(':'), 1)
+        self.assertEqual(incremental.version_expressions(table), ('COUNT(*)', 'SUM(error_count)'))
+
+    @override_settings(FNFM_CHECK_TIMEOUT_SECONDS=0.2)
+    def test_hung_version_reads_are_cut_off_like_checks(self):
+        self.addCleanup(teradata_breaker.reset)
+        teradata_breaker.reset()
+        _add_sleep_function(self.engine)
+        keys = [(limit_check, 'MCDIGVLTFM')]
+        with resilience.checks_connection(self.engine) as conn:
+            self.assertEqual(set(incremental.result_versions(conn, 10000, keys)), set(keys))
+            start = time.monotonic()
+            with patch.object(resilience, 'CANCEL_GRACE_SECONDS', 0.05), \
+                    patch.object(incremental, 'source_versions', lambda conn, *args: _hung_check(conn, *args)):
+                self.assertEqual(incremental.result_versions(conn, 10000, keys), {})
+            self.assertLess(time.monotonic() - start, 0.8)
+        self.assertEqual(teradata_breaker.failures, 1)
+        self.assertTrue(_wait_until(lambda: conn.invalidated))
@@ -0,0 +1,114 @@
+"""
+Health timeline of one tool: how the checks of its data channels behaved
+over every job of a serial number.
+
+All partitions of the serial are resolved with one metadata query. Each
+check rule (see fleet.FLEET_RULES) is then fetched for all of them with
+grouped `partition_id IN (...)` queries of at most TIMELINE_BATCH_SIZE
+partitions, instead of resolving and diagnosing every job separately. The
+result is a (trigger, data channel) x job matrix of statuses and raw values,
+including the min/max aggregated next to `limit_check`.
+"""
+import math
+
+from .fleet import FLEET_RULES, METADATA_TABLE, fired_mask, rule_values
+from .instrumentation import stage
+from .resources import lazy_import
+from .services import CHECK_FUNCTIONS, check_invocations, graph_search_tuple, ontology_check_invocations
+from .snapshot import ontology_snapshot
+
+pd = lazy_import('pandas')
+
+# Partitions per `partition_id IN (...)` query.
+TIMELINE_BATCH_SIZE = 500
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def serial_jobs(conn, serial_number):
+    """Returns the jobs of a serial number, oldest first, as dicts of partition_id, job_number and job_start."""
+    from sqlalchemy import text
+
+    rows = conn.execute(text(f"""
+    SELECT partition_id, job_number, job_start
+    FROM {METADATA_TABLE}
+    WHERE serial_number = :serial_number
+    ORDER BY job_start, partition_id"""), {'serial_number': serial_number}).fetchall()
+    return [{'partition_id': int(p), 'job_number': str(j), 'job_start': str(s)} for p, j, s in rows]
+
+
+def required_checks(g, failure=None, mapping=None):
+    """
+    Returns the sorted (trigger, data channel, check name) triples of the
+    subgraph of `failure`, or of the whole ontology.
+    """
+    mapping = CHECK_FUNCTIONS if mapping is None else mapping
+    g = ontology_snapshot(g)
+    if failure is None:
+        invocations = ontology_check_invocations(g)
+    else:
+        invocation_df = check_invocations(graph_search_tuple(g, failure, max_depth=-1))
+        invocations = [(trigger, channel) for trigger, _consume, channel in invocation_df.itertuples(index=False)]
+    return sorted({(trigger, channel, mapping[trigger].__name__) for trigger, channel in invocations
+                   if trigger in mapping})
+
+
+def _rule_lookup(conn, rule, partition_ids, channels):
+    """{(partition_id, data_channel or None): cell} of one rule, fetched in batches."""
+    frames = []
+    for i in range(0, len(partition_ids), TIMELINE_BATCH_SIZE):
+        batch = partition_ids[i:i + TIMELINE_BATCH_SIZE]
+        with stage('timeline_query'):
+            frames.append(rule_values(conn, rule, "partition_id IN :partition_ids", {'partition_ids': batch}, channels))
+    values = pd.concat(frames, ignore_index=True)
+    values['fired'] = fired_mask(rule, values['value'])
+    extra = [name for name, _ in rule.extra]
+
+    lookup = {}
+    for row in values.itertuples(index=False):
+        cell = {'status': bool(row.fired), 'value': _number(row.value)}
+        for name in extra:
+            cell[name.removesuffix('_value')] = _number(getattr(row, name))
+        channel = row.data_channel if rule.channel_column else None
+        lookup[int(row.partition_id), channel] = cell
+    return lookup
+
+
+def serial_timeline(g, td_engine, serial_number, failure=None, mapping=None):
+    """
+    Returns {'serial_number', 'jobs', 'rows', 'unsupported_checks'}: one row
+    per (trigger, data channel) with a cell per job holding the check status
+    and the raw aggregate (plus min and max for limit checks). A job without
+    data for a check has the status False, like in the per-partition check.
+    """
+    checks = required_checks(g, failure, mapping)
+    unsupported = sorted({check for _, _, check in checks if check not in FLEET_RULES})
+
+    lookups = {}
+    with td_engine.connect() as conn:
+        jobs = serial_jobs(conn, serial_number)
+        partition_ids = [job['partition_id'] for job in jobs]
+        for check in sorted({check for _, _, check in checks} - set(unsupported)):
+            rule = FLEET_RULES[check]
+            channels = {channel for _, channel, name in checks if name == check} if rule.channel_column else None
+            lookups[check] = _rule_lookup(conn, rule, partition_ids, channels) if partition_ids else {}
+
+    rows = []
+    for trigger, channel, check in checks:
+        if check in unsupported:
+            continue
+        rule = FLEET_RULES[check]
+        empty = dict({'status': False, 'value': None}, **{name.removesuffix('_value'): None for name, _ in rule.extra})
+        key_channel = channel if rule.channel_column else None
+        rows.append({
+            'trigger': trigger,
+            'data_channel': channel,
+            'check': check,
+            'cells': [lookups[check].get((partition_id, key_channel), empty) for partition_id in partition_ids],
+        })
+    return {'serial_number': serial_number, 'jobs': jobs, 'rows': rows, 'unsupported_checks': unsupported}
@@ -11,12 +11,35 @@ urlpatterns = [
     # The new page to display the results after the form is submitted.
     path('results/', views.troubleshooter_results_view, name='troubleshooter_results'),
     
+    # Paged, sortable and filterable rows of the latest results tables.
+    path('api/results/<str:table>/', views.results_table, name='results_table'),
+
     # New API endpoint to get choices for the dynamic dropdowns.
     path('api/get_choices/', views.get_form_choices, name='get_form_choices'),
     
+    # Paginated prefix search for serial numbers, job numbers and job starts.
+    path('api/search_choices/', views.search_form_choices, name='search_form_choices'),
+
+    # Paginated typeahead search over the failure labels.
+    path('api/failures/', views.failure_typeahead, name='failure_typeahead'),
+
     # New API endpoint for fetching the troubleshooter data.
     path('api/troubleshooter_data/', views.get_troubleshooter_data, name='get_troubleshooter_data'),
 
+    # Ranked diagnosis of all (or several) failures for one partition.
+    path('api/diagnose_partition/', views.diagnose_partition_view, name='diagnose_partition'),
+
+    # Fleet-wide heatmap of what fires most often, and its JSON aggregates.
+    path('fleet/', views.fleet_heatmap_view, name='fleet_heatmap'),
+    path('api/fleet/aggregate/', views.fleet_aggregate, name='fleet_aggregate'),
+
+    # Check statuses of every job of one serial number.
+    path('timeline/', views.serial_timeline_view, name='serial_timeline'),
+    path('api/timeline/', views.serial_timeline_api, name='serial_timeline_api'),
+
+    # Ranked full-text search over the troubleshooting guides.
+    path('api/guides/search/', views.guide_search, name='guide_search'),
+
     # This is the new modular API inclusion.
     # All Teradata API endpoints will be under the 'troubleshooter/api/' path.
     path('api/', include('troubleshooter_app.api_urls')),
@@ -1,28 +1,51 @@
 import json
 import os
 import shutil
-import pandas as pd
-from pyvis.network import Network
+from datetime import datetime, timedelta
 from django.shortcuts import render, redirect
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from . import assets, fleet, guides, timeline
+from .coalesce import diagnosis_key, single_flight
 from .forms import TroubleshooterForm
+from .instrumentation import metrics, stage
+from .resources import LazyAttributes, lazy_import
+from .tables import page_table, table_payload
 from .services import (
     get_teradata_engine,
     load_ontology_graph,
     get_all_failure_labels,
+    get_failure_label_index,
+    ontology_version,
     get_metadata,
+    search_metadata_values,
+    METADATA_SEARCH_FIELDS,
     get_partition_id,
     execute_troubleshooting_logic,
+    diagnose_partition,
+    unknown_checks,
     get_root_cause_analysis
 )
+from .resilience import is_unknown
 
-# --- Initialize Resources (outside of view to avoid re-initialization on every request) ---
-# It's better to load these once. However, for a real production environment,
-# you would need to manage this with a connection pool or a more robust system.
-# For this example, we keep it simple for demonstration.
-td_engine = get_teradata_engine()
-g = load_ontology_graph()
+pd = lazy_import('pandas')
+
+# --- Resources (created on first use, see resources.py) ---
+# `td_engine` and `g` are shared through the app's resource registry instead of
+# being created when this module is imported; the ontology is served from a
+# memory-mapped index shared by all worker processes. pyvis is only imported
+# when a graph is rendered.
+lazy = LazyAttributes(
+    globals(),
+    resources={'td_engine': 'teradata_engine', 'g': 'ontology'},
+    imports={'Network': 'pyvis.network.Network'},
+)
+__getattr__ = lazy.getattr
+
+# Failure labels per typeahead page, and metadata values per search page.
+FAILURE_PAGE_SIZE = 20
+CHOICES_PAGE_SIZE = 50
+RESULTS_PAGE_SIZE = 100
 
 # --- Main Django View (Handles the form) ---
 def troubleshooter_view(request):
@@ -30,6 +53,7 @@ def troubleshooter_view(request):
     Handles the main web page for the troubleshooter app.
     It orchestrates the form, data processing, and then redirects to the results page.
     """
+    td_engine, g = lazy('td_engine'), lazy('g')
     form = TroubleshooterForm()
     context = {
         'form': form,
@@ -42,7 +66,14 @@ def troubleshooter_view(request):
         return render(request, 'troubleshooter.html', context)
 
     try:
-        context['failure_list'] = get_all_failure_labels(g)
+        # Only the first page of failures is embedded; the form searches the rest
+        # through failure_typeahead.
+        failure_page = get_failure_label_index(g).search(limit=FAILURE_PAGE_SIZE)
+        context['failure_list'] = failure_page['results']
+        context['failure_total'] = failure_page['total']
+        selected = request.POST.get('failure_selectbox') if request.method == 'POST' else None
+        if selected and selected not in context['failure_list']:
+            context['failure_list'] = [selected] + context['failure_list']
 
         if request.method == 'POST':
             # Handle the form submission and data processing
@@ -50,77 +81,110 @@ def troubleshooter_view(request):
             selected_job_number = request.POST.get('job_number')
             selected_job_start = request.POST.get('job_start')
             selected_failure = request.POST.get('failure_selectbox')
+            analyze_all = 'analyze_all' in request.POST
 
-            if selected_serial_number and selected_job_number and selected_job_start and selected_failure:
+            if selected_serial_number and selected_job_number and selected_job_start and (selected_failure or analyze_all):
                 partition_id = get_partition_id(td_engine, selected_serial_number, selected_job_number, selected_job_start)
 
                 if partition_id:
                     # FIX: Explicitly cast partition_id to a standard Python int
                     # before storing it in the session to avoid a TypeError.
                     partition_id = int(partition_id)
+
+                    if analyze_all:
+                        request.session['troubleshooter_results'] = _all_failures_results(request, g, td_engine, partition_id)
+                        return redirect('troubleshooter_app:troubleshooter_results')
                     
-                    # Execute the core logic
-                    df_clean, dic_tuple_result = execute_troubleshooting_logic(g, td_engine, partition_id, selected_failure)
+                    # Execute the core logic, once for all concurrent requests of this diagnosis
+                    df_clean, dic_tuple_result = _coalesced_diagnosis(g, td_engine, partition_id, selected_failure)
                     
                     # Store all the necessary results in a session dictionary
                     session_results = {
                         'partition_id': partition_id,
                         'messages': [f"The partition_id associated with your chosen criteria is {partition_id}"],
-                        'df_clean_html': df_clean.to_html(classes='table table-striped table-bordered', index=False) if not df_clean.empty else None,
-                        'root_cause_table_html': None,
+                        'table_rows': {},
                         'graph_html_path': None,
                     }
+                    unknown = unknown_checks(df_clean)
+                    if unknown:
+                        session_results['messages'].append(
+                            f"{len(unknown)} checks could not be evaluated in time and are marked unknown: "
+                            + ", ".join(f"{trigger} ({channel})" for trigger, channel in unknown)
+                        )
+                    changes = _status_changes(df_clean)
+                    if changes:
+                        session_results['messages'].append(
+                            f"{len(changes)} checks changed status since the last diagnosis: "
+                            + ", ".join(f"{change['check']} ({change['data_channel']}) "
+                                        f"{'fired' if change['current'] else 'cleared'}" for change in changes)
+                        )
                     
-                    # Root Cause Analysis Table
+                    # Root Cause Analysis Table. Tables are kept as JSON rows and
+                    # paged into the results page by results_table.
                     root_cause_table_data = get_root_cause_analysis(df_clean, selected_failure)
-                    session_results['root_cause_table_html'] = pd.DataFrame(root_cause_table_data, columns=["Root Cause", "Trigger", "Data Channel"]).to_html(classes='table table-striped table-bordered', index=False) if root_cause_table_data else None
+                    tables = {
+                        'root_causes': table_payload(pd.DataFrame(root_cause_table_data, columns=["Root Cause", "Trigger", "Data Channel"])),
+                        'triples': table_payload(df_clean),
+                    }
+                    session_results['table_rows'] = {name: len(table['rows']) for name, table in tables.items()}
+                    request.session['troubleshooter_tables'] = tables
+                    session_results['guides'] = guides.guides_for_labels(
+                        root_causes=[row[0] for row in root_cause_table_data],
+                        data_channels=[row[2].removesuffix(' 🔴') for row in root_cause_table_data],
+                    )
 
                     # Pyvis Graph Generation
                     if not df_clean.empty:
-                        net = Network(height="1100px", width="100%", directed=True, notebook=True)
-                        for _, row in df_clean.iterrows():
-                            subject = row['Subject']
-                            predicate = row['Predicate']
-                            object_node = row['Object']
-                            status = row['Status']
-
-                            color_subject = "#A7C7E7"
-                            color_object = "#A7C7E7"
-                            color_predicate = "#A7C7E7"
-                            title_subject = f"name:{subject}"
-                            title_object = f"name:{object_node}"
-                            title_predicate = f"name:{predicate}"
-
-                            if predicate == "hasRootCause":
-                                color_subject = "#FFCC99"
-                                color_object = "#C5A3FF"
-                                title_subject = f"type:failure, name:{subject}"
-                                title_object = f"type:Root Cause, name:{object_node}"
-                            elif predicate == "isTriggeredBy":
-                                color_subject = "#C5A3FF"
-                                color_object = "#D2B48C"
-                                title_subject = f"type:Root Cause, name:{subject}"
-                                title_object = f"type:Trigger, name:{object_node}, value:{status}"
-                            elif predicate == "consume":
-                                color_subject = "#D2B48C"
-                                title_subject = f"type:trigger, name:{subject}"
-                                title_object = f"type:data channel, name:{object_node}"
-                                if status is False:
-                                    color_object = "green"
-                                    color_predicate = "green"
-                                elif status is True:
-                                    color_object = "red"
-                                    color_predicate = "red"
+                        with stage('pyvis_render'):
+                            Network = lazy('Network')
+                            net = Network(height="1100px", width="100%", directed=True, notebook=True)
+                            for _, row in df_clean.iterrows():
+                                subject = row['Subject']
+                                predicate = row['Predicate']
+                                object_node = row['Object']
+                                status = row['Status']
+
+                                color_subject = "#A7C7E7"
+                                color_object = "#A7C7E7"
+                                color_predicate = "#A7C7E7"
+                                title_subject = f"name:{subject}"
+                                title_object = f"name:{object_node}"
+                                title_predicate = f"name:{predicate}"
+
+                                if predicate == "hasRootCause":
+                                    color_subject = "#FFCC99"
+                                    color_object = "#C5A3FF"
+                                    title_subject = f"type:failure, name:{subject}"
+                                    title_object = f"type:Root Cause, name:{object_node}"
+                                elif predicate == "isTriggeredBy":
+                                    color_subject = "#C5A3FF"
+                                    color_object = "#D2B48C"
+                                    title_subject = f"type:Root Cause, name:{subject}"
+                                    title_object = f"type:Trigger, name:{object_node}, value:{status}"
+                                elif predicate == "consume":
+                                    color_subject = "#D2B48C"
+                                    title_subject = f"type:trigger, name:{subject}"
+                                    title_object = f"type:data channel, name:{object_node}"
+                                    if status is False:
+                                        color_object = "green"
+                                        color_predicate = "green"
+                                    elif status is True:
+                                        color_object = "red"
+                                        color_predicate = "red"
+                                    elif is_unknown(status):
+                                        color_object = "#BDBDBD"
+                                        color_predicate = "#BDBDBD"
+                                        title_object += ", value:unknown"
                             
-                            net.add_node(subject, color=color_subject, label=subject, title=title_subject)
-                            net.add_node(object_node, color=color_object, label=object_node, title=title_object)
-                            net.add_edge(subject, object_node, color=color_predicate, title=title_predicate)
-
-                        net.force_atlas_2based(gravity=-50, central_gravity=0.01, spring_length=200, spring_strength=0.05)
-                        graph_filename = f"graph_{partition_id}.html"
-                        graph_output_path = os.path.join(settings.STATICFILES_DIRS[0], 'graphs', graph_filename)
-                        net.save_graph(graph_output_path)
-                        session_results['graph_html_path'] = os.path.join(settings.STATIC_URL, 'graphs', graph_filename)
+                                net.add_node(subject, color=color_subject, label=subject, title=title_subject)
+                                net.add_node(object_node, color=color_object, label=object_node, title=title_object)
+                                net.add_edge(subject, object_node, color=color_predicate, title=title_predicate)
+
+                            net.force_atlas_2based(gravity=-50, central_gravity=0.01, spring_length=200, spring_strength=0.05)
+                            graph_filename = f"graph_{partition_id}.html"
+                            graph_output_path = os.path.join(settings.STATICFILES_DIRS[0], 'graphs', graph_filename)
+                            assets.save_graph(net, graph_output_path)
+                            session_results['graph_html_path'] = os.path.join(settings.STATIC_URL, 'graphs', graph_filename)
                     
                     # Store results in the session and redirect
                     request.session['troubleshooter_results'] = session_results
@@ -136,6 +200,40 @@ def troubleshooter_view(request):
     # Render the form on GET request or if an error occurred during POST
     return render(request, 'troubleshooter.html', context)
 
+def _all_failures_results(request, g, td_engine, partition_id):
+    """
+    Diagnoses every failure for the partition and stores the ranked summary
+    as the 'failure_summary' results table. Returns the session results.
+    """
+    summary, _ = diagnose_partition(g, td_engine, partition_id, incremental=True)
+    rows = [
+        [rank, entry['failure'], len(entry['red_channels']), ", ".join(entry['root_causes']),
+         ", ".join(entry['red_channels'])]
+        for rank, entry in enumerate(summary['failures'], start=1)
+    ]
+    request.session['troubleshooter_tables'] = {
+        'failure_summary': table_payload(pd.DataFrame(
+            rows, columns=["Rank", "Failure", "Red Channels", "Root Causes", "Data Channels"])),
+    }
+    messages = [
+        f"The partition_id associated with your chosen criteria is {partition_id}",
+        f"{summary['failures_evaluated']} failures diagnosed with {summary['checks_run']} distinct checks "
+        f"({summary['checks_requested']} requested by their subgraphs).",
+    ]
+    if summary['checks_unknown']:
+        messages.append(f"{summary['checks_unknown']} checks could not be evaluated in time and are marked unknown.")
+    return {
+        'partition_id': partition_id,
+        'messages': messages,
+        'mode': 'all_failures',
+        'table_rows': {'failure_summary': len(rows)},
+        'graph_html_path': None,
+        'guides': guides.guides_for_labels(
+            root_causes=[root_cause for entry in summary['failures'] for root_cause in entry['root_causes']],
+            data_channels=[channel for entry in summary['failures'] for channel in entry['red_channels']],
+        ),
+    }
+
 def troubleshooter_results_view(request):
     """
     Renders the troubleshooting results on a separate page.
@@ -152,12 +250,15 @@ def troubleshooter_results_view(request):
     # This prevents stale data from appearing on refresh
     del request.session['troubleshooter_results']
 
+    # The tables themselves stay in the session ('troubleshooter_tables') so the
+    # page can keep fetching rows from results_table while it is open.
     context = {
         'partition_id': results.get('partition_id'),
         'messages': results.get('messages'),
-        'df_clean_html': results.get('df_clean_html'),
-        'root_cause_table_html': results.get('root_cause_table_html'),
+        'mode': results.get('mode', 'failure'),
+        'table_rows': results.get('table_rows', {}),
         'graph_html_path': results.get('graph_html_path'),
+        'guides': results.get('guides', []),
     }
   
 
@@ -165,6 +266,19 @@ def troubleshooter_results_view(request):
 
 
 # --- API View Functions (these remain unchanged) ---
+def _choices(column):
+    """
+    Sorted (value, label) choices of the distinct values of a metadata
+    column, 'NaN' standing for missing values. Works on the categorical and
+    timestamp columns of get_metadata without converting the whole column.
+    """
+    values = pd.Series(column.dropna().unique())
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # The text of CAST(job_start AS CHAR(26)), which get_partition_id compares against.
+        values = values.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    labels = [str(x) for x in values] + (['NaN'] if column.isna().any() else [])
+    return sorted((label, label) for label in labels)
+
 def get_form_choices(request):
     """
     API endpoint to dynamically get form choices based on a parent selection.
@@ -172,6 +286,7 @@ def get_form_choices(request):
     """
     parent_field = request.GET.get('parent_field')
     parent_value = request.GET.get('parent_value')
+    td_engine = lazy('td_engine')
 
     if not parent_field or not td_engine:
         return JsonResponse({'choices': []})
@@ -180,19 +295,108 @@ def get_form_choices(request):
         df_metadata = get_metadata(td_engine)
         choices = []
         if parent_field == 'serial_number':
-            choices = sorted([(str(x), str(x)) for x in df_metadata["serial_number"].fillna('NaN').unique()])
+            choices = _choices(df_metadata["serial_number"])
         elif parent_field == 'job_number' and parent_value:
             df_serial_number = df_metadata[df_metadata["serial_number"] == parent_value]
-            choices = sorted([(str(x), str(x)) for x in df_serial_number["job_number"].fillna('NaN').unique()])
+            choices = _choices(df_serial_number["job_number"])
         elif parent_field == 'job_start' and parent_value:
             df_serial_and_job_number = df_metadata[df_metadata["job_number"] == parent_value]
-            choices = sorted([(str(x), str(x)) for x in df_serial_and_job_number["job_start"].fillna('NaN').unique()])
+            choices = _choices(df_serial_and_job_number["job_start"])
 
         return JsonResponse({'choices': choices})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def results_table(request, table):
+    """
+    API endpoint returning a window of one of the latest results tables:
+    ?offset=<n>&limit=<n>&sort=<column>&order=asc|desc&q=<filter text>.
+    """
+    tables = request.session.get('troubleshooter_tables') or {}
+    if table not in tables:
+        return JsonResponse({'error': 'No results available for this table.'}, status=404)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', RESULTS_PAGE_SIZE)), 1), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers.'}, status=400)
+
+    page = page_table(
+        tables[table], offset, limit, sort=request.GET.get('sort'),
+        descending=request.GET.get('order') == 'desc', query=request.GET.get('q', ''),
+    )
+    return JsonResponse(page)
+
+
+def search_form_choices(request):
+    """
+    API endpoint returning one page of serial numbers, job numbers or job
+    starts matching a prefix: ?field=<field>&q=<prefix>&cursor=<last value>
+    &parent_value=<parent selection>. The search runs in Teradata, so the
+    fleet metadata is never pulled in full.
+    """
+    field = request.GET.get('field')
+    parent_value = request.GET.get('parent_value')
+    td_engine = lazy('td_engine')
+
+    if field not in METADATA_SEARCH_FIELDS:
+        return JsonResponse({'error': f"field must be one of {', '.join(METADATA_SEARCH_FIELDS)}."}, status=400)
+    if field != 'serial_number' and not parent_value:
+        return JsonResponse({'choices': [], 'next_cursor': None})
+    if not td_engine:
+        return JsonResponse({'error': 'Teradata connection is not available.'}, status=503)
+    try:
+        limit = min(max(int(request.GET.get('limit', CHOICES_PAGE_SIZE)), 1), 200)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+
+    try:
+        values, next_cursor = search_metadata_values(
+            td_engine, field, prefix=request.GET.get('q', ''), cursor=request.GET.get('cursor') or None,
+            parent_value=parent_value, limit=limit,
+        )
+        return JsonResponse({'choices': [(value, value) for value in values], 'next_cursor': next_cursor})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def failure_typeahead(request):
+    """
+    API endpoint searching the failure labels by prefix or substring, one
+    page at a time: ?q=<text>&offset=<n>&limit=<n>.
+    """
+    g = lazy('g')
+    if g is None:
+        return JsonResponse({'error': 'The ontology is not available.'}, status=503)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', FAILURE_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers.'}, status=400)
+
+    page = get_failure_label_index(g).search(request.GET.get('q', ''), offset, limit)
+    return JsonResponse(page)
+
+
+def _coalesced_diagnosis(g, td_engine, partition_id, selected_failure):
+    """
+    execute_troubleshooting_logic, shared with the concurrent requests for the
+    same partition, failure and ontology version (see coalesce.py). The
+    results are shared too and must not be modified. Only the checks whose
+    source tables advanced since their results were stored are evaluated
+    again (see incremental.py).
+    """
+    key = diagnosis_key(partition_id, selected_failure, ontology_version(g))
+    return single_flight(key, execute_troubleshooting_logic, g, td_engine, partition_id, selected_failure,
+                         store_results=True, incremental=True)
+
+
+def _status_changes(df_clean):
+    """The status changes found by an incremental re-diagnosis, if any."""
+    return (df_clean.attrs.get('rediagnosis') or {}).get('changes', [])
+
+
 def get_troubleshooter_data(request):
     """
     New API endpoint to fetch the processed troubleshooting data as JSON.
@@ -205,13 +409,172 @@ def get_troubleshooter_data(request):
         return JsonResponse({'error': 'Missing required parameters'}, status=400)
 
     try:
-        df_clean, dic_tuple_result = execute_troubleshooting_logic(g, td_engine, partition_id, selected_failure)
+        df_clean, dic_tuple_result = _coalesced_diagnosis(lazy('g'), lazy('td_engine'), partition_id, selected_failure)
         
         # Convert DataFrame to a list of dictionaries for JSON serialization
         data = df_clean.to_dict('records')
+        unknown = unknown_checks(df_clean)
         
-        return JsonResponse({'data': data})
+        return JsonResponse({
+            'data': data,
+            'partial': bool(unknown),
+            'unknown_checks': [{'trigger': trigger, 'data_channel': channel} for trigger, channel in unknown],
+            'rediagnosis': df_clean.attrs.get('rediagnosis'),
+        })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+
+
+def diagnose_partition_view(request):
+    """
+    API endpoint diagnosing every failure, or the failures given as repeated
+    ?failure= parameters, for ?partition_id=<id>. Returns the ranked summary
+    of the failures with red data channels.
+    """
+    partition_id = request.GET.get('partition_id')
+    failures = request.GET.getlist('failure') or None
+
+    if not partition_id:
+        return JsonResponse({'error': 'Missing required parameters'}, status=400)
+
+    try:
+        summary, _ = diagnose_partition(lazy('g'), lazy('td_engine'), partition_id, failures, incremental=True)
+        return JsonResponse(summary)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def _fleet_window(request):
+    """
+    The window of the fleet views: ?start=YYYY-MM&end=YYYY-MM, both months
+    included, by default the last twelve months and the current one.
+    """
+    start, end = fleet.default_window()
+    if request.GET.get('start'):
+        start = datetime.strptime(request.GET['start'], '%Y-%m')
+    if request.GET.get('end'):
+        month_end = datetime.strptime(request.GET['end'], '%Y-%m')
+        end = datetime(month_end.year + month_end.month // 12, month_end.month % 12 + 1, 1)
+    return start, end
+
+
+def _fleet_heatmap(request):
+    """Returns the heatmap requested by ?dimension=&by=&start=&end=&limit= and the window."""
+    start, end = _fleet_window(request)
+    limit = min(max(int(request.GET.get('limit', 50)), 1), 500)
+    firings, unsupported = fleet.get_firings(lazy('g'), lazy('td_engine'), start, end)
+    data = fleet.heatmap(firings, request.GET.get('dimension', 'root_cause'), request.GET.get('by', 'month'), limit)
+    data.update(start=start.strftime('%Y-%m'), end=(end - timedelta(days=1)).strftime('%Y-%m'),
+                unsupported_checks=unsupported)
+    return data
+
+
+def fleet_aggregate(request):
+    """
+    API endpoint counting, per failure, root cause, trigger or data channel
+    (?dimension=), the partitions in which it fired, by serial number or
+    month (?by=), over ?start=YYYY-MM to ?end=YYYY-MM.
+    """
+    if lazy('td_engine') is None or lazy('g') is None:
+        return JsonResponse({'error': 'Could not connect to data sources.'}, status=503)
+    try:
+        return JsonResponse(_fleet_heatmap(request))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def fleet_heatmap_view(request):
+    """Renders the fleet heatmap of fleet_aggregate as a colour-scaled table."""
+    context = {'dimensions': fleet.DIMENSIONS, 'groupings': fleet.GROUPINGS, 'messages': [], 'heatmap': None}
+    if lazy('td_engine') is None or lazy('g') is None:
+        context['messages'].append("Error: Could not connect to data sources. Please check credentials and connection settings.")
+        return render(request, 'fleet_heatmap.html', context)
+    try:
+        data = _fleet_heatmap(request)
+    except ValueError as e:
+        context['messages'].append(f"Invalid parameters: {e}")
+        return render(request, 'fleet_heatmap.html', context)
+
+    peak = max((value for row in data['values'] for value in row), default=0) or 1
+    data['table'] = [
+        (label, total, [(value, round(value / peak, 2)) for value in row])
+        for label, total, row in zip(data['rows'], data['totals'], data['values'])
+    ]
+    context['heatmap'] = data
+    return render(request, 'fleet_heatmap.html', context)
+
+
+def _serial_timeline(request):
+    return timeline.serial_timeline(lazy('g'), lazy('td_engine'), request.GET['serial_number'],
+                                    failure=request.GET.get('failure') or None)
+
+
+def serial_timeline_api(request):
+    """
+    API endpoint returning the (trigger, data channel) x job matrix of check
+    statuses and values for every job of ?serial_number=, optionally limited
+    to the checks of ?failure=.
+    """
+    if not request.GET.get('serial_number'):
+        return JsonResponse({'error': 'Missing required parameters'}, status=400)
+    if lazy('td_engine') is None or lazy('g') is None:
+        return JsonResponse({'error': 'Could not connect to data sources.'}, status=503)
+    try:
+        return JsonResponse(_serial_timeline(request))
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def serial_timeline_view(request):
+    """Renders the health timeline of a serial number (see serial_timeline_api)."""
+    context = {'messages': [], 'timeline': None, 'serial_number': request.GET.get('serial_number', ''),
+               'failure': request.GET.get('failure', '')}
+    if not context['serial_number']:
+        return render(request, 'timeline.html', context)
+    if lazy('td_engine') is None or lazy('g') is None:
+        context['messages'].append("Error: Could not connect to data sources. Please check credentials and connection settings.")
+        return render(request, 'timeline.html', context)
+    try:
+        context['timeline'] = _serial_timeline(request)
+        if not context['timeline']['jobs']:
+            context['messages'].append(f"No jobs found for serial number {context['serial_number']}.")
+    except Exception as e:
+        context['messages'].append(f"An unexpected error occurred: {e}")
+    return render(request, 'timeline.html', context)
+
+
+def metrics_view(request):
+    """
+    Exposes the per-stage latency histograms, cache counters and connection
+    pool gauges in the Prometheus text format.
+    """
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def guide_search(request):
+    """
+    Ranked full-text search over the troubleshooting guides (titles,
+    descriptions, solutions and linked ontology labels).
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Missing required parameter: q'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', guides.SEARCH_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    with stage('guide_search'):
+        results = guides.search_guides(query, limit)
+    return JsonResponse({'query': query, 'results': results})
+
+
+def static_asset(request, path):
+    """
+    Serves static files with their precompressed variants and immutable
+    caching of fingerprinted names (see assets.py).
+    """
+    return assets.serve(request, path)